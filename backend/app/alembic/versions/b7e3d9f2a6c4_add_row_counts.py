@@ -0,0 +1,176 @@
+"""add row counts kept by triggers
+
+Revision ID: b7e3d9f2a6c4
+Revises: a2d5c8e1f4b7
+Create Date: 2025-10-15 11:48:02.375914
+
+"""
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel.sql.sqltypes
+
+
+# revision identifiers, used by Alembic.
+revision = 'b7e3d9f2a6c4'
+down_revision = 'a2d5c8e1f4b7'
+branch_labels = None
+depends_on = None
+
+# For every counted table, a query mapping its rows (the transition table named
+# `rows`) to the collection and the user they are counted for, and the counter
+# they add to in collectionrowcounts / userrowcounts (None if not counted there)
+COUNTED = {
+    'collection': (
+        'SELECT NULL::uuid AS collection_id, r.user_id FROM {rows} r',
+        None, 'collections',
+    ),
+    'anspdffolder': (
+        'SELECT r.collection_id, c.user_id FROM {rows} r '
+        'JOIN collection c ON c.id = r.collection_id',
+        'ans_pdf_folders', 'ans_pdf_folders',
+    ),
+    'anspdf': (
+        'SELECT f.collection_id, c.user_id FROM {rows} r '
+        'JOIN anspdffolder f ON f.id = r.ans_pdf_folder_id '
+        'JOIN collection c ON c.id = f.collection_id',
+        'ans_pdfs', 'ans_pdfs',
+    ),
+    'qppdf': (
+        'SELECT r.collection_id, c.user_id FROM {rows} r '
+        'JOIN collection c ON c.id = r.collection_id',
+        'qp_pdfs', 'qp_pdfs',
+    ),
+    'evaluation': (
+        'SELECT f.collection_id, NULL::uuid AS user_id FROM {rows} r '
+        'JOIN page p ON p.id = r.page_id '
+        'JOIN anspdf a ON a.id = p.ans_pdf_id '
+        'JOIN anspdffolder f ON f.id = a.ans_pdf_folder_id',
+        'evaluations', None,
+    ),
+}
+
+
+def adjust(counts_table: str, key: str, counter: str, scope: str, sign: str) -> str:
+    return f"""
+        UPDATE {counts_table} t SET {counter} = t.{counter} {sign} d.n
+        FROM (SELECT s.{key}, count(*) AS n FROM ({scope}) s GROUP BY s.{key}) d
+        WHERE t.{key} = d.{key};"""
+
+
+def trigger_function(table: str) -> str:
+    scope, collection_counter, user_counter = COUNTED[table]
+    branches = {}
+    for op_name, rows, sign in (('INSERT', 'new_rows', '+'), ('DELETE', 'old_rows', '-')):
+        statements = ''
+        if collection_counter:
+            statements += adjust(
+                'collectionrowcounts', 'collection_id', collection_counter,
+                scope.format(rows=rows), sign,
+            )
+        if user_counter:
+            statements += adjust(
+                'userrowcounts', 'user_id', user_counter, scope.format(rows=rows), sign,
+            )
+        branches[op_name] = statements
+    if table == 'collection':
+        branches['INSERT'] += """
+        INSERT INTO collectionrowcounts (collection_id, ans_pdf_folders, ans_pdfs, qp_pdfs, evaluations)
+        SELECT id, 0, 0, 0, 0 FROM new_rows;"""
+    return f"""
+    CREATE FUNCTION count_{table}_rows() RETURNS trigger LANGUAGE plpgsql AS $$
+    BEGIN
+        IF TG_OP = 'INSERT' THEN{branches['INSERT']}
+        ELSE{branches['DELETE']}
+        END IF;
+        RETURN NULL;
+    END $$;
+    """
+
+
+def upgrade():
+    op.create_table('collectionrowcounts',
+    sa.Column('collection_id', sa.Uuid(), nullable=False),
+    sa.Column('ans_pdf_folders', sa.Integer(), nullable=False),
+    sa.Column('ans_pdfs', sa.Integer(), nullable=False),
+    sa.Column('qp_pdfs', sa.Integer(), nullable=False),
+    sa.Column('evaluations', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['collection_id'], ['collection.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('collection_id')
+    )
+    op.create_table('userrowcounts',
+    sa.Column('user_id', sa.Uuid(), nullable=False),
+    sa.Column('collections', sa.Integer(), nullable=False),
+    sa.Column('ans_pdf_folders', sa.Integer(), nullable=False),
+    sa.Column('ans_pdfs', sa.Integer(), nullable=False),
+    sa.Column('qp_pdfs', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['user_id'], ['user.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('user_id')
+    )
+
+    # Statement-level triggers see every inserted or deleted row at once through
+    # a transition table, so a bulk insert or delete updates each counter once
+    op.execute("""
+    CREATE FUNCTION create_user_row_counts() RETURNS trigger LANGUAGE plpgsql AS $$
+    BEGIN
+        INSERT INTO userrowcounts (user_id, collections, ans_pdf_folders, ans_pdfs, qp_pdfs)
+        SELECT id, 0, 0, 0, 0 FROM new_rows;
+        RETURN NULL;
+    END $$;
+    """)
+    op.execute("""
+    CREATE TRIGGER user_row_counts AFTER INSERT ON "user"
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION create_user_row_counts();
+    """)
+    for table in COUNTED:
+        op.execute(trigger_function(table))
+        op.execute(f"""
+        CREATE TRIGGER {table}_row_counts_insert AFTER INSERT ON {table}
+        REFERENCING NEW TABLE AS new_rows
+        FOR EACH STATEMENT EXECUTE FUNCTION count_{table}_rows();
+        """)
+        op.execute(f"""
+        CREATE TRIGGER {table}_row_counts_delete AFTER DELETE ON {table}
+        REFERENCING OLD TABLE AS old_rows
+        FOR EACH STATEMENT EXECUTE FUNCTION count_{table}_rows();
+        """)
+
+    # Creating the triggers locked the tables against writes until this migration
+    # commits, so nothing is missed between the backfill and the first trigger
+    op.execute("""
+    INSERT INTO collectionrowcounts (collection_id, ans_pdf_folders, ans_pdfs, qp_pdfs, evaluations)
+    SELECT c.id,
+        (SELECT count(*) FROM anspdffolder f WHERE f.collection_id = c.id),
+        (SELECT count(*) FROM anspdf a
+            JOIN anspdffolder f ON f.id = a.ans_pdf_folder_id
+            WHERE f.collection_id = c.id),
+        (SELECT count(*) FROM qppdf q WHERE q.collection_id = c.id),
+        (SELECT count(*) FROM evaluation e
+            JOIN page p ON p.id = e.page_id
+            JOIN anspdf a ON a.id = p.ans_pdf_id
+            JOIN anspdffolder f ON f.id = a.ans_pdf_folder_id
+            WHERE f.collection_id = c.id)
+    FROM collection c
+    """)
+    op.execute("""
+    INSERT INTO userrowcounts (user_id, collections, ans_pdf_folders, ans_pdfs, qp_pdfs)
+    SELECT u.id, count(r.collection_id),
+        coalesce(sum(r.ans_pdf_folders), 0),
+        coalesce(sum(r.ans_pdfs), 0),
+        coalesce(sum(r.qp_pdfs), 0)
+    FROM "user" u
+    LEFT JOIN collection c ON c.user_id = u.id
+    LEFT JOIN collectionrowcounts r ON r.collection_id = c.id
+    GROUP BY u.id
+    """)
+
+
+def downgrade():
+    for table in reversed(list(COUNTED)):
+        op.execute(f'DROP TRIGGER {table}_row_counts_delete ON {table}')
+        op.execute(f'DROP TRIGGER {table}_row_counts_insert ON {table}')
+        op.execute(f'DROP FUNCTION count_{table}_rows()')
+    op.execute('DROP TRIGGER user_row_counts ON "user"')
+    op.execute('DROP FUNCTION create_user_row_counts()')
+    op.drop_table('userrowcounts')
+    op.drop_table('collectionrowcounts')
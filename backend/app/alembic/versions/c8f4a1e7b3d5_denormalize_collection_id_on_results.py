@@ -0,0 +1,113 @@
+"""denormalize collection_id on page and evaluation
+
+Revision ID: c8f4a1e7b3d5
+Revises: b7e3d9f2a6c4
+Create Date: 2025-10-16 09:12:54.608127
+
+"""
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel.sql.sqltypes
+
+
+# revision identifiers, used by Alembic.
+revision = 'c8f4a1e7b3d5'
+down_revision = 'b7e3d9f2a6c4'
+branch_labels = None
+depends_on = None
+
+INDEXES = [
+    ('ix_page_collection_id', 'page', ['collection_id']),
+    ('ix_evaluation_ans_pdf_id', 'evaluation', ['ans_pdf_id']),
+    ('ix_evaluation_collection_id_created_at_id', 'evaluation', ['collection_id', 'created_at', 'id']),
+]
+
+# Evaluation counters of b7e3d9f2a6c4, with the collection read off the row
+# instead of through page, anspdf and anspdffolder
+COUNT_EVALUATION_ROWS = """
+CREATE OR REPLACE FUNCTION count_evaluation_rows() RETURNS trigger LANGUAGE plpgsql AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        UPDATE collectionrowcounts t SET evaluations = t.evaluations + d.n
+        FROM (SELECT collection_id, count(*) AS n FROM new_rows GROUP BY collection_id) d
+        WHERE t.collection_id = d.collection_id;
+    ELSE
+        UPDATE collectionrowcounts t SET evaluations = t.evaluations - d.n
+        FROM (SELECT collection_id, count(*) AS n FROM old_rows GROUP BY collection_id) d
+        WHERE t.collection_id = d.collection_id;
+    END IF;
+    RETURN NULL;
+END $$;
+"""
+
+COUNT_EVALUATION_ROWS_JOINED = """
+CREATE OR REPLACE FUNCTION count_evaluation_rows() RETURNS trigger LANGUAGE plpgsql AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        UPDATE collectionrowcounts t SET evaluations = t.evaluations + d.n
+        FROM (SELECT f.collection_id, count(*) AS n FROM new_rows r
+            JOIN page p ON p.id = r.page_id
+            JOIN anspdf a ON a.id = p.ans_pdf_id
+            JOIN anspdffolder f ON f.id = a.ans_pdf_folder_id
+            GROUP BY f.collection_id) d
+        WHERE t.collection_id = d.collection_id;
+    ELSE
+        UPDATE collectionrowcounts t SET evaluations = t.evaluations - d.n
+        FROM (SELECT f.collection_id, count(*) AS n FROM old_rows r
+            JOIN page p ON p.id = r.page_id
+            JOIN anspdf a ON a.id = p.ans_pdf_id
+            JOIN anspdffolder f ON f.id = a.ans_pdf_folder_id
+            GROUP BY f.collection_id) d
+        WHERE t.collection_id = d.collection_id;
+    END IF;
+    RETURN NULL;
+END $$;
+"""
+
+
+def upgrade():
+    op.add_column('page', sa.Column('collection_id', sa.Uuid(), nullable=True))
+    op.add_column('evaluation', sa.Column('ans_pdf_id', sa.Uuid(), nullable=True))
+    op.add_column('evaluation', sa.Column('collection_id', sa.Uuid(), nullable=True))
+    op.execute("""
+    UPDATE page p SET collection_id = f.collection_id
+    FROM anspdf a JOIN anspdffolder f ON f.id = a.ans_pdf_folder_id
+    WHERE a.id = p.ans_pdf_id AND p.collection_id IS NULL
+    """)
+    op.execute("""
+    UPDATE evaluation e SET ans_pdf_id = p.ans_pdf_id, collection_id = p.collection_id
+    FROM page p
+    WHERE p.id = e.page_id AND e.collection_id IS NULL
+    """)
+    op.alter_column('page', 'collection_id', nullable=False)
+    op.alter_column('evaluation', 'ans_pdf_id', nullable=False)
+    op.alter_column('evaluation', 'collection_id', nullable=False)
+    op.create_foreign_key(None, 'page', 'collection', ['collection_id'], ['id'])
+    op.create_foreign_key(None, 'evaluation', 'anspdf', ['ans_pdf_id'], ['id'])
+    op.create_foreign_key(None, 'evaluation', 'collection', ['collection_id'], ['id'])
+    op.execute(COUNT_EVALUATION_ROWS)
+
+    # Built without locking out writes, see f1c8b3e5a7d2
+    with op.get_context().autocommit_block():
+        for name, table, columns in INDEXES:
+            op.create_index(
+                name, table, columns, unique=False,
+                postgresql_concurrently=True, if_not_exists=True,
+            )
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        for name, table, _ in reversed(INDEXES):
+            op.drop_index(
+                name, table_name=table,
+                postgresql_concurrently=True, if_exists=True,
+            )
+
+    op.execute(COUNT_EVALUATION_ROWS_JOINED)
+    op.drop_constraint('evaluation_collection_id_fkey', 'evaluation', type_='foreignkey')
+    op.drop_constraint('evaluation_ans_pdf_id_fkey', 'evaluation', type_='foreignkey')
+    op.drop_constraint('page_collection_id_fkey', 'page', type_='foreignkey')
+    op.drop_column('evaluation', 'collection_id')
+    op.drop_column('evaluation', 'ans_pdf_id')
+    op.drop_column('page', 'collection_id')
@@ -0,0 +1,69 @@
+"""add results summary tables
+
+Revision ID: d3a9e6b2f8c1
+Revises: c8f4a1e7b3d5
+Create Date: 2025-10-16 15:27:41.902318
+
+"""
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel.sql.sqltypes
+
+
+# revision identifiers, used by Alembic.
+revision = 'd3a9e6b2f8c1'
+down_revision = 'c8f4a1e7b3d5'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('answersheetresult',
+    sa.Column('ans_pdf_id', sa.Uuid(), nullable=False),
+    sa.Column('collection_id', sa.Uuid(), nullable=False),
+    sa.Column('obtained_marks', sa.Float(), nullable=False),
+    sa.Column('max_marks', sa.Float(), nullable=False),
+    sa.Column('questions_graded', sa.Integer(), nullable=False),
+    sa.Column('sections', sqlmodel.sql.sqltypes.AutoString(), nullable=False),
+    sa.Column('updated_at', sa.DateTime(), nullable=False),
+    sa.ForeignKeyConstraint(['ans_pdf_id'], ['anspdf.id'], ondelete='CASCADE'),
+    sa.ForeignKeyConstraint(['collection_id'], ['collection.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('ans_pdf_id')
+    )
+    op.create_index(op.f('ix_answersheetresult_collection_id'), 'answersheetresult', ['collection_id'], unique=False)
+    op.create_table('questionresult',
+    sa.Column('ans_pdf_id', sa.Uuid(), nullable=False),
+    sa.Column('question_no', sqlmodel.sql.sqltypes.AutoString(length=32), nullable=False),
+    sa.Column('collection_id', sa.Uuid(), nullable=False),
+    sa.Column('obtained_marks', sa.Integer(), nullable=False),
+    sa.Column('max_marks', sa.Integer(), nullable=False),
+    sa.Column('counted', sa.Boolean(), nullable=False),
+    sa.ForeignKeyConstraint(['ans_pdf_id'], ['anspdf.id'], ondelete='CASCADE'),
+    sa.ForeignKeyConstraint(['collection_id'], ['collection.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('ans_pdf_id', 'question_no')
+    )
+    op.create_index('ix_questionresult_collection_id_question_no', 'questionresult', ['collection_id', 'question_no'], unique=False)
+
+    # Totalling follows the sections of the question paper, which only the app
+    # reads, so the worker fills the summary of collections graded so far
+    op.execute("""
+    INSERT INTO job (id, kind, payload, status, dedupe_key, attempts, max_attempts, run_after, created_at)
+    SELECT gen_random_uuid(), 'refresh_results_summary',
+        json_build_object('collection_id', c.id)::text, 'queued',
+        'refresh_results_summary:' || c.id, 0, 5, now(), now()
+    FROM collection c
+    WHERE EXISTS (SELECT 1 FROM evaluation e WHERE e.collection_id = c.id)
+    AND NOT EXISTS (
+        SELECT 1 FROM job j
+        WHERE j.dedupe_key = 'refresh_results_summary:' || c.id
+        AND j.status IN ('queued', 'running')
+    )
+    """)
+
+
+def downgrade():
+    op.execute("DELETE FROM job WHERE kind = 'refresh_results_summary' AND status = 'queued'")
+    op.drop_index('ix_questionresult_collection_id_question_no', table_name='questionresult')
+    op.drop_table('questionresult')
+    op.drop_index(op.f('ix_answersheetresult_collection_id'), table_name='answersheetresult')
+    op.drop_table('answersheetresult')
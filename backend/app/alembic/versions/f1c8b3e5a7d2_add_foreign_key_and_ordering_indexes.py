@@ -0,0 +1,48 @@
+"""add foreign key and ordering indexes
+
+Revision ID: f1c8b3e5a7d2
+Revises: e4f7a2c9d1b6
+Create Date: 2025-10-13 10:22:48.196310
+
+"""
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel.sql.sqltypes
+
+
+# revision identifiers, used by Alembic.
+revision = 'f1c8b3e5a7d2'
+down_revision = 'e4f7a2c9d1b6'
+branch_labels = None
+depends_on = None
+
+# (index name, table, columns). Created CONCURRENTLY so uploads and grading keep
+# writing to these tables while the indexes build; that cannot run inside a
+# transaction, hence the autocommit block. IF NOT EXISTS lets a run that was
+# interrupted part way be repeated; a build that failed leaves an INVALID index
+# behind, which has to be dropped by hand first.
+INDEXES = [
+    ('ix_page_ans_pdf_id', 'page', ['ans_pdf_id']),
+    ('ix_evaluation_page_id', 'evaluation', ['page_id']),
+    ('ix_anspdf_ans_pdf_folder_id', 'anspdf', ['ans_pdf_folder_id']),
+    ('ix_anspdffolder_collection_id', 'anspdffolder', ['collection_id']),
+    ('ix_qppdf_collection_id_created_at', 'qppdf', ['collection_id', 'created_at']),
+]
+
+
+def upgrade():
+    with op.get_context().autocommit_block():
+        for name, table, columns in INDEXES:
+            op.create_index(
+                name, table, columns, unique=False,
+                postgresql_concurrently=True, if_not_exists=True,
+            )
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        for name, table, _ in reversed(INDEXES):
+            op.drop_index(
+                name, table_name=table,
+                postgresql_concurrently=True, if_exists=True,
+            )
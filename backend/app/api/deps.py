@@ -1,5 +1,5 @@
 # app/api/deps.py
-from collections.abc import Generator
+from collections.abc import AsyncGenerator, Generator
 from typing import Annotated
 from contextlib import contextmanager
 
@@ -12,7 +12,7 @@ from sqlmodel import Session
 
 from app.core import security
 from app.core.config import settings
-from app.core.db import engine
+from app.core.db import AsyncSession, async_engine, engine, worker_engine
 from app.models import TokenPayload, User
 
 reusable_oauth2 = OAuth2PasswordBearer(
@@ -25,28 +25,46 @@ def get_session() -> Generator[Session, None, None]:
     with Session(engine) as session:
         yield session
 
+# Session for one short unit of work in a background job, on the worker's own
+# pool. Objects stay loaded after commit and after the session is closed, so a
+# job can keep using them across LLM calls without holding a connection.
+@contextmanager
+def get_worker_session() -> Generator[Session, None, None]:
+    with Session(worker_engine, expire_on_commit=False) as session:
+        yield session
+
 # The dependency for FastAPI endpoints now uses the new get_session
 # It's important to keep the function for `Depends` separate from the raw context manager
 def get_db() -> Generator[Session, None, None]:
     with Session(engine) as session:
         yield session
 
+# For `async def` endpoints. Objects are not expired on commit since they cannot
+# be lazily reloaded outside of an await; use `await session.refresh(obj)` instead.
+# Helpers written for the sync Session run through `await session.run_sync(...)`.
+async def get_async_db() -> AsyncGenerator[AsyncSession, None]:
+    async with AsyncSession(async_engine, expire_on_commit=False) as session:
+        yield session
+
 SessionDep = Annotated[Session, Depends(get_db)]
+AsyncSessionDep = Annotated[AsyncSession, Depends(get_async_db)]
 TokenDep = Annotated[str, Depends(reusable_oauth2)]
 
 
-def get_current_user(session: SessionDep, token: TokenDep) -> User:
+def decode_token(token: str) -> TokenPayload:
     try:
         payload = jwt.decode(
             token, settings.SECRET_KEY, algorithms=[security.ALGORITHM]
         )
-        token_data = TokenPayload(**payload)
+        return TokenPayload(**payload)
     except (InvalidTokenError, ValidationError):
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="Could not validate credentials",
         )
-    user = session.get(User, token_data.sub)
+
+
+def check_user(user: User | None) -> User:
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
     if not user.is_active:
@@ -54,7 +72,20 @@ def get_current_user(session: SessionDep, token: TokenDep) -> User:
     return user
 
 
+def get_current_user(session: SessionDep, token: TokenDep) -> User:
+    token_data = decode_token(token)
+    return check_user(session.get(User, token_data.sub))
+
+
+# Same as get_current_user, on the request's async session, so that async
+# endpoints do not also check out a connection from the sync pool
+async def get_current_user_async(session: AsyncSessionDep, token: TokenDep) -> User:
+    token_data = decode_token(token)
+    return check_user(await session.get(User, token_data.sub))
+
+
 CurrentUser = Annotated[User, Depends(get_current_user)]
+AsyncCurrentUser = Annotated[User, Depends(get_current_user_async)]
 
 
 def get_current_active_superuser(current_user: CurrentUser) -> User:
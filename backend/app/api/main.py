@@ -1,6 +1,6 @@
 from fastapi import APIRouter
 
-from app.api.routes import items, login, private, users, utils, upload, download, evaluate, collections, evaluations
+from app.api.routes import items, login, private, users, utils, upload, download, evaluate, collections, evaluations, ingest
 from app.core.config import settings
 
 api_router = APIRouter()
@@ -11,6 +11,7 @@ api_router.include_router(items.router)
 api_router.include_router(upload.router)
 api_router.include_router(download.router)
 api_router.include_router(evaluate.router)
+api_router.include_router(ingest.router)
 api_router.include_router(collections.router)
 api_router.include_router(evaluations.router)
 
@@ -0,0 +1,64 @@
+# app/api/pagination.py
+
+import base64
+import json
+import uuid
+from collections.abc import Sequence
+from datetime import datetime
+from typing import Any
+
+from fastapi import HTTPException
+from sqlalchemy import tuple_
+from sqlmodel import col
+
+
+def encode_cursor(sort_value: datetime, id: uuid.UUID) -> str:
+    """Opaque cursor pointing just past the row with this sort key."""
+    raw = json.dumps([sort_value.isoformat(), str(id)]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> tuple[datetime, uuid.UUID]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        sort_value, id = json.loads(raw)
+        return datetime.fromisoformat(sort_value), uuid.UUID(id)
+    except (ValueError, TypeError) as e:
+        raise HTTPException(status_code=400, detail="Invalid cursor") from e
+
+
+def paginate(
+    statement: Any,
+    sort_column: Any,
+    id_column: Any,
+    *,
+    skip: int,
+    limit: int,
+    cursor: str | None,
+    descending: bool = False,
+) -> Any:
+    """
+    Order `statement` by (sort_column, id_column), which makes the order stable,
+    and select one page of it. With a cursor the page starts right after the row
+    the cursor was made from, found through an index on the sort key however deep
+    the page is; without one the old `skip` offset is used.
+    """
+    key = tuple_(sort_column, id_column)
+    if cursor is not None:
+        after = decode_cursor(cursor)
+        statement = statement.where(key < after if descending else key > after)
+    else:
+        statement = statement.offset(skip)
+    if descending:
+        order = (col(sort_column).desc(), col(id_column).desc())
+    else:
+        order = (col(sort_column).asc(), col(id_column).asc())
+    return statement.order_by(*order).limit(limit)
+
+
+def next_cursor(rows: Sequence[Any], sort_column: Any, limit: int) -> str | None:
+    """Cursor for the page after `rows`, or None when `rows` is the last page."""
+    if not rows or len(rows) < limit:
+        return None
+    last = rows[-1]
+    return encode_cursor(getattr(last, sort_column.key), last.id)
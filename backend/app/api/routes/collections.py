@@ -4,9 +4,11 @@ import uuid
 from typing import Any
 
 from fastapi import APIRouter, HTTPException
-from sqlmodel import func, select
+from sqlmodel import select
 
-from app.api.deps import CurrentUser, SessionDep
+from app.api.deps import AsyncCurrentUser, AsyncSessionDep, CurrentUser, SessionDep
+from app.api.pagination import next_cursor, paginate
+from app.core.config import settings
 from app.models import (
     Collection,
     CollectionCreate,
@@ -14,39 +16,57 @@ from app.models import (
     CollectionsPublic,
     CollectionUpdate,
     Message,
+    UserRowCounts,
 )
+from app.services.blob_store import blob_store
+from app.services.row_counts import row_counts
 
 router = APIRouter(prefix="/collections", tags=["collections"])
 
 
+def check_render_profile(render_profile: str | None) -> None:
+    if render_profile is not None and render_profile not in settings.RENDER_PROFILES:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unknown render profile. Available profiles: {', '.join(settings.RENDER_PROFILES)}",
+        )
+
+
 @router.get("/", response_model=CollectionsPublic)
-def read_collections(
-    session: SessionDep, current_user: CurrentUser, skip: int = 0, limit: int = 100
+async def read_collections(
+    session: AsyncSessionDep,
+    current_user: AsyncCurrentUser,
+    skip: int = 0,
+    limit: int = 100,
+    cursor: str | None = None,
+    include_count: bool = True,
 ) -> Any:
     """
-    Retrieve collections.
+    Retrieve collections, oldest first. Pass the returned `next_cursor` as
+    `cursor` to get the next page. The count of all collections a superuser
+    sees is an estimate.
     """
+    statement = select(Collection)
+    count = None
     if current_user.is_superuser:
-        count_statement = select(func.count()).select_from(Collection)
-        count = session.exec(count_statement).one()
-        statement = select(Collection).offset(skip).limit(limit)
-        collections = session.exec(statement).all()
+        if include_count:
+            count = await session.run_sync(row_counts.estimate, Collection)
     else:
-        count_statement = (
-            select(func.count())
-            .select_from(Collection)
-            .where(Collection.user_id == current_user.id)
-        )
-        count = session.exec(count_statement).one()
-        statement = (
-            select(Collection)
-            .where(Collection.user_id == current_user.id)
-            .offset(skip)
-            .limit(limit)
-        )
-        collections = session.exec(statement).all()
+        statement = statement.where(Collection.user_id == current_user.id)
+        if include_count:
+            count = await session.run_sync(
+                row_counts.for_user, current_user.id, UserRowCounts.collections
+            )
+    statement = paginate(
+        statement, Collection.created_at, Collection.id, skip=skip, limit=limit, cursor=cursor
+    )
+    collections = (await session.exec(statement)).all()
 
-    return CollectionsPublic(data=collections, count=count) # type: ignore
+    return CollectionsPublic(
+        data=collections,
+        count=count,
+        next_cursor=next_cursor(collections, Collection.created_at, limit),
+    )
 
 
 @router.get("/{id}", response_model=CollectionPublic)
@@ -69,6 +89,7 @@ def create_collection(
     """
     Create a new collection.
     """
+    check_render_profile(collection_in.render_profile)
     collection = Collection.model_validate(collection_in, update={"user_id": current_user.id})
     session.add(collection)
     session.commit()
@@ -92,6 +113,7 @@ def update_collection(
         raise HTTPException(status_code=404, detail="Collection not found")
     if not current_user.is_superuser and (collection.user_id != current_user.id):
         raise HTTPException(status_code=403, detail="Not enough permissions")
+    check_render_profile(collection_in.render_profile)
     update_dict = collection_in.model_dump(exclude_unset=True)
     collection.sqlmodel_update(update_dict)
     session.add(collection)
@@ -112,6 +134,13 @@ def delete_collection(
         raise HTTPException(status_code=404, detail="Collection not found")
     if not current_user.is_superuser and (collection.user_id != current_user.id):
         raise HTTPException(status_code=403, detail="Not enough permissions")
+
+    # Stored PDFs are shared between collections, so drop this collection's
+    # references once its rows are gone instead of deleting files directly
+    content_hashes = blob_store.collection_references(session, [id])
+
     session.delete(collection)
     session.commit()
+    for content_hash in content_hashes:
+        blob_store.release(session, content_hash)
     return Message(message="Collection deleted successfully")
\ No newline at end of file
@@ -1,18 +1,34 @@
 # app/api/routes/evaluate.py
 
 
+from dataclasses import dataclass
 from typing import Dict, Any, List
 from pathlib import Path
-from fastapi import APIRouter, HTTPException, BackgroundTasks
-from sqlmodel import select, func, join, desc
+from fastapi import APIRouter, HTTPException
+from sqlmodel import Session, col, delete, select, func, join, desc, update
 import json
 import logging
 import asyncio
 import uuid
 
-from app.services.llm_service import LLMService
+from app.services.blob_store import blob_store
+from app.services.job_queue import job_handler, job_queue
+from app.services.evaluation_prompt import (
+    EvaluationPrompt,
+    compile_evaluation_prompt,
+    question_ids,
+)
+from app.services.llm_service import CachedPrefix, LLMService, estimate_tokens
+from app.services.omr import GridPage, McqQuestion, mcq_questions, omr_grader
+from app.services.page_batching import map_batch_results, pages_per_batch, split_batches
+from app.services.page_routing import (
+    build_routing_prompt,
+    fill_unrouted_pages,
+    parse_page_routes,
+)
+from app.services.results_summary import results_summary
 from app.core.config import settings
-from app.api.deps import SessionDep, CurrentUser, get_session
+from app.api.deps import AsyncCurrentUser, AsyncSessionDep, get_worker_session
 from app.models import (
     AnsPdf,
     AnsPdfFolder,
@@ -31,22 +47,35 @@ router = APIRouter(prefix="/evaluate", tags=["evaluate"])
 
 # Initialize LLM service
 llm_service = LLMService(api_key=settings.GEMINI_API_KEY)
+# Cheaper model for tagging pages with the questions they answer
+routing_llm_service = LLMService(
+    api_key=settings.GEMINI_API_KEY, model=settings.EVALUATION_ROUTING_MODEL
+)
 
 # Define the root directory for uploads and evaluations
 UPLOAD_DIR = Path("uploads")
 
+# Caps the LLM calls in flight across every evaluation run in this process
+evaluation_semaphore = asyncio.Semaphore(settings.EVALUATION_MAX_CONCURRENCY)
+
+EVALUATE_COLLECTION_JOB = "evaluate_collection"
+EVALUATE_ANSWER_SHEET_JOB = "evaluate_answer_sheet"
+
 
 @router.post("/{collection_id}/", status_code=200)
 async def evaluate_answersheet(
-    session: SessionDep,
-    current_user: CurrentUser,
+    session: AsyncSessionDep,
+    current_user: AsyncCurrentUser,
     collection_id: uuid.UUID,
-    background_tasks: BackgroundTasks,
-) -> dict:
+    force: bool = False,
+) -> dict[str, Any]:
     """
     Initiate the evaluation for all answer sheets in a collection.
+    Pages that already have results are skipped, so calling this again resumes an
+    interrupted run. With `force=true` every page is graded again, without reusing
+    cached LLM responses, and its previous results are replaced.
     """
-    collection = session.get(Collection, collection_id)
+    collection = await session.get(Collection, collection_id)
     if not collection:
         raise HTTPException(status_code=404, detail="Collection not found.")
 
@@ -54,10 +83,12 @@ async def evaluate_answersheet(
         raise HTTPException(status_code=403, detail="Not enough permissions to access this collection.")
 
     # Find the most recently uploaded QpPdf for this collection
-    qp_pdf = session.exec(
-        select(QpPdf)
-        .where(QpPdf.collection_id == collection_id)
-        .order_by(desc(QpPdf.created_at))
+    qp_pdf = (
+        await session.exec(
+            select(QpPdf)
+            .where(QpPdf.collection_id == collection_id)
+            .order_by(desc(QpPdf.created_at))
+        )
     ).first()
 
     if not qp_pdf or not qp_pdf.json_path:
@@ -66,167 +97,803 @@ async def evaluate_answersheet(
             detail="No valid question paper found for this collection. Please upload and process one first."
         )
 
-    # Count total AnsPdfs to initialize the monitor
+    collection_ans_pdf_ids = (
+        select(AnsPdf.id)
+        .join(AnsPdfFolder)
+        .where(AnsPdfFolder.collection_id == collection_id)
+    )
+    if force:
+        # Queue every page again; old results stay until a page's new ones replace them
+        await session.execute(
+            update(Page)
+            .where(col(Page.collection_id) == collection_id)
+            .values(is_evaluated=False)
+        )
+        await session.execute(
+            update(AnsPdf)
+            .where(col(AnsPdf.id).in_(collection_ans_pdf_ids))
+            .values(is_evaluated=False)
+        )
+        collection.is_evaluated = False
+        session.add(collection)
+
+    # Start the monitor from the sheets that are already evaluated
+    await session.run_sync(refresh_evaluation_monitor, collection_id)
+
+    # Only one evaluation run per collection can be queued or running
+    job = await session.run_sync(
+        job_queue.enqueue,
+        EVALUATE_COLLECTION_JOB,
+        {"collection_id": collection_id, "qp_pdf_id": qp_pdf.id, "force": force},
+        dedupe_key=f"{EVALUATE_COLLECTION_JOB}:{collection_id}",
+    )
+    if job is None:
+        await session.rollback()
+        raise HTTPException(
+            status_code=409,
+            detail="An evaluation for this collection is already in progress.",
+        )
+
+    await session.commit()
+
+    return {
+        "message": "Evaluation process for the collection has been queued.",
+        "job_id": str(job.id),
+    }
+
+
+def parse_evaluation_response(eval_result_str: str) -> Any:
+    """Strip code fences from an LLM response and parse it as JSON."""
+    cleaned_response = eval_result_str.strip()
+    if cleaned_response.startswith("```"):
+        cleaned_response = cleaned_response.strip("`")
+        cleaned_response = "\n".join(cleaned_response.split("\n")[1:])
+        if cleaned_response.strip().endswith("```"):
+            cleaned_response = "\n".join(cleaned_response.split("\n")[:-1])
+
+    safe_response = cleaned_response.replace("\\", "\\\\")
+    return json.loads(safe_response)
+
+
+async def save_page_result(
+    page_id: uuid.UUID, image_path: str, eval_data: list[dict[str, Any]]
+) -> Path:
+    """Save the evaluation items of a page to a JSON file next to its image."""
+    eval_folder = Path(image_path).parent / "evaluation"
+    eval_file_path = eval_folder / f"{page_id}_result.json"
+
+    def write_result() -> None:
+        eval_folder.mkdir(exist_ok=True)
+        with open(eval_file_path, "w") as f:
+            json.dump(eval_data, f, indent=4)
+
+    await asyncio.to_thread(write_result)
+    return eval_file_path
+
+
+async def evaluate_page(
+    page_id: uuid.UUID,
+    image_path: str,
+    prompt: EvaluationPrompt,
+    collection_semaphore: asyncio.Semaphore,
+    use_cached_prefix: bool = False,
+    refresh: bool = False,
+) -> tuple[list[dict[str, Any]], Path] | None:
+    """
+    Grade a single page with the LLM and save the raw result next to its image.
+    Runs concurrently with other pages, so it must not touch the database session.
+    With `use_cached_prefix`, the prompt's prefix is sent as cached content.
+    With `refresh`, a cached response for the page is not reused.
+    Returns the parsed evaluation items and the result file path, or None on failure.
+    """
+    try:
+        # Take the per-collection slot first so that a collection waiting on its
+        # own limit does not hold on to a global slot
+        async with collection_semaphore, evaluation_semaphore:
+            cached_prefix = await prompt_cached_prefix(prompt, use_cached_prefix)
+            eval_result_str, cache_key = await llm_service.process_images(
+                image_paths=[image_path],
+                prompt=prompt.suffix if cached_prefix else prompt.text,
+                cached_prefix=cached_prefix,
+                refresh=refresh,
+            )
+
+        # Try to parse the LLM's response
+        eval_data = parse_evaluation_response(eval_result_str)
+        if not isinstance(eval_data, list):
+            logger.error(f"Evaluation failed for page {page_id}: {eval_data}")
+            return None
+        await llm_service.cache_response(cache_key, eval_result_str)
+
+        eval_file_path = await save_page_result(page_id, image_path, eval_data)
+        return eval_data, eval_file_path
+
+    except json.JSONDecodeError as e:
+        logger.error(f"LLM response was not valid JSON for page {page_id}: {e}")
+    except Exception as e:
+        logger.error(f"Evaluation failed for page {page_id}: {e}")
+    return None
+
+
+async def evaluate_page_batch(
+    pages: list[tuple[uuid.UUID, str]],
+    prompt: EvaluationPrompt,
+    collection_semaphore: asyncio.Semaphore,
+    use_cached_prefix: bool = False,
+    refresh: bool = False,
+) -> dict[uuid.UUID, tuple[list[dict[str, Any]], Path]]:
+    """
+    Grade consecutive (page_id, image_path) pages of one answer sheet in a single
+    LLM call and save each page's results next to its image. Like `evaluate_page`
+    it must not touch the database session. Pages missing from the response, or
+    the whole batch on failure, are left out of the returned mapping.
+    """
+    if not prompt.batch:
+        page_id, image_path = pages[0]
+        result = await evaluate_page(
+            page_id, image_path, prompt, collection_semaphore, use_cached_prefix, refresh
+        )
+        return {page_id: result} if result else {}
+
+    page_ids = [page_id for page_id, _ in pages]
+    try:
+        async with collection_semaphore, evaluation_semaphore:
+            cached_prefix = await prompt_cached_prefix(prompt, use_cached_prefix)
+            eval_result_str, cache_key = await llm_service.process_images(
+                image_paths=[image_path for _, image_path in pages],
+                prompt=prompt.suffix if cached_prefix else prompt.text,
+                image_labels=[f"Page {i}:" for i in range(1, len(pages) + 1)],
+                cached_prefix=cached_prefix,
+                refresh=refresh,
+            )
+
+        page_results = map_batch_results(
+            parse_evaluation_response(eval_result_str), page_ids
+        )
+        # A response missing pages would be served again on the retry
+        if len(page_results) == len(pages):
+            await llm_service.cache_response(cache_key, eval_result_str)
+        image_paths = dict(pages)
+        results = {}
+        for page_id, eval_data in page_results.items():
+            eval_file_path = await save_page_result(
+                page_id, image_paths[page_id], eval_data
+            )
+            results[page_id] = (eval_data, eval_file_path)
+
+        missing = len(pages) - len(results)
+        if missing:
+            logger.error(f"LLM returned no results for {missing} of {len(pages)} batched pages")
+        return results
+
+    except json.JSONDecodeError as e:
+        logger.error(f"LLM response was not valid JSON for pages {page_ids}: {e}")
+    except Exception as e:
+        logger.error(f"Evaluation failed for pages {page_ids}: {e}")
+    return {}
+
+
+async def prompt_cached_prefix(
+    prompt: EvaluationPrompt, use_cached_prefix: bool
+) -> CachedPrefix | None:
+    """
+    The cached content for a prompt's prefix, looked up right before each call:
+    cached content expires, so a handle must not be kept for a whole run.
+    """
+    if not use_cached_prefix:
+        return None
+    return await llm_service.cache_prefix(prompt.prefix, prompt.fingerprint)
+
+
+def prompt_tokens(prompt: EvaluationPrompt, use_cached_prefix: bool) -> float:
+    """Input tokens a grading call pays for, counting a cached prefix at its discount."""
+    if not use_cached_prefix:
+        return len(prompt.text) // 4
+    return (
+        len(prompt.suffix) // 4
+        + len(prompt.prefix) // 4 * settings.LLM_CONTEXT_CACHE_TOKEN_COST
+    )
+
+
+def routing_pays_off(
+    qp_data: Any,
+    prompt: EvaluationPrompt,
+    use_cached_prefix: bool,
+    page_count: int,
+    batch_size: int,
+) -> bool:
+    """
+    Whether routing the pages of a sheet can save more prompt tokens than it
+    costs. Routing sends every page image once more; at best each grading call
+    then leaves the question paper out of its prompt.
+    """
+    grading_calls = -(-page_count // max(1, batch_size))
+    saved_per_call = prompt_tokens(prompt, use_cached_prefix) - len(prompt.suffix) // 4
+    return saved_per_call * grading_calls > estimate_tokens(
+        build_routing_prompt(qp_data), page_count
+    )
+
+
+async def route_answer_sheet(
+    pages: list[tuple[uuid.UUID, str]],
+    qp_data: Any,
+    collection_semaphore: asyncio.Semaphore,
+    refresh: bool = False,
+) -> dict[uuid.UUID, list[str] | None]:
+    """
+    Tag each (page_id, image_path) page of an answer sheet with the question ids
+    it answers using one call to the routing model. Pages the router misses
+    continue the previous page's last question; if routing fails altogether every
+    page falls back to the whole question paper.
+    """
+    page_ids = [page_id for page_id, _ in pages]
+    routes: dict[uuid.UUID, list[str]] = {}
+    try:
+        async with collection_semaphore, evaluation_semaphore:
+            route_result_str, cache_key = await routing_llm_service.process_images(
+                image_paths=[image_path for _, image_path in pages],
+                prompt=build_routing_prompt(qp_data),
+                image_labels=[f"Page {i}:" for i in range(1, len(pages) + 1)],
+                refresh=refresh,
+            )
+        routes = parse_page_routes(
+            parse_evaluation_response(route_result_str), page_ids, question_ids(qp_data)
+        )
+        if routes:
+            await routing_llm_service.cache_response(cache_key, route_result_str)
+    except Exception as e:
+        logger.warning(f"Routing failed for pages {page_ids}, using the full question paper: {e}")
+    return fill_unrouted_pages(page_ids, routes)
+
+
+async def merge_response_grid_results(
+    page_id: uuid.UUID,
+    image_path: str,
+    local_results: list[dict[str, Any]],
+    eval_data: list[dict[str, Any]],
+) -> tuple[list[dict[str, Any]], Path]:
+    """
+    Combine the multiple choice answers read off a response grid page with the
+    LLM's results for the rest of the page, and save them next to its image.
+    """
+    # Keep the grid's reading of the questions graded locally
+    graded = {item["question_no"] for item in local_results}
+    merged = local_results + [
+        item for item in eval_data if item.get("question_no") not in graded
+    ]
+    eval_file_path = await save_page_result(page_id, image_path, merged)
+    return merged, eval_file_path
+
+
+async def skip_page_batch(
+    pages: list[tuple[uuid.UUID, str]],
+) -> dict[uuid.UUID, tuple[list[dict[str, Any]], Path]]:
+    """Empty results for (page_id, image_path) pages that leave nothing to the LLM."""
+    return {
+        page_id: ([], await save_page_result(page_id, image_path, []))
+        for page_id, image_path in pages
+    }
+
+
+async def evaluate_answer_sheet(
+    pages: list[tuple[uuid.UUID, str]],
+    qp_data: Any,
+    prompt: EvaluationPrompt,
+    batch_size: int,
+    collection_semaphore: asyncio.Semaphore,
+    use_cached_prefix: bool = False,
+    route: bool = False,
+    mcqs: list[McqQuestion] | None = None,
+    refresh: bool = False,
+) -> tuple[
+    dict[uuid.UUID, list[str] | None],
+    dict[uuid.UUID, tuple[list[dict[str, Any]], Path]],
+]:
+    """
+    Grade the (page_id, image_path) pages of one answer sheet in batches. With
+    `mcqs`, multiple choice answers marked on a response grid are graded from the
+    page images first and left out of every batch's prompt, while the grid pages
+    stay in the batches for any written answers on them. With `route`, the pages
+    are tagged first, if that is likely to save tokens, and each batch whose
+    pages were all tagged only carries the matching questions. A batch keeps the
+    full (possibly cached) prompt when leaving questions out would not make it
+    cheaper. With `refresh`, cached LLM responses are not reused.
+    Returns the page tags and the results.
+    """
+    grid_pages: dict[uuid.UUID, GridPage] = {}
+    if mcqs:
+        readings = await asyncio.to_thread(
+            omr_grader.grade_answer_sheet, [image_path for _, image_path in pages], mcqs
+        )
+        for (page_id, _), grid_page in zip(pages, readings or []):
+            if grid_page is not None:
+                grid_pages[page_id] = grid_page
+        if grid_pages:
+            logger.info(
+                f"Graded {sum(len(page.results) for page in grid_pages.values())} of "
+                f"{len(mcqs)} multiple choice answers from the response grid"
+            )
+    graded = {
+        item["question_no"] for grid_page in grid_pages.values() for item in grid_page.results
+    }
+
+    routes: dict[uuid.UUID, list[str] | None] = {}
+    if (
+        route
+        and pages
+        and routing_pays_off(qp_data, prompt, use_cached_prefix, len(pages), batch_size)
+    ):
+        routes = await route_answer_sheet(pages, qp_data, collection_semaphore, refresh)
+
+    batch_tasks = []
+    for batch in split_batches(pages, batch_size):
+        batch_prompt, batch_cached_prefix = prompt, use_cached_prefix
+        tags = [routes.get(page_id) for page_id, _ in batch]
+        only: set[str] | None = None
+        if routes and all(tags):
+            only = {tag for page_tags in tags for tag in page_tags}  # type: ignore[union-attr]
+        elif graded:
+            only = set(question_ids(qp_data))
+        if only is not None:
+            only -= graded
+            if not only:
+                batch_tasks.append(skip_page_batch(batch))
+                continue
+            narrowed = compile_evaluation_prompt(qp_data, prompt.batch, only=only)
+            if prompt_tokens(narrowed, False) < prompt_tokens(prompt, use_cached_prefix):
+                batch_prompt, batch_cached_prefix = narrowed, False
+        batch_tasks.append(
+            evaluate_page_batch(
+                batch, batch_prompt, collection_semaphore, batch_cached_prefix, refresh
+            )
+        )
+
+    results: dict[uuid.UUID, tuple[list[dict[str, Any]], Path]] = {}
+    for page_results in await asyncio.gather(*batch_tasks):
+        results.update(page_results)
+
+    image_paths = dict(pages)
+    for page_id, grid_page in grid_pages.items():
+        # Tag grid pages with their grid questions as well as the routed ones
+        page_tags = routes.get(page_id) or []
+        routes[page_id] = grid_page.question_ids + [
+            tag for tag in page_tags if tag not in grid_page.question_ids
+        ]
+        # A page whose batch failed stays pending
+        if page_id in results:
+            results[page_id] = await merge_response_grid_results(
+                page_id, image_paths[page_id], grid_page.results, results[page_id][0]
+            )
+    return routes, results
+
+
+@dataclass
+class EvaluationPlan:
+    """Everything a run needs to grade pages against one question paper."""
+
+    qp_data: Any
+    prompt: EvaluationPrompt
+    batch_size: int
+    # Send the prompt's prefix as cached content, looked up per call
+    use_cached_prefix: bool
+    route: bool
+    # Multiple choice questions to read off response grids, in grid order
+    mcqs: list[McqQuestion]
+    # Ask the LLM again rather than reuse cached responses (forced runs)
+    refresh: bool = False
+
+
+async def plan_evaluation(qp_pdf: QpPdf, refresh: bool = False) -> EvaluationPlan | None:
+    """
+    Load a parsed question paper and compile the prompt, batch size, routing
+    decision and multiple choice answer key for grading against it. Returns None
+    if its data is missing.
+    """
+    if not qp_pdf.json_path:
+        logger.error("QpPdf json_path is None.")
+        return None
+    qp_data_path = Path(qp_pdf.json_path)
+    if not qp_data_path.exists():
+        logger.error(f"QpData JSON file not found at: {qp_data_path}")
+        return None
+
+    with open(qp_data_path, "r") as f:
+        qp_data = json.load(f)
+
+    # Compile the prompt once per run; it is the same for every page
+    prompt = compile_evaluation_prompt(qp_data, batch=True)
+    batch_size = pages_per_batch(
+        prompt_tokens=estimate_tokens(prompt.text, 0),
+        token_budget=settings.EVALUATION_BATCH_TOKEN_BUDGET,
+        tokens_per_page=settings.LLM_TOKENS_PER_IMAGE
+        + settings.LLM_EXPECTED_OUTPUT_TOKENS,
+        max_pages=settings.EVALUATION_MAX_PAGES_PER_BATCH,
+    )
+    if batch_size == 1:
+        prompt = compile_evaluation_prompt(qp_data, batch=False)
+
+    # Register the prefix now to find out whether caching is available at all
+    use_cached_prefix = (
+        settings.LLM_CONTEXT_CACHE_ENABLED
+        and len(prompt.prefix) // 4 >= settings.LLM_CONTEXT_CACHE_MIN_TOKENS
+        and await llm_service.cache_prefix(prompt.prefix, prompt.fingerprint) is not None
+    )
+
+    route = (
+        settings.EVALUATION_ROUTING_ENABLED
+        and estimate_tokens(prompt.prefix, 0)
+        >= settings.EVALUATION_ROUTING_MIN_PROMPT_TOKENS
+        and bool(question_ids(qp_data))
+    )
+    mcqs = mcq_questions(qp_data) if settings.OMR_ENABLED else []
+    return EvaluationPlan(
+        qp_data, prompt, batch_size, use_cached_prefix, route, mcqs, refresh
+    )
+
+
+def latest_parsed_qp_pdf(session: Session, collection_id: uuid.UUID) -> QpPdf | None:
+    """The most recently uploaded question paper of a collection that has been parsed."""
+    return session.exec(
+        select(QpPdf)
+        .where(QpPdf.collection_id == collection_id, col(QpPdf.json_path).is_not(None))
+        .order_by(desc(QpPdf.created_at))
+    ).first()
+
+
+def refresh_evaluation_monitor(session: Session, collection_id: uuid.UUID) -> None:
+    """
+    Recount the collection's evaluated answer sheets into its monitor (creating
+    it if needed) and mark the collection evaluated once every sheet is. Several
+    jobs may grade the same collection, so counts are taken from the database
+    rather than incremented. Does not commit.
+    """
     total_pdfs_statement = (
         select(func.count(AnsPdf.id)) # type: ignore
         .join(AnsPdfFolder)
         .where(AnsPdfFolder.collection_id == collection_id)
     )
     total_pdfs = session.exec(total_pdfs_statement).one()
+    evaluated_pdfs = session.exec(
+        total_pdfs_statement.where(AnsPdf.is_evaluated == True)  # noqa: E712
+    ).one()
 
-    # Create or update the EvaluationMonitor record
     monitor_record = session.exec(
         select(EvaluationMonitor)
         .where(EvaluationMonitor.collection_id == collection_id)
     ).first()
-    
-    if monitor_record:
-        monitor_record.total_pdfs = total_pdfs
-        monitor_record.evaluated_pdfs = 0
-    else:
+    if not monitor_record:
         monitor_record = EvaluationMonitor(
-            collection_id=collection_id,
-            estimated_total=0, # This can be updated in the background task
-            total_pdfs=total_pdfs,
-            evaluated_pdfs=0,
+            collection_id=collection_id, estimated_total=0, total_pdfs=0, evaluated_pdfs=0
         )
+    monitor_record.total_pdfs = total_pdfs
+    monitor_record.evaluated_pdfs = evaluated_pdfs
     session.add(monitor_record)
-    session.commit()
-    session.refresh(monitor_record)
-    
-    background_tasks.add_task(
-        process_evaluation_for_collection, collection_id, qp_pdf.id
-    )
 
-    return {"message": "Evaluation process for the collection started in the background."}
+    if total_pdfs and evaluated_pdfs >= total_pdfs:
+        collection = session.get(Collection, collection_id)
+        if collection and not collection.is_evaluated:
+            collection.is_evaluated = True
+            session.add(collection)
+
+
+def enqueue_answer_sheet_evaluations(
+    session: Session, ans_pdf_ids: list[uuid.UUID]
+) -> int:
+    """
+    Queue an evaluate_answer_sheet job for each answer sheet, skipping sheets
+    that already have one queued or running. Does not commit, so the jobs are
+    created together with the change that triggered them. Returns the number of
+    jobs queued.
+    """
+    queued = 0
+    for ans_pdf_id in ans_pdf_ids:
+        job = job_queue.enqueue(
+            session,
+            EVALUATE_ANSWER_SHEET_JOB,
+            {"ans_pdf_id": ans_pdf_id},
+            dedupe_key=f"{EVALUATE_ANSWER_SHEET_JOB}:{ans_pdf_id}",
+        )
+        queued += job is not None
+    return queued
+
+
+def enqueue_pending_answer_sheets(session: Session, collection_id: uuid.UUID) -> int:
+    """
+    Queue evaluation of every answer sheet of a collection that is not evaluated
+    yet, e.g. once its question paper has been parsed. Does not commit.
+    """
+    pending = session.exec(
+        select(AnsPdf.id)
+        .join(AnsPdfFolder)
+        .where(
+            AnsPdfFolder.collection_id == collection_id,
+            AnsPdf.is_evaluated == False,  # noqa: E712
+            # The ingest job queues whatever it leaves ungraded itself
+            AnsPdf.is_ingesting == False,  # noqa: E712
+        )
+        .order_by(col(AnsPdf.uploaded_at))
+    ).all()
+    return enqueue_answer_sheet_evaluations(session, list(pending))
+
+
+def save_answer_sheet_results(
+    session: Session,
+    collection_id: uuid.UUID,
+    ans_pdf_id: uuid.UUID,
+    page_ids: list[uuid.UUID],
+    routes: dict[uuid.UUID, list[str] | None],
+    results: dict[uuid.UUID, tuple[list[dict[str, Any]], Path]],
+) -> None:
+    """
+    Write the graded pages of one answer sheet, replacing each page's results
+    from earlier runs, refresh the sheet's results summary and mark the sheet
+    evaluated once none of its pages is pending. Does not commit.
+    """
+    # Serialize writers of this sheet's results (a collection run and a
+    # per-sheet job may overlap) so replacing them cannot leave duplicates
+    ans_pdf = session.exec(
+        select(AnsPdf).where(AnsPdf.id == ans_pdf_id).with_for_update()
+    ).first()
+    if not ans_pdf:
+        return
+
+    for page_id in page_ids:
+        page = session.get(Page, page_id)
+        if not page:
+            continue
+        page_tags = routes.get(page_id)
+        if page_tags:
+            page.question_nos = ",".join(page_tags)
+            session.add(page)
+
+        result = results.get(page_id)
+        if result is None:
+            continue
+        eval_data, eval_file_path = result
+
+        # Replace any results from an earlier run of this page
+        session.execute(
+            delete(Evaluation).where(Evaluation.page_id == page_id)  # type: ignore
+        )
+
+        # Loop through the parsed data and create a new Evaluation record for each result
+        for evaluation_item in eval_data:
+            evaluation_record = Evaluation(
+                question_no=evaluation_item.get("question_no"),
+                obtained_marks=evaluation_item["obtained_marks"],
+                max_marks=evaluation_item["max_marks"],
+                feedback=evaluation_item["feedback"],
+                evaluation_json_path=str(eval_file_path), # Store the path to the raw JSON
+                page_id=page_id,
+                ans_pdf_id=ans_pdf_id,
+                collection_id=collection_id,
+            )
+            session.add(evaluation_record)
+
+        # Mark the page as evaluated
+        page.is_evaluated = True
+        session.add(page)
+        logger.info(f"Evaluation for Page {page_id} completed and records saved.")
+
+    pending_pages = session.exec(
+        select(func.count(Page.id))  # type: ignore
+        .where(Page.ans_pdf_id == ans_pdf_id, Page.is_evaluated == False)  # noqa: E712
+    ).one()
+    if not pending_pages:
+        ans_pdf.is_evaluated = True
+        session.add(ans_pdf)
+    results_summary.refresh_answer_sheet(session, collection_id, ans_pdf_id)
+    refresh_evaluation_monitor(session, collection_id)
 
 
-async def process_evaluation_for_collection(collection_id: uuid.UUID, qp_pdf_id: uuid.UUID):
+async def grade_answer_sheets(
+    collection_id: uuid.UUID,
+    ans_pdf_ids: list[uuid.UUID],
+    plan: EvaluationPlan,
+) -> None:
     """
-    Background task to handle image processing and evaluation.
-    This task creates its own database session.
+    Grade the pages of the given answer sheets that have no results yet, so a
+    retried or repeated run picks up where the last one stopped. Pages are graded
+    concurrently, bounded by a global and a per-collection semaphore, while
+    results are committed one AnsPdf at a time in order. The database is only
+    used in short sessions before grading and around each sheet's commit, never
+    while waiting on the LLM, and in a thread so that grading carries on
+    meanwhile.
     """
-    await asyncio.sleep(1)
+
+    def load_pending_pages() -> list[tuple[uuid.UUID, list[tuple[uuid.UUID, str]]]]:
+        pages_by_pdf = []
+        unwritten = []
+        with get_worker_session() as session:
+            for ans_pdf_id in ans_pdf_ids:
+                ans_pdf = session.get(AnsPdf, ans_pdf_id)
+                # An ingest job queues whatever it leaves ungraded itself
+                if not ans_pdf or ans_pdf.is_evaluated or ans_pdf.is_ingesting:
+                    continue
+                if not blob_store.pages_written(
+                    session, ans_pdf.content_hash, ans_pdf.folder_path
+                ):
+                    unwritten.append(ans_pdf_id)
+                    continue
+                pending_pages = session.exec(
+                    select(Page)
+                    .where(Page.ans_pdf_id == ans_pdf_id, Page.is_evaluated == False)  # noqa: E712
+                    .order_by(col(Page.page_no))
+                ).all()
+                if pending_pages:
+                    pages_by_pdf.append(
+                        (ans_pdf_id, [(page.id, page.image_path) for page in pending_pages])
+                    )
+            if unwritten:
+                # Their own jobs retry until the upload has written the pages
+                enqueue_answer_sheet_evaluations(session, unwritten)
+                session.commit()
+                logger.info(
+                    f"Left {len(unwritten)} answer sheets whose pages are still "
+                    "being written to their own evaluation jobs"
+                )
+        return pages_by_pdf
+
+    def commit_results(
+        ans_pdf_id: uuid.UUID,
+        page_ids: list[uuid.UUID],
+        routes: dict[uuid.UUID, list[str] | None],
+        results: dict[uuid.UUID, tuple[list[dict[str, Any]], Path]],
+    ) -> None:
+        with get_worker_session() as session:
+            save_answer_sheet_results(
+                session, collection_id, ans_pdf_id, page_ids, routes, results
+            )
+            session.commit()
+
+    pages_by_pdf = await asyncio.to_thread(load_pending_pages)
+    logger.info(
+        f"Evaluating {sum(len(pages) for _, pages in pages_by_pdf)} pending pages "
+        f"in {len(pages_by_pdf)} answer sheets of collection {collection_id} "
+        f"in batches of {plan.batch_size} with prompt {plan.prompt.fingerprint[:12]}"
+    )
+
+    # Start grading every answer sheet up front; the semaphores decide how
+    # many LLM calls are actually in flight
+    collection_semaphore = asyncio.Semaphore(
+        settings.EVALUATION_MAX_CONCURRENCY_PER_COLLECTION
+    )
+    sheet_tasks = {
+        ans_pdf_id: asyncio.create_task(
+            evaluate_answer_sheet(
+                pages,
+                plan.qp_data,
+                plan.prompt,
+                plan.batch_size,
+                collection_semaphore,
+                plan.use_cached_prefix,
+                plan.route,
+                plan.mcqs,
+                plan.refresh,
+            )
+        )
+        for ans_pdf_id, pages in pages_by_pdf
+    }
+
     try:
-        with get_session() as session:
-            monitor_record = session.exec(
-                            select(EvaluationMonitor)
-                            .where(EvaluationMonitor.collection_id == collection_id)
-                            ).first()
+        for ans_pdf_id, pages in pages_by_pdf:
+            routes, results = await sheet_tasks[ans_pdf_id]
+            await asyncio.to_thread(
+                commit_results,
+                ans_pdf_id,
+                [page_id for page_id, _ in pages],
+                routes,
+                results,
+            )
+    finally:
+        for task in sheet_tasks.values():
+            task.cancel()
+
+
+@job_handler(EVALUATE_COLLECTION_JOB)
+async def run_evaluation_job(payload: dict[str, Any]) -> None:
+    await process_evaluation_for_collection(
+        uuid.UUID(payload["collection_id"]),
+        uuid.UUID(payload["qp_pdf_id"]),
+        force=payload.get("force", False),
+    )
+
+
+@job_handler(EVALUATE_ANSWER_SHEET_JOB)
+async def run_answer_sheet_evaluation_job(payload: dict[str, Any]) -> None:
+    await process_evaluation_for_answer_sheet(uuid.UUID(payload["ans_pdf_id"]))
+
+
+async def process_evaluation_for_collection(
+    collection_id: uuid.UUID, qp_pdf_id: uuid.UUID, force: bool = False
+) -> None:
+    """
+    Evaluate every answer sheet of a collection. Runs in the worker as an
+    evaluate_collection job; errors are re-raised so that the job is retried.
+    A forced run asks the LLM again instead of reusing cached responses.
+    """
+
+    def load_collection() -> tuple[QpPdf | None, list[uuid.UUID]]:
+        with get_worker_session() as session:
             qp_pdf = session.get(QpPdf, qp_pdf_id)
+            if not qp_pdf:
+                return None, []
 
-            if not qp_pdf or not qp_pdf.json_path or not monitor_record:
-                logger.error("Background task failed: QpPdf, monitor record, or its JSON data not found.")
-                return
-
-            if not qp_pdf.json_path:
-                logger.error("QpPdf json_path is None.")
-                return
-            qp_data_path = Path(qp_pdf.json_path)
-            if not qp_data_path or not qp_data_path.exists():
-                logger.error(f"QpData JSON file not found at: {qp_data_path}")
-                return
-            
-            with open(qp_data_path, "r") as f:
-                qp_data = json.load(f)
-            
-
-            all_ans_pdfs = session.exec(
-                select(AnsPdf)
+            ans_pdf_ids = session.exec(
+                select(AnsPdf.id)
                 .join(AnsPdfFolder)
                 .where(AnsPdfFolder.collection_id == collection_id)
+                .order_by(col(AnsPdf.uploaded_at))
             ).all()
 
-            for ans_pdf in all_ans_pdfs:
-                pages = session.exec(
-                    select(Page).where(Page.ans_pdf_id == ans_pdf.id)
-                ).all()
+            refresh_evaluation_monitor(session, collection_id)
+            session.commit()
+            return qp_pdf, list(ans_pdf_ids)
+
+    try:
+        qp_pdf, ans_pdf_ids = await asyncio.to_thread(load_collection)
+        if not qp_pdf:
+            logger.error("Background task failed: QpPdf not found.")
+            return
+
+        plan = await plan_evaluation(qp_pdf, refresh=force)
+        if plan is None:
+            return
+
+        await grade_answer_sheets(collection_id, ans_pdf_ids, plan)
+
+    except Exception as e:
+        logger.error(f"Background evaluation task failed: {e}")
+        raise
+
+
+async def process_evaluation_for_answer_sheet(ans_pdf_id: uuid.UUID) -> None:
+    """
+    Evaluate a single answer sheet against the latest parsed question paper of
+    its collection. Runs in the worker as an evaluate_answer_sheet job, queued
+    when the sheet is uploaded or when the question paper finishes parsing.
+    Raises, so that the job is retried, while the sheet's page images are still
+    being written. Sheets owned by an ingest job are skipped.
+    """
+
+    def load_answer_sheet() -> tuple[uuid.UUID, QpPdf] | None:
+        """The sheet's collection and question paper, or None if there is nothing to grade."""
+        with get_worker_session() as session:
+            ans_pdf = session.get(AnsPdf, ans_pdf_id)
+            if not ans_pdf or ans_pdf.is_evaluated:
+                return None
+            if ans_pdf.is_ingesting:
+                # Queued again by the ingest job for any pages it leaves ungraded
+                logger.info(f"Answer sheet {ans_pdf_id} is still being ingested")
+                return None
+            folder = session.get(AnsPdfFolder, ans_pdf.ans_pdf_folder_id)
+            if not folder:
+                return None
+
+            qp_pdf = latest_parsed_qp_pdf(session, folder.collection_id)
+            if not qp_pdf:
+                # Queued again once the question paper has been parsed
+                logger.info(f"No parsed question paper yet for answer sheet {ans_pdf_id}")
+                return None
+
+            # Fail so that the job is retried once the upload has written the
+            # page images
+            if not blob_store.pages_written(session, ans_pdf.content_hash, ans_pdf.folder_path):
+                raise RuntimeError(f"Page images of answer sheet {ans_pdf_id} are not written yet")
+            return folder.collection_id, qp_pdf
+
+    try:
+        loaded = await asyncio.to_thread(load_answer_sheet)
+        if loaded is None:
+            return
+        collection_id, qp_pdf = loaded
+
+        plan = await plan_evaluation(qp_pdf)
+        if plan is None:
+            return
+
+        await grade_answer_sheets(collection_id, [ans_pdf_id], plan)
 
-                
-                for page in pages:
-                    try:
-                        
-                        # New prompt for per-page evaluation
-                        page_evaluation_prompt = (
-                            "You are an intelligent exam evaluator. You will be provided with a student's answer sheet page and the structured question data from the question paper. "
-                            "Your task is to: "
-                            "1. Identify the main section number (e.g., Q1, Q2) from the page. "
-                            "2. Identify each sub-question number (e.g., 1, 2, 3) within that section. "
-                            "3. Combine them to form a complete question number in the format 'section.sub_question' (e.g., '1.1', '2.3'). "
-                            "4. Evaluate the student's handwritten answer for each question found on the page. "
-                            "5. Return a JSON object with a list of evaluation results, one for each question found."
-                            "\n\nJSON Schema:\n["
-                            "  {"
-                            "    \"question_no\": \"string\" (e.g., '1.1', '2.3'),"
-                            "    \"obtained_marks\": \"number\","
-                            "    \"max_marks\": \"number\","
-                            "    \"feedback\": \"string\""
-                            "  }"
-                            "]"
-                            "Do not include any extra text."
-                            f"\n\nQuestion Paper Data: {json.dumps(qp_data, indent=4)}"
-                            "\n\nStudent Answer Sheet Page Image:"
-                        )
-                        
-                        image_path = Path(page.image_path)
-                        eval_result_str = await llm_service.process_images(
-                            image_paths=[str(image_path)], prompt=page_evaluation_prompt
-                        )
-                        
-                        cleaned_response = eval_result_str.strip()
-                        if cleaned_response.startswith("```"):
-                            cleaned_response = cleaned_response.strip("`")
-                            cleaned_response = "\n".join(cleaned_response.split("\n")[1:])
-                            if cleaned_response.strip().endswith("```"):
-                                cleaned_response = "\n".join(cleaned_response.split("\n")[:-1])
-                                
-                        safe_response = cleaned_response.replace("\\", "\\\\")
-
-                        # Try to parse the LLM's response
-                        eval_data = json.loads(safe_response)
-                        
-                        # Save the raw JSON response to a file
-                        eval_folder = Path(page.image_path).parent / "evaluation"
-                        eval_folder.mkdir(exist_ok=True)
-                        eval_file_path = eval_folder / f"{page.id}_result.json"
-                        
-                        with open(eval_file_path, "w") as f:
-                            json.dump(eval_data, f, indent=4)
-
-                        # Loop through the parsed data and create a new Evaluation record for each result
-                        for evaluation_item in eval_data:
-                            evaluation_record = Evaluation(
-                                question_no=evaluation_item.get("question_no"),
-                                obtained_marks=evaluation_item.get("obtained_marks"),
-                                max_marks=evaluation_item.get("max_marks"),
-                                feedback=evaluation_item.get("feedback"),
-                                evaluation_json_path=str(eval_file_path), # Store the path to the raw JSON
-                                page_id=page.id,
-                            )
-                            session.add(evaluation_record)
-                        
-                        # Mark the page as evaluated and commit all changes
-                        page.is_evaluated = True
-                        session.add(page)
-                        
-                        logger.info(f"Evaluation for Page {page.id} completed and records saved.")
-                
-                    except json.JSONDecodeError as e:
-                        logger.error(f"LLM response was not valid JSON for page {page.id}: {e}")
-                    except Exception as e:
-                        logger.error(f"Evaluation failed for page {page.id}: {e}")
-                        
-                monitor_record.evaluated_pdfs += 1
-                session.add(monitor_record)
-                session.commit()
-            
-            # Finally, mark the collection as evaluated if all PDFs are done
-            if monitor_record.evaluated_pdfs >= monitor_record.total_pdfs:
-                collection = session.get(Collection, collection_id)
-                if collection:
-                    collection.is_evaluated = True
-                    session.add(collection)
-                    session.commit()
-                
     except Exception as e:
-        logger.error(f"Background evaluation task failed: {e}")
\ No newline at end of file
+        logger.error(f"Evaluation of answer sheet {ans_pdf_id} failed: {e}")
+        raise
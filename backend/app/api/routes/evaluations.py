@@ -1,38 +1,72 @@
 # app/api/routes/evaluations.py
 
+import asyncio
 import uuid
 from typing import Any
 
 from fastapi import APIRouter, HTTPException
-from sqlmodel import func, select, join
+from sqlmodel import Session, select, join
 
-from app.api.deps import CurrentUser, SessionDep
+from app.api.deps import AsyncCurrentUser, AsyncSessionDep, get_worker_session
+from app.api.pagination import next_cursor, paginate
 from app.models import (
-    AnsPdf,
-    AnsPdfFolder,
     Collection,
+    CollectionRowCounts,
     Evaluation,
     EvaluationPublic,
     EvaluationsPublic,
-    Page,
+    ItemAnalysisPublic,
+    ResultsSummaryPublic,
 )
+from app.services.item_analysis import item_analysis
+from app.services.job_queue import job_handler, job_queue
+from app.services.results_summary import results_summary
+from app.services.row_counts import row_counts
 
 router = APIRouter(prefix="/evaluations", tags=["evaluations"])
 
+REFRESH_RESULTS_SUMMARY_JOB = "refresh_results_summary"
+
+
+def enqueue_results_summary_refresh(session: Session, collection_id: uuid.UUID) -> None:
+    """
+    Queue a rebuild of a collection's results summary, e.g. once a new question
+    paper changes how its sections are totalled. Does not commit.
+    """
+    job_queue.enqueue(
+        session,
+        REFRESH_RESULTS_SUMMARY_JOB,
+        {"collection_id": collection_id},
+        dedupe_key=f"{REFRESH_RESULTS_SUMMARY_JOB}:{collection_id}",
+    )
+
+
+@job_handler(REFRESH_RESULTS_SUMMARY_JOB)
+async def run_results_summary_refresh_job(payload: dict[str, Any]) -> None:
+    await asyncio.to_thread(refresh_results_summary, uuid.UUID(payload["collection_id"]))
+
+
+def refresh_results_summary(collection_id: uuid.UUID) -> None:
+    with get_worker_session() as session:
+        results_summary.refresh_collection(session, collection_id)
+
 
 @router.get("/by-collection/{collection_id}", response_model=EvaluationsPublic)
-def read_evaluations_by_collection(
-    session: SessionDep,
-    current_user: CurrentUser,
+async def read_evaluations_by_collection(
+    session: AsyncSessionDep,
+    current_user: AsyncCurrentUser,
     collection_id: uuid.UUID,
     skip: int = 0,
     limit: int = 100,
+    cursor: str | None = None,
+    include_count: bool = True,
 ) -> Any:
     """
-    Retrieve all evaluations for a specific collection.
+    Retrieve all evaluations for a specific collection, oldest first. Pass the
+    returned `next_cursor` as `cursor` to get the next page.
     """
     # Authorization check: Ensure the user has permission to access this collection
-    collection = session.get(Collection, collection_id)
+    collection = await session.get(Collection, collection_id)
     if not collection:
         raise HTTPException(status_code=404, detail="Collection not found")
 
@@ -41,28 +75,77 @@ def read_evaluations_by_collection(
             status_code=403, detail="Not enough permissions to access this collection's data"
         )
 
-    # Select evaluations by joining through the entire hierarchy
-    statement = (
-        select(Evaluation)
-        .join(Page)
-        .join(AnsPdf)
-        .join(AnsPdfFolder)
-        .join(Collection)
-        .where(Collection.id == collection_id)
-        .offset(skip)
-        .limit(limit)
+    # A range of the (collection_id, created_at, id) index
+    statement = paginate(
+        select(Evaluation).where(Evaluation.collection_id == collection_id), Evaluation.created_at, Evaluation.id, skip=skip, limit=limit, cursor=cursor
     )
-    evaluations = session.exec(statement).all()
-
-    # Get the total count
-    count_statement = (
-        select(func.count(Evaluation.id)) # type: ignore
-        .join(Page)
-        .join(AnsPdf)
-        .join(AnsPdfFolder)
-        .join(Collection)
-        .where(Collection.id == collection_id)
+    evaluations = (await session.exec(statement)).all()
+
+    count = None
+    if include_count:
+        count = await session.run_sync(
+            row_counts.for_collection, collection_id, CollectionRowCounts.evaluations
+        )
+
+    return EvaluationsPublic(
+        data=evaluations,
+        count=count,
+        next_cursor=next_cursor(evaluations, Evaluation.created_at, limit),
     )
-    count = session.exec(count_statement).one()
 
-    return EvaluationsPublic(data=evaluations, count=count) # type: ignore
\ No newline at end of file
+
+@router.get("/summary/{collection_id}", response_model=ResultsSummaryPublic)
+async def read_results_summary(
+    session: AsyncSessionDep,
+    current_user: AsyncCurrentUser,
+    collection_id: uuid.UUID,
+) -> Any:
+    """
+    Per-student totals and per-question statistics of a collection, read from
+    the results summary kept up to date as answer sheets are graded. In sections
+    of the question paper that ask for any N questions only a student's best N
+    answers count.
+    """
+    collection = await session.get(Collection, collection_id)
+    if not collection:
+        raise HTTPException(status_code=404, detail="Collection not found")
+
+    if not current_user.is_superuser and collection.user_id != current_user.id:
+        raise HTTPException(
+            status_code=403, detail="Not enough permissions to access this collection's data"
+        )
+
+    return await session.run_sync(results_summary.read, collection_id)
+
+
+@router.get("/item-analysis/{collection_id}", response_model=ItemAnalysisPublic)
+async def read_item_analysis(
+    session: AsyncSessionDep,
+    current_user: AsyncCurrentUser,
+    collection_id: uuid.UUID,
+) -> Any:
+    """
+    Item analysis of a collection's results: per-question mean, standard
+    deviation, facility and discrimination (top versus bottom 27% by total score)
+    indexes and mark histograms, the distribution of total scores and Cronbach's
+    alpha. Recomputed only once more answer sheets have been graded.
+    """
+    collection = await session.get(Collection, collection_id)
+    if not collection:
+        raise HTTPException(status_code=404, detail="Collection not found")
+
+    if not current_user.is_superuser and collection.user_id != current_user.id:
+        raise HTTPException(
+            status_code=403, detail="Not enough permissions to access this collection's data"
+        )
+
+    version = await session.run_sync(item_analysis.version, collection_id)
+    analysis = item_analysis.cached(collection_id, version)
+    if analysis is None:
+        matrix = await session.run_sync(item_analysis.load, collection_id)
+        # Keep the event loop free while large cohorts are analysed
+        analysis = await asyncio.to_thread(
+            item_analysis.analyse, matrix, collection_id, version[0]
+        )
+        item_analysis.store(collection_id, version, analysis)
+    return analysis
@@ -0,0 +1,537 @@
+# app/api/routes/ingest.py
+
+import asyncio
+import json
+import logging
+import uuid
+from collections.abc import AsyncIterator
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any
+
+from fastapi import APIRouter, File, HTTPException, UploadFile
+from sqlmodel import Session, col, delete, func, select, update
+
+from app.api.deps import AsyncCurrentUser, AsyncSessionDep, get_worker_session
+from app.api.routes.evaluate import (
+    EvaluationPlan,
+    enqueue_answer_sheet_evaluations,
+    evaluation_semaphore,
+    latest_parsed_qp_pdf,
+    llm_service,
+    parse_evaluation_response,
+    plan_evaluation,
+    prompt_cached_prefix,
+    refresh_evaluation_monitor,
+    save_page_result,
+)
+from app.core.config import RenderProfile, settings
+from app.models import (
+    AnsPdf,
+    AnsPdfCreate,
+    AnsPdfFolder,
+    AnsPdfFolderCreate,
+    Collection,
+    Evaluation,
+    Page,
+    PdfBlob,
+    PdfRendition,
+    QpPdf,
+)
+from app.services.blob_store import blob_store, profile_key
+from app.services.job_queue import job_handler, job_queue
+from app.services.page_batching import map_batch_results
+from app.services.pipeline import Emit, Pipeline, Stage
+from app.services.render_service import (
+    RenderedPage,
+    get_render_profile,
+    render_service,
+)
+from app.services.results_summary import results_summary
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter(prefix="/ingest", tags=["ingest"])
+
+INGEST_ANSWER_SHEETS_JOB = "ingest_answer_sheets"
+
+
+@router.post("/{collection_id}/", status_code=202)
+async def ingest_answer_sheets(
+    session: AsyncSessionDep,
+    current_user: AsyncCurrentUser,
+    collection_id: uuid.UUID,
+    files: list[UploadFile] = File(...),
+) -> dict[str, Any]:
+    """
+    Upload a batch of answer sheet PDFs and grade them in one streaming run: a
+    sheet's first pages are already being graded while its last pages are still
+    rendering. The question paper of the collection must be parsed first.
+    """
+    for file in files:
+        if not file.filename or not file.filename.endswith(".pdf"):
+            raise HTTPException(status_code=400, detail="Only PDF files are allowed.")
+
+    collection = await session.get(Collection, collection_id)
+    if not collection:
+        raise HTTPException(status_code=404, detail=f"Collection with ID {collection_id} not found.")
+
+    if not current_user.is_superuser and collection.user_id != current_user.id:
+        raise HTTPException(status_code=403, detail="Not enough permissions to add PDFs to this collection.")
+
+    qp_pdf = await session.run_sync(latest_parsed_qp_pdf, collection_id)
+    if not qp_pdf:
+        raise HTTPException(
+            status_code=409,
+            detail="The question paper of this collection has not been parsed yet. "
+            "Upload the answer sheets one by one to have them graded once it is.",
+        )
+
+    profile = get_render_profile(collection.render_profile)
+    blobs: list[PdfBlob] = []
+    try:
+        # Store the PDFs content-addressed; identical uploads share one copy
+        for file in files:
+            blobs.append(await blob_store.store_upload(session, file))
+
+        ans_pdf_ids = []
+        for file, blob in zip(files, blobs, strict=True):
+            ans_pdf_folder = AnsPdfFolder.model_validate(
+                AnsPdfFolderCreate(
+                    name=f"ans_pdf_folder_{uuid.uuid4().hex}", collection_id=collection_id
+                )
+            )
+            session.add(ans_pdf_folder)
+            ans_pdf = AnsPdf.model_validate(
+                AnsPdfCreate(
+                    name=file.filename or "",
+                    filepath=blob.filepath,
+                    folder_path=str(blob_store.rendition_folder(blob.content_hash, profile)),
+                    ans_pdf_folder_id=ans_pdf_folder.id,
+                    content_hash=blob.content_hash,
+                )
+            )
+            # Keep evaluation runs off the sheet until its pages are saved
+            ans_pdf.is_ingesting = True
+            session.add(ans_pdf)
+            ans_pdf_ids.append(ans_pdf.id)
+
+        job = await session.run_sync(
+            job_queue.enqueue,
+            INGEST_ANSWER_SHEETS_JOB,
+            {
+                "collection_id": collection_id,
+                "qp_pdf_id": qp_pdf.id,
+                "ans_pdf_ids": ans_pdf_ids,
+            },
+        )
+        if job is None:
+            raise HTTPException(
+                status_code=500, detail="The ingestion job could not be queued."
+            )
+        await session.run_sync(refresh_evaluation_monitor, collection_id)
+        await session.commit()
+
+    except Exception as e:
+        await session.rollback()
+        for blob in blobs:
+            await session.run_sync(blob_store.release, blob.content_hash)
+        if isinstance(e, HTTPException):
+            raise
+        raise HTTPException(status_code=500, detail=f"Answer PDF ingestion failed: {str(e)}")
+
+    return {
+        "message": f"Ingestion of {len(ans_pdf_ids)} answer sheets has been queued.",
+        "job_id": str(job.id),
+        "ans_pdf_ids": [str(ans_pdf_id) for ans_pdf_id in ans_pdf_ids],
+    }
+
+
+@dataclass
+class IngestSheet:
+    ans_pdf_id: uuid.UUID
+    blob: PdfBlob
+    # Pages of an earlier rendition of the same PDF, if any
+    reused_pages: list[RenderedPage] | None
+    page_count: int | None = None
+    written: int = 0
+    evaluated: int = 0
+
+
+@dataclass
+class IngestPage:
+    sheet: IngestSheet
+    page_id: uuid.UUID
+    page_no: int
+    image_path: Path
+    data: bytes
+    mime_type: str
+
+
+@dataclass
+class IngestBatch:
+    sheet: IngestSheet
+    pages: list[IngestPage]
+    response: str | None = None
+    cache_key: str | None = None
+    results: dict[uuid.UUID, tuple[list[dict[str, Any]], Path]] = field(
+        default_factory=dict
+    )
+
+
+class AnswerSheetIngest:
+    """
+    Streams answer sheets through render -> store -> batch -> grade -> parse ->
+    save. Every stage works concurrently on different pages, so page 1 is being
+    graded while page 40 is still rendering, and the bounded stage queues hold
+    the renderer back when grading falls behind. Page images are encoded by the
+    render processes; the store stage archives them. Answer sheets are graded
+    without routing, which needs all of a sheet's pages up front.
+    """
+
+    def __init__(
+        self, collection_id: uuid.UUID, plan: EvaluationPlan, profile: RenderProfile
+    ):
+        self.collection_id = collection_id
+        self.plan = plan
+        self.profile = profile
+        self.failed_sheets: list[uuid.UUID] = []
+        # Pages waiting in the batch stage, per sheet, until the pages before
+        # them arrive (the store workers may finish them out of order)
+        self._waiting: dict[uuid.UUID, dict[int, IngestPage]] = {}
+        self._next_page_no: dict[uuid.UUID, int] = {}
+        self._groups: dict[uuid.UUID, list[IngestPage]] = {}
+        self._sheets: dict[uuid.UUID, IngestSheet] = {}
+        queue_size = settings.PIPELINE_QUEUE_SIZE
+        self.pipeline = Pipeline(
+            [
+                Stage("store", self._store, settings.PIPELINE_STORE_WORKERS, queue_size),
+                Stage("batch", self._batch, 1, queue_size, flush=self._flush_batches),
+                Stage("grade", self._grade, settings.PIPELINE_LLM_WORKERS, queue_size),
+                Stage("parse", self._parse, settings.PIPELINE_PARSE_WORKERS, queue_size),
+                Stage("save", self._save, 1, queue_size),
+            ],
+            source_name="render",
+        )
+
+    async def run(self, sheets: list[IngestSheet]) -> None:
+        await self.pipeline.run(self._render(sheets))
+
+    async def _render(
+        self, sheets: list[IngestSheet]
+    ) -> AsyncIterator[tuple[IngestSheet, RenderedPage]]:
+        """Yield the pages of each sheet, one sheet after the other."""
+        for sheet in sheets:
+            self._sheets[sheet.ans_pdf_id] = sheet
+            self._next_page_no[sheet.ans_pdf_id] = 1
+            if sheet.reused_pages is not None:
+                for page in sheet.reused_pages:
+                    yield sheet, page
+                sheet.page_count = len(sheet.reused_pages)
+                continue
+
+            folder = blob_store.rendition_folder(sheet.blob.content_hash, self.profile)
+            page_count = 0
+            try:
+                async for page in render_service.iter_pdf_pages(
+                    Path(sheet.blob.filepath),
+                    folder,
+                    self.profile,
+                    settings.PIPELINE_RENDER_CHUNK_PAGES,
+                ):
+                    page_count += 1
+                    yield sheet, page
+            except Exception as e:
+                # The pages rendered so far still go through; the job fails at the
+                # end so that the sheet is rendered again on the next attempt
+                logger.error(f"Rendering answer sheet {sheet.ans_pdf_id} failed: {e}")
+                self.failed_sheets.append(sheet.ans_pdf_id)
+                continue
+            sheet.page_count = page_count
+
+    async def _store(self, item: tuple[IngestSheet, RenderedPage], emit: Emit) -> None:
+        sheet, page = item
+        if page.data is None:
+            data = await asyncio.to_thread(page.image_path.read_bytes)
+        else:
+            data = page.data
+
+            def write_page() -> None:
+                page.image_path.parent.mkdir(parents=True, exist_ok=True)
+                page.image_path.write_bytes(data)
+
+            await asyncio.to_thread(write_page)
+        await emit(
+            IngestPage(
+                sheet=sheet,
+                page_id=uuid.uuid4(),
+                page_no=page.page_no,
+                image_path=page.image_path,
+                data=data,
+                mime_type=page.mime_type,
+            )
+        )
+
+    async def _batch(self, page: IngestPage, emit: Emit) -> None:
+        """Group consecutive pages of a sheet, up to the plan's batch size."""
+        sheet_id = page.sheet.ans_pdf_id
+        waiting = self._waiting.setdefault(sheet_id, {})
+        waiting[page.page_no] = page
+        group = self._groups.setdefault(sheet_id, [])
+        while self._next_page_no[sheet_id] in waiting:
+            group.append(waiting.pop(self._next_page_no[sheet_id]))
+            self._next_page_no[sheet_id] += 1
+            if len(group) >= self.plan.batch_size:
+                await emit(IngestBatch(page.sheet, group.copy()))
+                group.clear()
+
+        # Pass on the last partial group of every sheet that has all its pages
+        for sheet_id, group in self._groups.items():
+            sheet = self._sheets[sheet_id]
+            if (
+                group
+                and sheet.page_count is not None
+                and self._next_page_no[sheet_id] > sheet.page_count
+            ):
+                await emit(IngestBatch(sheet, group.copy()))
+                group.clear()
+
+    async def _flush_batches(self, emit: Emit) -> None:
+        for sheet_id, group in self._groups.items():
+            waiting = self._waiting.get(sheet_id, {})
+            pages = group + [waiting[page_no] for page_no in sorted(waiting)]
+            if pages:
+                await emit(IngestBatch(self._sheets[sheet_id], pages))
+            group.clear()
+            waiting.clear()
+
+    async def _grade(self, batch: IngestBatch, emit: Emit) -> None:
+        prompt = self.plan.prompt
+        try:
+            async with evaluation_semaphore:
+                cached_prefix = await prompt_cached_prefix(
+                    prompt, self.plan.use_cached_prefix
+                )
+                batch.response, batch.cache_key = await llm_service.process_image_data(
+                    images=[(page.data, page.mime_type) for page in batch.pages],
+                    prompt=prompt.suffix if cached_prefix else prompt.text,
+                    image_labels=(
+                        [f"Page {i}:" for i in range(1, len(batch.pages) + 1)]
+                        if prompt.batch
+                        else None
+                    ),
+                    cached_prefix=cached_prefix,
+                )
+        except Exception as e:
+            logger.error(f"Grading pages of answer sheet {batch.sheet.ans_pdf_id} failed: {e}")
+        # Pass the batch on even without a response, so its pages are saved
+        await emit(batch)
+
+    async def _parse(self, batch: IngestBatch, emit: Emit) -> None:
+        page_ids = [page.page_id for page in batch.pages]
+        try:
+            if batch.response is not None:
+                eval_data = parse_evaluation_response(batch.response)
+                if self.plan.prompt.batch:
+                    page_results = map_batch_results(eval_data, page_ids)
+                elif isinstance(eval_data, list):
+                    page_results = {page_ids[0]: eval_data}
+                else:
+                    raise ValueError(f"Expected a list of results, got {eval_data!r}")
+                if len(page_results) == len(page_ids):
+                    await llm_service.cache_response(batch.cache_key, batch.response)
+                image_paths = {page.page_id: page.image_path for page in batch.pages}
+                for page_id, page_eval_data in page_results.items():
+                    eval_file_path = await save_page_result(
+                        page_id, str(image_paths[page_id]), page_eval_data
+                    )
+                    batch.results[page_id] = (page_eval_data, eval_file_path)
+        except json.JSONDecodeError as e:
+            logger.error(f"LLM response was not valid JSON for pages {page_ids}: {e}")
+        except Exception as e:
+            logger.error(f"Evaluation failed for pages {page_ids}: {e}")
+        await emit(batch)
+
+    async def _save(self, batch: IngestBatch, emit: Emit) -> None:
+        """Write the pages of a batch and their results, and close finished sheets."""
+        await asyncio.to_thread(self._save_batch, batch)
+        await emit(batch)
+
+    def _save_batch(self, batch: IngestBatch) -> None:
+        with get_worker_session() as session:
+            self._write_batch(session, batch)
+            session.commit()
+
+    def _write_batch(self, session: Session, batch: IngestBatch) -> None:
+        sheet = batch.sheet
+        for page in batch.pages:
+            result = batch.results.get(page.page_id)
+            session.add(
+                Page(
+                    id=page.page_id,
+                    page_no=page.page_no,
+                    image_path=str(page.image_path),
+                    ans_pdf_id=sheet.ans_pdf_id,
+                    collection_id=self.collection_id,
+                    is_evaluated=result is not None,
+                )
+            )
+            if result is None:
+                continue
+            eval_data, eval_file_path = result
+            for evaluation_item in eval_data:
+                session.add(
+                    Evaluation(
+                        question_no=evaluation_item.get("question_no"),
+                        obtained_marks=evaluation_item["obtained_marks"],
+                        max_marks=evaluation_item["max_marks"],
+                        feedback=evaluation_item["feedback"],
+                        evaluation_json_path=str(eval_file_path),
+                        page_id=page.page_id,
+                        ans_pdf_id=sheet.ans_pdf_id,
+                        collection_id=self.collection_id,
+                    )
+                )
+            sheet.evaluated += 1
+        sheet.written += len(batch.pages)
+        if batch.results:
+            results_summary.refresh_answer_sheet(session, self.collection_id, sheet.ans_pdf_id)
+
+        if sheet.page_count is not None and sheet.written >= sheet.page_count:
+            ans_pdf = session.get(AnsPdf, sheet.ans_pdf_id)
+            if ans_pdf:
+                # Every page is saved: evaluation runs may take the sheet now
+                ans_pdf.is_ingesting = False
+                ans_pdf.is_evaluated = sheet.evaluated >= sheet.page_count
+                session.add(ans_pdf)
+            refresh_evaluation_monitor(session, self.collection_id)
+            if sheet.reused_pages is None:
+                # Commits the batch along with the rendition
+                blob_store.record_rendition(
+                    session, sheet.blob.content_hash, self.profile, sheet.page_count
+                )
+
+
+def prepare_ingest_sheet(
+    session: Session, ans_pdf: AnsPdf, profile: RenderProfile
+) -> bool:
+    """
+    Get an answer sheet ready to be ingested. A sheet whose pages were all saved
+    by an earlier attempt returns False and is left to an evaluate_answer_sheet
+    job; pages of a sheet that was only partly saved are removed. Commits.
+    """
+    pages = session.exec(
+        select(func.count(Page.id)).where(Page.ans_pdf_id == ans_pdf.id)  # type: ignore
+    ).one()
+    if not pages:
+        return True
+    # The rendition is only recorded once every page of the sheet was saved
+    rendition = session.get(
+        PdfRendition, (ans_pdf.content_hash, profile_key(profile))
+    )
+    if rendition and rendition.page_count == pages:
+        return False
+
+    session.exec(delete(Evaluation).where(Evaluation.ans_pdf_id == ans_pdf.id))  # type: ignore
+    session.exec(delete(Page).where(Page.ans_pdf_id == ans_pdf.id))  # type: ignore
+    results_summary.clear_answer_sheet(session, ans_pdf.id)
+    session.commit()
+    return True
+
+
+def release_ingest_sheets(
+    session: Session, ans_pdf_ids: list[uuid.UUID], keep: list[uuid.UUID] | None = None
+) -> None:
+    """
+    Hand answer sheets back to the evaluation jobs, except those in `keep`.
+    Does not commit.
+    """
+    session.execute(
+        update(AnsPdf)
+        .where(col(AnsPdf.id).in_(ans_pdf_ids), col(AnsPdf.id).not_in(keep or []))
+        .values(is_ingesting=False)
+    )
+
+
+@job_handler(INGEST_ANSWER_SHEETS_JOB)
+async def run_ingest_job(payload: dict[str, Any]) -> dict[str, Any] | None:
+    return await process_ingest(
+        uuid.UUID(payload["collection_id"]),
+        uuid.UUID(payload["qp_pdf_id"]),
+        [uuid.UUID(ans_pdf_id) for ans_pdf_id in payload["ans_pdf_ids"]],
+    )
+
+
+async def process_ingest(
+    collection_id: uuid.UUID, qp_pdf_id: uuid.UUID, ans_pdf_ids: list[uuid.UUID]
+) -> dict[str, Any] | None:
+    """
+    Render, grade and save a batch of uploaded answer sheets. Runs in the worker
+    as an ingest_answer_sheets job and returns the per-stage pipeline stats,
+    which are stored as the job's result. Pages left ungraded are handed to
+    evaluate_answer_sheet jobs; a sheet that failed to render fails the job so
+    that the next attempt picks it up, skipping the sheets already saved.
+    """
+    try:
+        with get_worker_session() as session:
+            collection = session.get(Collection, collection_id)
+            qp_pdf = session.get(QpPdf, qp_pdf_id)
+            if not collection or not qp_pdf:
+                logger.error("Ingestion failed: collection or question paper not found.")
+                return None
+            profile = get_render_profile(collection.render_profile)
+
+            sheets = []
+            saved_earlier = []
+            for ans_pdf_id in ans_pdf_ids:
+                ans_pdf = session.get(AnsPdf, ans_pdf_id)
+                if not ans_pdf or ans_pdf.is_evaluated or not ans_pdf.content_hash:
+                    continue
+                if not prepare_ingest_sheet(session, ans_pdf, profile):
+                    saved_earlier.append(ans_pdf_id)
+                    continue
+                blob = session.get(PdfBlob, ans_pdf.content_hash)
+                if not blob:
+                    continue
+                reused_pages = await blob_store.rendered_pages(session, blob, profile)
+                sheets.append(IngestSheet(ans_pdf_id, blob, reused_pages))
+
+        plan = await plan_evaluation(qp_pdf)
+        if plan is None:
+            with get_worker_session() as session:
+                release_ingest_sheets(session, ans_pdf_ids)
+                session.commit()
+            return None
+
+        logger.info(
+            f"Ingesting {len(sheets)} answer sheets of collection {collection_id} "
+            f"in batches of {plan.batch_size} with prompt {plan.prompt.fingerprint[:12]}"
+        )
+        # Every batch is saved in its own short session by the save stage
+        ingest = AnswerSheetIngest(collection_id, plan, profile)
+        await ingest.run(sheets)
+        stats = ingest.pipeline.stats()
+        logger.info(f"Ingestion of collection {collection_id} finished: {stats}")
+
+        incomplete = [
+            sheet.ans_pdf_id
+            for sheet in sheets
+            if sheet.page_count is not None and sheet.evaluated < sheet.page_count
+        ]
+        with get_worker_session() as session:
+            # Sheets that failed to render stay with this job, which retries them
+            release_ingest_sheets(session, ans_pdf_ids, keep=ingest.failed_sheets)
+            if settings.EVALUATION_AUTO_START:
+                enqueue_answer_sheet_evaluations(session, saved_earlier + incomplete)
+            refresh_evaluation_monitor(session, collection_id)
+            session.commit()
+
+        if ingest.failed_sheets:
+            raise RuntimeError(
+                f"{len(ingest.failed_sheets)} answer sheets could not be rendered"
+            )
+        return stats
+
+    except Exception as e:
+        logger.error(f"Ingestion for collection {collection_id} failed: {e}")
+        raise
@@ -1,16 +1,25 @@
 # app/api/routes/upload.py
 
-import shutil
 from pathlib import Path
 import uuid
 from typing import Any
-from fastapi import APIRouter, BackgroundTasks, UploadFile, File, HTTPException, Form
-import fitz
-from sqlmodel import select, func, join
-
-from app.api.deps import SessionDep, CurrentUser, get_session
+from fastapi import APIRouter, Depends, UploadFile, File, HTTPException, Form
+from sqlmodel import select, join
+
+from app.api.deps import (
+    AsyncCurrentUser,
+    AsyncSessionDep,
+    SessionDep,
+    CurrentUser,
+    get_current_active_superuser,
+    get_worker_session,
+)
+from app.api.pagination import next_cursor, paginate
+from app.core.db import AsyncSession
 from app.models import (
     Collection,
+    CollectionRowCounts,
+    Message,
     AnsPdfFolder,
     AnsPdfFolderCreate,
     AnsPdfFolderPublic,
@@ -20,16 +29,34 @@ from app.models import (
     AnsPdfPublic,
     AnsPdfsPublic,
     Page,
+    PdfBlob,
     QpPdf,
     QpPdfCreate,
     QpPdfPublic,
-    QpPdfsPublic
+    QpPdfsPublic,
+    UserRowCounts,
 )
 
 import asyncio
 import json
 import logging
+from app.api.routes.evaluate import (
+    enqueue_answer_sheet_evaluations,
+    enqueue_pending_answer_sheets,
+    latest_parsed_qp_pdf,
+    refresh_evaluation_monitor,
+)
+from app.api.routes.evaluations import enqueue_results_summary_refresh
+from app.services.blob_store import blob_store
+from app.services.job_queue import job_handler, job_queue
 from app.services.llm_service import LLMService
+from app.services.qp_parse_cache import qp_parse_cache
+from app.services.render_service import (
+    RenderQueueFullError,
+    get_render_profile,
+    list_page_images,
+)
+from app.services.row_counts import row_counts
 from app.core.config import settings
 
 logger = logging.getLogger(__name__)
@@ -44,19 +71,27 @@ UPLOAD_DIR = Path("uploads")
 UPLOAD_DIR.mkdir(parents=True, exist_ok=True)
 
 
-async def process_qp_images(
-    qp_pdf_folder: Path, qp_pdf_id: uuid.UUID
-):
-    """
-    Background task to handle image processing and LLM interaction.
-    """
-    with get_session() as session:
-        try:
-            image_files = sorted(qp_pdf_folder.glob("*.png"))
-            
-            image_paths = [str(p) for p in image_files]
-            
-            prompt = """
+async def abandon_upload(session: AsyncSession, blob: PdfBlob | None) -> None:
+    """Roll back a failed upload and drop the reference it took on the stored PDF."""
+    await session.rollback()
+    if blob is not None:
+        await session.run_sync(blob_store.release, blob.content_hash)
+
+
+def render_queue_full_exception() -> HTTPException:
+    return HTTPException(
+        status_code=503,
+        detail="The PDF rendering queue is full. Please retry shortly.",
+        headers={"Retry-After": str(settings.RENDER_RETRY_AFTER_SECONDS)},
+    )
+
+
+# Bump QP_PARSE_PROMPT_VERSION whenever QP_PARSE_PROMPT changes so that cached
+# parses made with the old prompt are no longer used
+QP_PARSE_PROMPT_VERSION = "1"
+
+PARSE_QP_JOB = "parse_question_paper"
+QP_PARSE_PROMPT = """
     You are an intelligent exam paper parser.
     Your task is to analyze the content of the provided question paper images and extract all questions with their metadata.
 
@@ -114,48 +149,102 @@ async def process_qp_images(
 
     Return only a valid JSON object.
     Do not include markdown, code fences, or extra text.
-            """
-            
-            llm_response_str = await llm_service.process_images(
-                image_paths=image_paths,
-                prompt=prompt
+"""
+
+
+async def process_qp_images(qp_pdf_folder: Path, qp_pdf_id: uuid.UUID) -> None:
+    """
+    Parse a question paper's page images with the LLM and store the result.
+    Raises if parsing fails, or while the upload is still writing the page
+    images, so that the parse_question_paper job is retried.
+    """
+
+    def pages_written() -> bool:
+        with get_worker_session() as session:
+            qp_pdf = session.get(QpPdf, qp_pdf_id)
+            return qp_pdf is None or blob_store.pages_written(
+                session, qp_pdf.content_hash, str(qp_pdf_folder)
             )
 
-            # Handle potential non-JSON responses from the LLM
-            try:
-                # Strip markdown code fences if present
-                cleaned_response = llm_response_str.strip()
-                if cleaned_response.startswith("```"):
-                    cleaned_response = cleaned_response.strip("`")
-                    # remove the first line (```json or ```)
-                    cleaned_response = "\n".join(cleaned_response.split("\n")[1:])
-                    # remove the last line (closing ```)
-                    if cleaned_response.strip().endswith("```"):
-                        cleaned_response = "\n".join(cleaned_response.split("\n")[:-1])
-                        
-                qp_data = json.loads(cleaned_response)
-            except json.JSONDecodeError as e:
-                logger.error(f"LLM response was not valid JSON: {e}")
-                logger.error(f"LLM response was: {llm_response_str}")
-                # You might want to update the DB with an error status here
-                return
+    try:
+        if not await asyncio.to_thread(pages_written):
+            raise RuntimeError(f"Page images of question paper {qp_pdf_id} are not written yet")
+        images = await llm_service.load_images(
+            [str(p) for p in list_page_images(qp_pdf_folder)]
+        )
+        
+        llm_response_str, cache_key = await llm_service.process_image_data(
+            images=images,
+            prompt=QP_PARSE_PROMPT
+        )
 
-            # Save the JSON data to a file
-            json_file_path = qp_pdf_folder / "qp_data.json"
-            with open(json_file_path, "w") as f:
-                json.dump(qp_data, f, indent=4)
-            
-            # Update the QpPdf record with the JSON file path
+        # Handle potential non-JSON responses from the LLM
+        try:
+            # Strip markdown code fences if present
+            cleaned_response = llm_response_str.strip()
+            if cleaned_response.startswith("```"):
+                cleaned_response = cleaned_response.strip("`")
+                # remove the first line (```json or ```)
+                cleaned_response = "\n".join(cleaned_response.split("\n")[1:])
+                # remove the last line (closing ```)
+                if cleaned_response.strip().endswith("```"):
+                    cleaned_response = "\n".join(cleaned_response.split("\n")[:-1])
+                    
+            qp_data = json.loads(cleaned_response)
+        except json.JSONDecodeError as e:
+            logger.error(f"LLM response was not valid JSON: {e}")
+            logger.error(f"LLM response was: {llm_response_str}")
+            raise
+
+        if "error" in qp_data and "sections" not in qp_data:
+            raise ValueError(f"Question paper parsing failed: {qp_data['error']}")
+        await llm_service.cache_response(cache_key, llm_response_str)
+
+        # Only hold a connection for the writes, not while waiting on the LLM
+        with get_worker_session() as session:
             qp_pdf = session.get(QpPdf, qp_pdf_id)
-            if qp_pdf:
-                qp_pdf.json_path = str(json_file_path)
-                session.add(qp_pdf)
-                session.commit()
-                session.refresh(qp_pdf)
-                logger.info(f"Question paper data saved to {json_file_path} and DB updated.")
+            if not qp_pdf:
+                return
+
+            # Save the JSON data to a file, through the parse cache when the PDF
+            # is content-addressed so other uploads of this paper can reuse it
+            if qp_pdf.content_hash:
+                json_file_path = qp_parse_cache.put(
+                    session,
+                    qp_pdf.content_hash,
+                    QP_PARSE_PROMPT_VERSION,
+                    llm_service.model,
+                    qp_data,
+                )
+            else:
+                json_file_path = qp_pdf_folder / "qp_data.json"
+                with open(json_file_path, "w") as f:
+                    json.dump(qp_data, f, indent=4)
         
-        except Exception as e:
-            logger.error(f"Background task for QpPdf processing failed: {e}")
+            # Update the QpPdf record with the JSON file path
+            qp_pdf.json_path = str(json_file_path)
+            session.add(qp_pdf)
+            # Sections may total differently under the new paper
+            enqueue_results_summary_refresh(session, qp_pdf.collection_id)
+            if settings.EVALUATION_AUTO_START:
+                # Release the answer sheets that were waiting for the question paper
+                queued = enqueue_pending_answer_sheets(session, qp_pdf.collection_id)
+                refresh_evaluation_monitor(session, qp_pdf.collection_id)
+                logger.info(f"Queued evaluation of {queued} waiting answer sheets")
+            session.commit()
+            session.refresh(qp_pdf)
+            logger.info(f"Question paper data saved to {json_file_path} and DB updated.")
+    
+    except Exception as e:
+        logger.error(f"Background task for QpPdf processing failed: {e}")
+        raise
+
+
+@job_handler(PARSE_QP_JOB)
+async def run_qp_parse_job(payload: dict[str, Any]) -> None:
+    await process_qp_images(
+        Path(payload["qp_pdf_folder"]), uuid.UUID(payload["qp_pdf_id"])
+    )
 
 
 # ---------------------------------------------------------
@@ -211,8 +300,8 @@ async def create_ans_pdf_folder(
     status_code=201,
 )
 async def upload_ans_pdf(
-    session: SessionDep,
-    current_user: CurrentUser,
+    session: AsyncSessionDep,
+    current_user: AsyncCurrentUser,
     file: UploadFile = File(...),
     ans_pdf_folder_id: uuid.UUID = Form(...),
 ) -> Any:
@@ -223,59 +312,52 @@ async def upload_ans_pdf(
         raise HTTPException(status_code=400, detail="Only PDF files are allowed.")
 
     # Validate AnsPdfFolder existence and ownership
-    ans_pdf_folder = session.get(AnsPdfFolder, ans_pdf_folder_id)
+    ans_pdf_folder = await session.get(AnsPdfFolder, ans_pdf_folder_id)
     if not ans_pdf_folder:
         raise HTTPException(status_code=404, detail=f"Answer PDF folder with ID {ans_pdf_folder_id} not found.")
 
     # Check if the user owns the collection that the ans_pdf_folder belongs to
-    collection = session.get(Collection, ans_pdf_folder.collection_id)
+    collection = await session.get(Collection, ans_pdf_folder.collection_id)
     if not collection: # Should not happen if data integrity is maintained
          raise HTTPException(status_code=500, detail="Associated collection not found for the answer PDF folder.")
     if not current_user.is_superuser and collection.user_id != current_user.id:
         raise HTTPException(status_code=403, detail="Not enough permissions to add PDF to this folder.")
 
+    blob: PdfBlob | None = None
     try:
-        # Create a unique folder for this specific PDF's images
-        pdf_name_stem = Path(file.filename).stem
-        unique_id = uuid.uuid4().hex[:8]
-        # Images will be stored in a subfolder named after the PDF name + unique ID
-        ans_pdf_images_folder = UPLOAD_DIR / ans_pdf_folder.name / f"{pdf_name_stem}_{unique_id}"
-        ans_pdf_images_folder.mkdir(parents=True, exist_ok=True)
-        
-        # Define the full path for the PDF file (saved inside the images folder)
-        pdf_path = ans_pdf_images_folder / Path(file.filename).name
-
-        # Save the uploaded PDF file
-        with open(pdf_path, "wb") as buffer:
-            shutil.copyfileobj(file.file, buffer)
-
-        # Convert each page of the PDF into a PNG image
-        doc = fitz.open(pdf_path)
-        for i, page in enumerate(doc):  # type: ignore
-            pix = page.get_pixmap()
-            image_path = ans_pdf_images_folder / f"page{i + 1}.png"
-            pix.save(image_path)
-        doc.close()
+        # Store the PDF content-addressed; identical uploads share one copy
+        blob = await blob_store.store_upload(session, file)
+        profile = get_render_profile(collection.render_profile)
+
+        # Convert each page of the PDF into an image using the collection's render profile
+        try:
+            await blob_store.render_pages(session, blob, profile)
+        except RenderQueueFullError:
+            raise render_queue_full_exception()
         
         # Create an AnsPdf record in the database
         ans_pdf_in = AnsPdfCreate(
             name=file.filename,
-            filepath=str(pdf_path),
-            folder_path=str(ans_pdf_images_folder),
+            filepath=blob.filepath,
+            folder_path=str(blob_store.rendition_folder(blob.content_hash, profile)),
             ans_pdf_folder_id=ans_pdf_folder_id,
+            content_hash=blob.content_hash,
         )
         ans_pdf = AnsPdf.model_validate(ans_pdf_in)
         session.add(ans_pdf)
-        session.commit()
-        session.refresh(ans_pdf)
-
-        return ans_pdf
+        # The page images are written in the background; readers wait for them
+        await session.commit()
 
     except HTTPException:
+        await abandon_upload(session, blob)
         raise
     except Exception as e:
+        await abandon_upload(session, blob)
         raise HTTPException(status_code=500, detail=f"Answer PDF upload and conversion failed: {str(e)}")
 
+    await session.refresh(ans_pdf)
+    return ans_pdf
+
 
 # ---------------------------------------------------------
 # New endpoint for uploading AnsPdf directly with collection_id
@@ -286,8 +368,8 @@ async def upload_ans_pdf(
     status_code=201,
 )
 async def upload_ans_pdf_to_collection(
-    session: SessionDep,
-    current_user: CurrentUser,
+    session: AsyncSessionDep,
+    current_user: AsyncCurrentUser,
     file: UploadFile = File(...),
     collection_id: uuid.UUID = Form(...),
 ) -> Any:
@@ -298,74 +380,76 @@ async def upload_ans_pdf_to_collection(
     if not file.filename or not file.filename.endswith(".pdf"):
         raise HTTPException(status_code=400, detail="Only PDF files are allowed.")
 
-    collection = session.get(Collection, collection_id)
+    collection = await session.get(Collection, collection_id)
     if not collection:
         raise HTTPException(status_code=404, detail=f"Collection with ID {collection_id} not found.")
     
     if not current_user.is_superuser and collection.user_id != current_user.id:
         raise HTTPException(status_code=403, detail="Not enough permissions to add PDF to this collection.")
 
+    blob: PdfBlob | None = None
     try:
-        # Create a new AnsPdfFolder
+        # Store the PDF content-addressed; identical uploads share one copy
+        blob = await blob_store.store_upload(session, file)
+        profile = get_render_profile(collection.render_profile)
+
+        try:
+            rendered_pages = await blob_store.render_pages(session, blob, profile)
+        except RenderQueueFullError:
+            raise render_queue_full_exception()
+
+        # Create a new AnsPdfFolder once the pages are rendered. The folder, the
+        # AnsPdf, its pages and its evaluation job are committed together, so a
+        # worker never sees the sheet without its pages
         generated_folder_name = f"ans_pdf_folder_{uuid.uuid4().hex}"
-        ans_pdf_root_folder_path = UPLOAD_DIR / generated_folder_name
-        ans_pdf_root_folder_path.mkdir(parents=True, exist_ok=True)
         ans_pdf_folder_in = AnsPdfFolderCreate(name=generated_folder_name, collection_id=collection_id)
         ans_pdf_folder = AnsPdfFolder.model_validate(ans_pdf_folder_in)
         session.add(ans_pdf_folder)
-        session.commit()
-        session.refresh(ans_pdf_folder)
-        
-        # Save file and convert to images
-        pdf_name_stem = Path(file.filename).stem
-        unique_id = uuid.uuid4().hex[:8]
-        ans_pdf_images_folder = ans_pdf_root_folder_path / f"{pdf_name_stem}_{unique_id}"
-        ans_pdf_images_folder.mkdir(parents=True, exist_ok=True)
-        pdf_path = ans_pdf_images_folder / Path(file.filename).name
-        
-        with open(pdf_path, "wb") as buffer:
-            shutil.copyfileobj(file.file, buffer)
-        
-        doc = fitz.open(pdf_path)
-        page_image_paths = []
-        for i, page in enumerate(doc):  # type: ignore
-            image_path = ans_pdf_images_folder / f"page{i + 1}.png"
-            pix = page.get_pixmap()
-            pix.save(image_path)
-            page_image_paths.append(str(image_path))
-        doc.close()
+        await session.flush()
         
         # Create an AnsPdf record
         ans_pdf_in = AnsPdfCreate(
             name=file.filename,
-            filepath=str(pdf_path),
-            folder_path=str(ans_pdf_images_folder),
+            filepath=blob.filepath,
+            folder_path=str(blob_store.rendition_folder(blob.content_hash, profile)),
             ans_pdf_folder_id=ans_pdf_folder.id,
+            content_hash=blob.content_hash,
         )
         ans_pdf = AnsPdf.model_validate(ans_pdf_in)
         session.add(ans_pdf)
-        session.commit()
-        session.refresh(ans_pdf)
+        await session.flush()
 
         # ⭐ New Logic: Create a Page record for each image
-        for i, image_path in enumerate(page_image_paths):
+        for rendered_page in rendered_pages:
             page_in = Page(
-                page_no=i + 1,
-                image_path=image_path,
-                ans_pdf_id=ans_pdf.id
+                page_no=rendered_page.page_no,
+                image_path=str(rendered_page.image_path),
+                ans_pdf_id=ans_pdf.id,
+                collection_id=collection_id,
             )
             session.add(page_in)
-        
-        session.commit()
-        session.refresh(ans_pdf)
 
-        return ans_pdf
+        # Grade the sheet right away if the question paper is ready; otherwise it
+        # is queued once parsing completes
+        if settings.EVALUATION_AUTO_START and (
+            await session.run_sync(latest_parsed_qp_pdf, collection_id)
+        ) is not None:
+            await session.run_sync(enqueue_answer_sheet_evaluations, [ans_pdf.id])
+            await session.run_sync(refresh_evaluation_monitor, collection_id)
+
+        # The evaluation job waits for the page images still being written
+        await session.commit()
 
     except HTTPException:
+        await abandon_upload(session, blob)
         raise
     except Exception as e:
+        await abandon_upload(session, blob)
         raise HTTPException(status_code=500, detail=f"Answer PDF upload and conversion failed: {str(e)}")
 
+    await session.refresh(ans_pdf)
+    return ans_pdf
+
 # ---------------------------------------------------------
 # New endpoint for Question Paper PDF upload
 # ---------------------------------------------------------
@@ -376,9 +460,8 @@ async def upload_ans_pdf_to_collection(
     status_code=201,
 )
 async def upload_qppdf(
-    session: SessionDep,
-    current_user: CurrentUser,
-    background_tasks: BackgroundTasks,
+    session: AsyncSessionDep,
+    current_user: AsyncCurrentUser,
     file: UploadFile = File(...),
     collection_id: uuid.UUID = Form(...),
 ) -> Any:
@@ -388,103 +471,124 @@ async def upload_qppdf(
     if not file.filename or not file.filename.endswith(".pdf"):
         raise HTTPException(status_code=400, detail="Only PDF files are allowed.")
 
-    collection = session.get(Collection, collection_id)
+    collection = await session.get(Collection, collection_id)
     if not collection:
         raise HTTPException(status_code=404, detail=f"Collection with ID {collection_id} not found.")
     
     if not current_user.is_superuser and collection.user_id != current_user.id:
         raise HTTPException(status_code=403, detail="Not enough permissions to add a question paper to this collection.")
 
+    blob: PdfBlob | None = None
     try:
-        qp_pdf_name = Path(file.filename).stem
-        unique_id = uuid.uuid4().hex[:8]
-        qp_pdf_folder = UPLOAD_DIR / f"{qp_pdf_name}_qp_{unique_id}"
-        qp_pdf_folder.mkdir(exist_ok=True)
+        # Store the PDF content-addressed; identical uploads share one copy
+        blob = await blob_store.store_upload(session, file)
+        profile = get_render_profile(collection.render_profile)
 
-        file_location = qp_pdf_folder / Path(file.filename).name
-
-        with open(file_location, "wb") as buffer:
-            shutil.copyfileobj(file.file, buffer)
+        # The same paper may already have been parsed for another collection
+        cached_json_path = await session.run_sync(
+            qp_parse_cache.get, blob.content_hash, QP_PARSE_PROMPT_VERSION, llm_service.model
+        )
 
-        doc = fitz.open(file_location)
-        for i, page in enumerate(doc):  # type: ignore
-            pix = page.get_pixmap()
-            image_path = qp_pdf_folder / f"page{i + 1}.png"
-            pix.save(image_path)
-        doc.close()
+        qp_pdf_folder = blob_store.rendition_folder(blob.content_hash, profile)
+        try:
+            # The worker parses the pages from the rendition folder once written
+            await blob_store.render_pages(session, blob, profile)
+        except RenderQueueFullError:
+            raise render_queue_full_exception()
 
         qp_pdf_in = QpPdfCreate(
             name=file.filename,
-            filepath=str(file_location),
+            filepath=blob.filepath,
             folder_path=str(qp_pdf_folder),
+            json_path=cached_json_path,
             collection_id=collection_id,
+            content_hash=blob.content_hash,
         )
         qp_pdf = QpPdf.model_validate(qp_pdf_in)
         session.add(qp_pdf)
-        session.commit()
-        session.refresh(qp_pdf)
-        
-        # Add the new background task to process the images with the LLM
-        background_tasks.add_task(process_qp_images, qp_pdf_folder, qp_pdf.id)
 
-        return qp_pdf
+        if cached_json_path:
+            logger.info(f"Reusing cached question paper data from {cached_json_path}")
+            await session.run_sync(enqueue_results_summary_refresh, collection_id)
+            if settings.EVALUATION_AUTO_START:
+                await session.run_sync(enqueue_pending_answer_sheets, collection_id)
+                await session.run_sync(refresh_evaluation_monitor, collection_id)
+        else:
+            # Queue the LLM parse in the same transaction as the QpPdf row
+            await session.flush()
+            await session.run_sync(
+                job_queue.enqueue,
+                PARSE_QP_JOB,
+                {"qp_pdf_id": qp_pdf.id, "qp_pdf_folder": str(qp_pdf_folder)},
+                dedupe_key=f"{PARSE_QP_JOB}:{qp_pdf.id}",
+            )
+        # The parse job waits for the page images still being written
+        await session.commit()
 
     except HTTPException:
+        await abandon_upload(session, blob)
         raise
     except Exception as e:
+        await abandon_upload(session, blob)
         raise HTTPException(status_code=500, detail=f"Question paper upload and conversion failed: {str(e)}")
 
+    await session.refresh(qp_pdf)
+    return qp_pdf
+
 
 # ---------------------------------------------------------
 # New GET endpoints for AnsPdfFolder
 # ---------------------------------------------------------
 @router.get("/ans-pdf-folders/", response_model=AnsPdfFoldersPublic)
-def read_ans_pdf_folders(
-    session: SessionDep, current_user: CurrentUser, skip: int = 0, limit: int = 100
+async def read_ans_pdf_folders(
+    session: AsyncSessionDep,
+    current_user: AsyncCurrentUser,
+    skip: int = 0,
+    limit: int = 100,
+    cursor: str | None = None,
+    include_count: bool = True,
 ) -> Any:
     """
-    Retrieve a list of answer sheet folders.
+    Retrieve a list of answer sheet folders, oldest first.
     Superusers get all folders, regular users get folders from their own collections.
+    Pass the returned `next_cursor` as `cursor` to get the next page.
     """
+    statement = select(AnsPdfFolder)
+    count = None
     if current_user.is_superuser:
-        count_statement = select(func.count()).select_from(AnsPdfFolder)
-        count = session.exec(count_statement).one()
-        statement = select(AnsPdfFolder).offset(skip).limit(limit)
-        ans_pdf_folders = session.exec(statement).all()
+        if include_count:
+            count = await session.run_sync(row_counts.estimate, AnsPdfFolder)
     else:
-        statement = (
-            select(AnsPdfFolder)
-            .join(Collection)
-            .where(Collection.user_id == current_user.id)
-            .offset(skip)
-            .limit(limit)
-        )
-        ans_pdf_folders = session.exec(statement).all()
-
-        count_statement = (
-            select(func.count())
-            .select_from(AnsPdfFolder)
-            .join(Collection)
-            .where(Collection.user_id == current_user.id)
-        )
-        count = session.exec(count_statement).one()
+        statement = statement.join(Collection).where(Collection.user_id == current_user.id)
+        if include_count:
+            count = await session.run_sync(
+                row_counts.for_user, current_user.id, UserRowCounts.ans_pdf_folders
+            )
+    statement = paginate(
+        statement, AnsPdfFolder.created_at, AnsPdfFolder.id, skip=skip, limit=limit, cursor=cursor
+    )
+    ans_pdf_folders = (await session.exec(statement)).all()
 
-    return AnsPdfFoldersPublic(data=ans_pdf_folders, count=count) # type: ignore
+    return AnsPdfFoldersPublic(
+        data=ans_pdf_folders,
+        count=count,
+        next_cursor=next_cursor(ans_pdf_folders, AnsPdfFolder.created_at, limit),
+    )
 
 
 @router.get("/ans-pdf-folders/{id}", response_model=AnsPdfFolderPublic)
-def read_ans_pdf_folder(
-    session: SessionDep, current_user: CurrentUser, id: uuid.UUID
+async def read_ans_pdf_folder(
+    session: AsyncSessionDep, current_user: AsyncCurrentUser, id: uuid.UUID
 ) -> Any:
     """
     Get a single answer sheet folder by ID.
     """
-    ans_pdf_folder = session.get(AnsPdfFolder, id)
+    ans_pdf_folder = await session.get(AnsPdfFolder, id)
     if not ans_pdf_folder:
         raise HTTPException(status_code=404, detail="Answer PDF folder not found")
 
     if not current_user.is_superuser:
-        collection = session.get(Collection, ans_pdf_folder.collection_id)
+        collection = await session.get(Collection, ans_pdf_folder.collection_id)
         if not collection or collection.user_id != current_user.id:
             raise HTTPException(status_code=403, detail="Not enough permissions")
 
@@ -495,57 +599,62 @@ def read_ans_pdf_folder(
 # New GET endpoints for AnsPdf
 # ---------------------------------------------------------
 @router.get("/ans-pdfs/", response_model=AnsPdfsPublic)
-def read_ans_pdfs(
-    session: SessionDep, current_user: CurrentUser, skip: int = 0, limit: int = 100
+async def read_ans_pdfs(
+    session: AsyncSessionDep,
+    current_user: AsyncCurrentUser,
+    skip: int = 0,
+    limit: int = 100,
+    cursor: str | None = None,
+    include_count: bool = True,
 ) -> Any:
     """
-    Retrieve a list of uploaded answer sheet PDFs.
+    Retrieve a list of uploaded answer sheet PDFs, oldest first.
     Superusers get all PDFs, regular users get PDFs from their own collections.
+    Pass the returned `next_cursor` as `cursor` to get the next page.
     """
+    statement = select(AnsPdf)
+    count = None
     if current_user.is_superuser:
-        count_statement = select(func.count()).select_from(AnsPdf)
-        count = session.exec(count_statement).one()
-        statement = select(AnsPdf).offset(skip).limit(limit)
-        ans_pdfs = session.exec(statement).all()
+        if include_count:
+            count = await session.run_sync(row_counts.estimate, AnsPdf)
     else:
         statement = (
-            select(AnsPdf)
-            .join(AnsPdfFolder)
-            .join(Collection)
-            .where(Collection.user_id == current_user.id)
-            .offset(skip)
-            .limit(limit)
-        )
-        ans_pdfs = session.exec(statement).all()
-
-        count_statement = (
-            select(func.count())
-            .select_from(AnsPdf)
-            .join(AnsPdfFolder)
+            statement.join(AnsPdfFolder)
             .join(Collection)
             .where(Collection.user_id == current_user.id)
         )
-        count = session.exec(count_statement).one()
+        if include_count:
+            count = await session.run_sync(
+                row_counts.for_user, current_user.id, UserRowCounts.ans_pdfs
+            )
+    statement = paginate(
+        statement, AnsPdf.uploaded_at, AnsPdf.id, skip=skip, limit=limit, cursor=cursor
+    )
+    ans_pdfs = (await session.exec(statement)).all()
 
-    return AnsPdfsPublic(data=ans_pdfs, count=count) # type: ignore
+    return AnsPdfsPublic(
+        data=ans_pdfs,
+        count=count,
+        next_cursor=next_cursor(ans_pdfs, AnsPdf.uploaded_at, limit),
+    )
 
 
 @router.get("/ans-pdfs/{id}", response_model=AnsPdfPublic)
-def read_ans_pdf(
-    session: SessionDep, current_user: CurrentUser, id: uuid.UUID
+async def read_ans_pdf(
+    session: AsyncSessionDep, current_user: AsyncCurrentUser, id: uuid.UUID
 ) -> Any:
     """
     Get a single uploaded answer sheet PDF by ID.
     """
-    ans_pdf = session.get(AnsPdf, id)
+    ans_pdf = await session.get(AnsPdf, id)
     if not ans_pdf:
         raise HTTPException(status_code=404, detail="Answer PDF not found")
 
     if not current_user.is_superuser:
-        ans_pdf_folder = session.get(AnsPdfFolder, ans_pdf.ans_pdf_folder_id)
+        ans_pdf_folder = await session.get(AnsPdfFolder, ans_pdf.ans_pdf_folder_id)
         if not ans_pdf_folder:
             raise HTTPException(status_code=404, detail="Answer PDF folder not found")
-        collection = session.get(Collection, ans_pdf_folder.collection_id)
+        collection = await session.get(Collection, ans_pdf_folder.collection_id)
         if not collection or collection.user_id != current_user.id:
             raise HTTPException(status_code=403, detail="Not enough permissions")
 
@@ -555,18 +664,21 @@ def read_ans_pdf(
 # New GET endpoint to get AnsPdfs by collection ID
 # ---------------------------------------------------------
 @router.get("/ans-pdfs/by-collection/{collection_id}", response_model=AnsPdfsPublic)
-def get_ans_pdfs_by_collection(
-    session: SessionDep,
-    current_user: CurrentUser,
+async def get_ans_pdfs_by_collection(
+    session: AsyncSessionDep,
+    current_user: AsyncCurrentUser,
     collection_id: uuid.UUID,
     skip: int = 0,
     limit: int = 100,
+    cursor: str | None = None,
+    include_count: bool = True,
 ) -> Any:
     """
-    Retrieve all answer sheet PDFs for a specific collection.
+    Retrieve all answer sheet PDFs for a specific collection, oldest first.
+    Pass the returned `next_cursor` as `cursor` to get the next page.
     """
     # Authorization check: Ensure the user has permission to access this collection
-    collection = session.get(Collection, collection_id)
+    collection = await session.get(Collection, collection_id)
     if not collection:
         raise HTTPException(status_code=404, detail="Collection not found")
     
@@ -580,72 +692,77 @@ def get_ans_pdfs_by_collection(
         select(AnsPdf)
         .join(AnsPdfFolder)
         .where(AnsPdfFolder.collection_id == collection_id)
-        .offset(skip)
-        .limit(limit)
     )
-    ans_pdfs = session.exec(statement).all()
-
-    # Get the total count
-    count_statement = (
-        select(func.count())
-        .select_from(AnsPdf)
-        .join(AnsPdfFolder)
-        .where(AnsPdfFolder.collection_id == collection_id)
+    statement = paginate(
+        statement, AnsPdf.uploaded_at, AnsPdf.id, skip=skip, limit=limit, cursor=cursor
     )
-    count = session.exec(count_statement).one()
+    ans_pdfs = (await session.exec(statement)).all()
+
+    count = None
+    if include_count:
+        count = await session.run_sync(
+            row_counts.for_collection, collection_id, CollectionRowCounts.ans_pdfs
+        )
 
-    return AnsPdfsPublic(data=ans_pdfs, count=count) # type: ignore
+    return AnsPdfsPublic(
+        data=ans_pdfs,
+        count=count,
+        next_cursor=next_cursor(ans_pdfs, AnsPdf.uploaded_at, limit),
+    )
 
 # ---------------------------------------------------------
 # New GET endpoints for QpPdf
 # ---------------------------------------------------------
 @router.get("/qppdfs/", response_model=QpPdfsPublic)
-def read_qppdfs(
-    session: SessionDep, current_user: CurrentUser, skip: int = 0, limit: int = 100
+async def read_qppdfs(
+    session: AsyncSessionDep,
+    current_user: AsyncCurrentUser,
+    skip: int = 0,
+    limit: int = 100,
+    cursor: str | None = None,
+    include_count: bool = True,
 ) -> Any:
     """
-    Retrieve a list of uploaded Question Paper PDFs.
+    Retrieve a list of uploaded Question Paper PDFs, oldest first.
     Superusers get all QpPdfs, regular users get QpPdfs from their own collections.
+    Pass the returned `next_cursor` as `cursor` to get the next page.
     """
+    statement = select(QpPdf)
+    count = None
     if current_user.is_superuser:
-        count_statement = select(func.count()).select_from(QpPdf)
-        count = session.exec(count_statement).one()
-        statement = select(QpPdf).offset(skip).limit(limit)
-        qppdfs = session.exec(statement).all()
+        if include_count:
+            count = await session.run_sync(row_counts.estimate, QpPdf)
     else:
-        statement = (
-            select(QpPdf)
-            .join(Collection)
-            .where(Collection.user_id == current_user.id)
-            .offset(skip)
-            .limit(limit)
-        )
-        qppdfs = session.exec(statement).all()
-
-        count_statement = (
-            select(func.count())
-            .select_from(QpPdf)
-            .join(Collection)
-            .where(Collection.user_id == current_user.id)
-        )
-        count = session.exec(count_statement).one()
+        statement = statement.join(Collection).where(Collection.user_id == current_user.id)
+        if include_count:
+            count = await session.run_sync(
+                row_counts.for_user, current_user.id, UserRowCounts.qp_pdfs
+            )
+    statement = paginate(
+        statement, QpPdf.created_at, QpPdf.id, skip=skip, limit=limit, cursor=cursor
+    )
+    qppdfs = (await session.exec(statement)).all()
 
-    return QpPdfsPublic(data=qppdfs, count=count) # type: ignore
+    return QpPdfsPublic(
+        data=qppdfs,
+        count=count,
+        next_cursor=next_cursor(qppdfs, QpPdf.created_at, limit),
+    )
 
 
 @router.get("/qppdfs/{id}", response_model=QpPdfPublic)
-def read_qppdf(
-    session: SessionDep, current_user: CurrentUser, id: uuid.UUID
+async def read_qppdf(
+    session: AsyncSessionDep, current_user: AsyncCurrentUser, id: uuid.UUID
 ) -> Any:
     """
     Get a single uploaded Question Paper PDF by ID.
     """
-    qppdf = session.get(QpPdf, id)
+    qppdf = await session.get(QpPdf, id)
     if not qppdf:
         raise HTTPException(status_code=404, detail="Question Paper PDF not found")
 
     if not current_user.is_superuser:
-        collection = session.get(Collection, qppdf.collection_id)
+        collection = await session.get(Collection, qppdf.collection_id)
         if not collection or collection.user_id != current_user.id:
             raise HTTPException(status_code=403, detail="Not enough permissions")
 
@@ -655,18 +772,21 @@ def read_qppdf(
 # New GET endpoint to get QpPdfs by collection ID
 # ---------------------------------------------------------
 @router.get("/qppdfs/by-collection/{collection_id}", response_model=QpPdfsPublic)
-def get_qppdfs_by_collection(
-    session: SessionDep,
-    current_user: CurrentUser,
+async def get_qppdfs_by_collection(
+    session: AsyncSessionDep,
+    current_user: AsyncCurrentUser,
     collection_id: uuid.UUID,
     skip: int = 0,
     limit: int = 100,
+    cursor: str | None = None,
+    include_count: bool = True,
 ) -> Any:
     """
-    Retrieve all question paper PDFs for a specific collection.
+    Retrieve all question paper PDFs for a specific collection, oldest first.
+    Pass the returned `next_cursor` as `cursor` to get the next page.
     """
     # Authorization check: Ensure the user has permission to access this collection
-    collection = session.get(Collection, collection_id)
+    collection = await session.get(Collection, collection_id)
     if not collection:
         raise HTTPException(status_code=404, detail="Collection not found")
 
@@ -677,17 +797,38 @@ def get_qppdfs_by_collection(
     statement = (
         select(QpPdf)
         .where(QpPdf.collection_id == collection_id)
-        .offset(skip)
-        .limit(limit)
     )
-    qppdfs = session.exec(statement).all()
+    statement = paginate(
+        statement, QpPdf.created_at, QpPdf.id, skip=skip, limit=limit, cursor=cursor
+    )
+    qppdfs = (await session.exec(statement)).all()
 
-    # Get the total count
-    count_statement = (
-        select(func.count())
-        .select_from(QpPdf)
-        .where(QpPdf.collection_id == collection_id)
+    count = None
+    if include_count:
+        count = await session.run_sync(
+            row_counts.for_collection, collection_id, CollectionRowCounts.qp_pdfs
+        )
+
+    return QpPdfsPublic(
+        data=qppdfs,
+        count=count,
+        next_cursor=next_cursor(qppdfs, QpPdf.created_at, limit),
     )
-    count = session.exec(count_statement).one()
 
-    return QpPdfsPublic(data=qppdfs, count=count) # type: ignore
\ No newline at end of file
+
+# ---------------------------------------------------------
+# Admin endpoint to invalidate the question paper parse cache
+# ---------------------------------------------------------
+@router.delete(
+    "/qp-parse-cache/",
+    dependencies=[Depends(get_current_active_superuser)],
+)
+def invalidate_qp_parse_cache(
+    session: SessionDep, content_hash: str | None = None
+) -> Message:
+    """
+    Invalidate cached question paper parses, for one PDF (by content hash) or all.
+    The next upload of an affected paper is parsed by the LLM again.
+    """
+    deleted = qp_parse_cache.invalidate(session, content_hash)
+    return Message(message=f"Invalidated {deleted} cached question paper parse(s)")
@@ -2,7 +2,7 @@ import uuid
 from typing import Any
 
 from fastapi import APIRouter, Depends, HTTPException
-from sqlmodel import col, delete, func, select
+from sqlmodel import col, delete, select
 
 from app import crud
 from app.api.deps import (
@@ -10,6 +10,7 @@ from app.api.deps import (
     SessionDep,
     get_current_active_superuser,
 )
+from app.api.pagination import next_cursor, paginate
 from app.core.config import settings
 from app.core.security import get_password_hash, verify_password
 from app.models import (
@@ -24,6 +25,8 @@ from app.models import (
     UserUpdate,
     UserUpdateMe,
 )
+from app.services.blob_store import blob_store
+from app.services.row_counts import row_counts
 from app.utils import generate_new_account_email, send_email
 
 router = APIRouter(prefix="/users", tags=["users"])
@@ -34,18 +37,30 @@ router = APIRouter(prefix="/users", tags=["users"])
     dependencies=[Depends(get_current_active_superuser)],
     response_model=UsersPublic,
 )
-def read_users(session: SessionDep, skip: int = 0, limit: int = 100) -> Any:
+def read_users(
+    session: SessionDep,
+    skip: int = 0,
+    limit: int = 100,
+    cursor: str | None = None,
+    include_count: bool = True,
+) -> Any:
     """
-    Retrieve users.
+    Retrieve users, oldest first. Pass the returned `next_cursor` as `cursor`
+    to get the next page. The count is an estimate once there are many users.
     """
 
-    count_statement = select(func.count()).select_from(User)
-    count = session.exec(count_statement).one()
+    count = row_counts.estimate(session, User) if include_count else None
 
-    statement = select(User).offset(skip).limit(limit)
+    statement = paginate(
+        select(User), User.created_at, User.id, skip=skip, limit=limit, cursor=cursor
+    )
     users = session.exec(statement).all()
 
-    return UsersPublic(data=users, count=count) # type: ignore
+    return UsersPublic(
+        data=users,
+        count=count,
+        next_cursor=next_cursor(users, User.created_at, limit),
+    )
 
 
 @router.post(
@@ -134,8 +149,12 @@ def delete_user_me(session: SessionDep, current_user: CurrentUser) -> Any:
         raise HTTPException(
             status_code=403, detail="Super users are not allowed to delete themselves"
         )
+    # Their collections go with them; drop the references on the stored PDFs
+    content_hashes = blob_store.user_references(session, current_user.id)
     session.delete(current_user)
     session.commit()
+    for content_hash in content_hashes:
+        blob_store.release(session, content_hash)
     return Message(message="User deleted successfully")
 
 
@@ -221,6 +240,9 @@ def delete_user(
         )
     statement = delete(Item).where(col(Item.owner_id) == user_id)
     session.exec(statement)  # type: ignore
+    content_hashes = blob_store.user_references(session, user_id)
     session.delete(user)
     session.commit()
+    for content_hash in content_hashes:
+        blob_store.release(session, content_hash)
     return Message(message="User deleted successfully")
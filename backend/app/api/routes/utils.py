@@ -1,8 +1,20 @@
-from fastapi import APIRouter, Depends
+import json
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Any
+
+from fastapi import APIRouter, Depends, HTTPException
 from pydantic.networks import EmailStr
+from sqlalchemy.exc import IntegrityError
+from sqlmodel import func, select
 
-from app.api.deps import get_current_active_superuser
-from app.models import Message
+from app.api.deps import SessionDep, get_current_active_superuser
+from app.api.pagination import next_cursor, paginate
+from app.core.config import settings
+from app.models import Job, JobPublic, JobsPublic, Message, WorkerMetrics
+from app.services.job_queue import JOB_DEAD, JOB_STATUSES, job_queue
+from app.services.render_service import render_service
+from app.services.row_counts import row_counts
 from app.utils import generate_test_email, send_email
 
 router = APIRouter(prefix="/utils", tags=["utils"])
@@ -29,3 +41,97 @@ def test_email(email_to: EmailStr) -> Message:
 @router.get("/health-check/")
 async def health_check() -> bool:
     return True
+
+
+@router.get(
+    "/metrics/",
+    dependencies=[Depends(get_current_active_superuser)],
+)
+def read_metrics(session: SessionDep) -> dict[str, Any]:
+    """
+    Render pool metrics of this API process, the LLM, LLM cache and render
+    metrics last reported by each live worker process (where LLM calls are
+    made), and job queue counts by status.
+    """
+    reported_since = datetime.now(timezone.utc) - timedelta(
+        seconds=3 * settings.WORKER_METRICS_INTERVAL_SECONDS
+    )
+    workers = session.exec(
+        select(WorkerMetrics)
+        .where(WorkerMetrics.updated_at >= reported_since)
+        .order_by(WorkerMetrics.worker_id)
+    ).all()
+    return {
+        "render": render_service.stats(),
+        "workers": {
+            worker.worker_id: {"updated_at": worker.updated_at, **json.loads(worker.metrics)}
+            for worker in workers
+        },
+        "jobs": job_queue.stats(session),
+    }
+
+
+@router.get(
+    "/jobs/",
+    dependencies=[Depends(get_current_active_superuser)],
+    response_model=JobsPublic,
+)
+def read_jobs(
+    session: SessionDep,
+    status: str | None = None,
+    skip: int = 0,
+    limit: int = 100,
+    cursor: str | None = None,
+    include_count: bool = True,
+) -> Any:
+    """
+    List background jobs, most recent first, optionally filtered by status.
+    Pass the returned `next_cursor` as `cursor` to get the next page. Without a
+    status filter the count is an estimate once there are many jobs.
+    """
+    if status is not None and status not in JOB_STATUSES:
+        raise HTTPException(status_code=400, detail=f"Unknown job status: {status}")
+
+    statement = select(Job)
+    count = None
+    if status is not None:
+        statement = statement.where(Job.status == status)
+        if include_count:
+            count = session.exec(
+                select(func.count()).select_from(Job).where(Job.status == status)
+            ).one()
+    elif include_count:
+        count = row_counts.estimate(session, Job)
+    statement = paginate(
+        statement, Job.created_at, Job.id,
+        skip=skip, limit=limit, cursor=cursor, descending=True,
+    )
+    jobs = session.exec(statement).all()
+    return JobsPublic(
+        data=jobs,
+        count=count,
+        next_cursor=next_cursor(jobs, Job.created_at, limit),
+    )
+
+
+@router.post(
+    "/jobs/{job_id}/retry/",
+    dependencies=[Depends(get_current_active_superuser)],
+    response_model=JobPublic,
+)
+def retry_job(session: SessionDep, job_id: uuid.UUID) -> Any:
+    """
+    Requeue a dead job.
+    """
+    job = session.get(Job, job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found.")
+    if job.status != JOB_DEAD:
+        raise HTTPException(status_code=400, detail="Only dead jobs can be retried.")
+    try:
+        return job_queue.retry(session, job)
+    except IntegrityError:
+        session.rollback()
+        raise HTTPException(
+            status_code=409, detail="The same work is already queued or running."
+        )
@@ -4,6 +4,7 @@ from typing import Annotated, Any, Literal
 
 from pydantic import (
     AnyUrl,
+    BaseModel,
     BeforeValidator,
     EmailStr,
     HttpUrl,
@@ -24,6 +25,16 @@ def parse_cors(v: Any) -> list[str] | str:
     raise ValueError(v)
 
 
+class RenderProfile(BaseModel):
+    """How PDF pages are rasterized before being stored and sent to the LLM."""
+
+    dpi: int = 72
+    grayscale: bool = False
+    format: Literal["png", "jpeg"] = "png"
+    # Only used by JPEG
+    quality: int = 85
+
+
 class Settings(BaseSettings):
     model_config = SettingsConfigDict(
         # Use top level .env file (one level above ./backend/)
@@ -92,6 +103,150 @@ class Settings(BaseSettings):
     def emails_enabled(self) -> bool:
         return bool(self.SMTP_HOST and self.EMAILS_FROM_EMAIL)
 
+    # PDF rendering process pool. None shares the cores this process may run on
+    # evenly between the RENDER_POOLS_PER_HOST processes that each have a pool,
+    # e.g. the API's --workers.
+    RENDER_MAX_WORKERS: int | None = None
+    RENDER_POOLS_PER_HOST: int = 1
+    # Documents allowed to wait for a free render worker before uploads get a 503
+    RENDER_QUEUE_SIZE: int = 16
+    RENDER_RETRY_AFTER_SECONDS: int = 5
+    # Large PDFs are split into page ranges rendered in parallel. None means a
+    # single document may use every render worker.
+    RENDER_WORKERS_PER_DOCUMENT: int | None = None
+    RENDER_MIN_CHUNK_PAGES: int = 8
+
+    # Named render profiles, selectable per collection via Collection.render_profile.
+    RENDER_PROFILES: dict[str, RenderProfile] = {
+        "legacy": RenderProfile(dpi=72, grayscale=False, format="png"),
+        "standard": RenderProfile(dpi=150, grayscale=True, format="jpeg", quality=80),
+        "detailed": RenderProfile(dpi=200, grayscale=False, format="jpeg", quality=85),
+    }
+    DEFAULT_RENDER_PROFILE: str = "standard"
+
+    # Concurrent page evaluations (LLM calls) per worker process, and per collection
+    EVALUATION_MAX_CONCURRENCY: int = 16
+    EVALUATION_MAX_CONCURRENCY_PER_COLLECTION: int = 4
+    # Grade answer sheets as they arrive: each upload is queued for evaluation once
+    # the collection's question paper is parsed, and sheets uploaded earlier are
+    # queued when parsing completes
+    EVALUATION_AUTO_START: bool = True
+    # Consecutive pages of an answer sheet are graded together in one LLM call.
+    # The batch size is the number of pages that fit in the token budget once the
+    # shared prompt is accounted for, capped at EVALUATION_MAX_PAGES_PER_BATCH
+    # (1 disables batching).
+    EVALUATION_MAX_PAGES_PER_BATCH: int = 8
+    EVALUATION_BATCH_TOKEN_BUDGET: int = 32_000
+    # When the question paper makes the prompt at least this long, a cheap routing
+    # call first tags each page with the questions it answers, so grading calls
+    # only carry those questions. Sheets whose grading calls could not save more
+    # prompt tokens than routing them costs are not routed.
+    EVALUATION_ROUTING_ENABLED: bool = True
+    EVALUATION_ROUTING_MODEL: str = "gemini-1.5-flash-8b"
+    EVALUATION_ROUTING_MIN_PROMPT_TOKENS: int = 4000
+
+    # Multiple choice questions answered on a standard response grid (one row of
+    # option bubbles per question) are graded from the page images against the
+    # parsed correct answers; only rows that cannot be read with confidence go to
+    # the LLM. Pixels darker than the ink threshold (0-1) count as ink, and an
+    # option is marked when its cell holds this much more ink than the row's
+    # least-inked option.
+    OMR_ENABLED: bool = True
+    OMR_INK_THRESHOLD: float = 0.5
+    OMR_MARK_CONTRAST: float = 0.15
+    OMR_MIN_GRID_ROWS: int = 3
+
+    # Bulk ingestion (POST /ingest/{collection_id}/) streams pages from the
+    # renderer through archiving, grading, parsing and database writes. Each stage
+    # has its own workers and a bounded queue in front of it, so a slow stage
+    # holds back the ones before it instead of piling up rendered pages.
+    PIPELINE_RENDER_CHUNK_PAGES: int = 4
+    PIPELINE_QUEUE_SIZE: int = 32
+    PIPELINE_STORE_WORKERS: int = 4
+    PIPELINE_LLM_WORKERS: int = 4
+    PIPELINE_PARSE_WORKERS: int = 2
+
+    # Connection pools of the API, used by both its sync and its async engine
+    # (each engine has a pool of this size). Statements running longer than the
+    # timeout are cancelled by Postgres.
+    API_DB_POOL_SIZE: int = 5
+    API_DB_MAX_OVERFLOW: int = 10
+    API_DB_POOL_TIMEOUT_SECONDS: float = 30
+    API_DB_STATEMENT_TIMEOUT_SECONDS: float = 30
+
+    # Connection pool of the background worker, separate from the API's. Jobs only
+    # hold a connection for the short unit of work around each commit, never
+    # while waiting on the LLM, so a small pool serves every concurrent job.
+    WORKER_DB_POOL_SIZE: int = 5
+    WORKER_DB_MAX_OVERFLOW: int = 5
+    WORKER_DB_POOL_TIMEOUT_SECONDS: float = 30
+    WORKER_DB_STATEMENT_TIMEOUT_SECONDS: float = 300
+    # Postgres ends worker connections left idle inside a transaction this long
+    WORKER_DB_IDLE_IN_TRANSACTION_TIMEOUT_SECONDS: int = 60
+
+    # Unscoped superuser listings report the planner's row estimate (pg_class.reltuples)
+    # as their count; below this many rows an exact count is cheap and used instead
+    EXACT_COUNT_THRESHOLD: int = 10_000
+
+    # Item analysis of a collection's results (GET /evaluations/item-analysis/...).
+    # Results are cached per API process for this many collections and recomputed
+    # once the collection is graded further. Students in the top and bottom
+    # fraction by total score form the discrimination index groups.
+    ITEM_ANALYSIS_CACHE_SIZE: int = 64
+    ITEM_ANALYSIS_GROUP_FRACTION: float = 0.27
+    ITEM_ANALYSIS_HISTOGRAM_BINS: int = 10
+
+    # Durable job queue processed by `python -m app.worker`
+    JOB_WORKER_CONCURRENCY: int = 4
+    JOB_POLL_INTERVAL_SECONDS: float = 2
+    # A running job whose lease is not renewed by a heartbeat is retried elsewhere
+    JOB_LEASE_SECONDS: int = 120
+    JOB_HEARTBEAT_SECONDS: int = 30
+    # Workers log and store their LLM and render stats this often; /utils/metrics
+    # shows the workers that reported within the last three intervals
+    WORKER_METRICS_INTERVAL_SECONDS: int = 60
+    JOB_MAX_ATTEMPTS: int = 5
+    # Failed attempts are retried after backoff * 2^(attempt - 1), up to the max
+    JOB_RETRY_BACKOFF_SECONDS: int = 30
+    JOB_RETRY_BACKOFF_MAX_SECONDS: int = 1800
+
+    # Client-side limits for Gemini calls, shared by every caller in the process.
+    # Concurrency starts at LLM_INITIAL_CONCURRENCY and adapts (AIMD) between 1
+    # and LLM_MAX_CONCURRENCY depending on throttling.
+    LLM_REQUESTS_PER_MINUTE: int = 1000
+    LLM_TOKENS_PER_MINUTE: int = 1_000_000
+    LLM_INITIAL_CONCURRENCY: int = 4
+    LLM_MAX_CONCURRENCY: int = 64
+    LLM_REQUEST_TIMEOUT_SECONDS: float = 120
+    LLM_MAX_RETRIES: int = 4
+    LLM_RETRY_BACKOFF_SECONDS: float = 2
+    # Used to estimate request size before the provider reports actual usage
+    LLM_TOKENS_PER_IMAGE: int = 1500
+    LLM_EXPECTED_OUTPUT_TOKENS: int = 500
+
+    # Gemini context caching for the shared evaluation prompt prefix. Only used
+    # when the prefix is at least LLM_CONTEXT_CACHE_MIN_TOKENS long, the minimum
+    # the API accepts for cached content.
+    LLM_CONTEXT_CACHE_ENABLED: bool = True
+    LLM_CONTEXT_CACHE_MIN_TOKENS: int = 32_768
+    LLM_CONTEXT_CACHE_TTL_SECONDS: int = 3600
+    # Price of a cached prefix token relative to a normal input token
+    LLM_CONTEXT_CACHE_TOKEN_COST: float = 0.25
+
+    # Durable cache of LLM responses keyed by image + prompt + model + temperature
+    LLM_CACHE_ENABLED: bool = True
+    LLM_CACHE_TTL_DAYS: int = 30
+    LLM_CACHE_MAX_ENTRIES: int = 200_000
+
+    @model_validator(mode="after")
+    def _check_default_render_profile(self) -> Self:
+        if self.DEFAULT_RENDER_PROFILE not in self.RENDER_PROFILES:
+            raise ValueError(
+                f'DEFAULT_RENDER_PROFILE "{self.DEFAULT_RENDER_PROFILE}" is not one of '
+                f"the configured RENDER_PROFILES: {', '.join(self.RENDER_PROFILES)}"
+            )
+        return self
+
     EMAIL_TEST_USER: EmailStr = "test@example.com"
     FIRST_SUPERUSER: EmailStr
     FIRST_SUPERUSER_PASSWORD: str
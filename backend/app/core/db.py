@@ -1,10 +1,72 @@
+from collections.abc import Callable
+from typing import Any, Concatenate, ParamSpec, TypeVar
+
+from sqlalchemy.ext.asyncio import create_async_engine
 from sqlmodel import Session, create_engine, select
+from sqlmodel.ext.asyncio.session import AsyncSession as _AsyncSession
 
 from app import crud
 from app.core.config import settings
 from app.models import User, UserCreate
 
-engine = create_engine(str(settings.SQLALCHEMY_DATABASE_URI))
+
+def connect_options(**parameters: float) -> dict[str, Any]:
+    """
+    psycopg connect_args setting Postgres parameters given in seconds, e.g.
+    statement_timeout, for every connection of an engine.
+    """
+    return {
+        "options": " ".join(
+            f"-c {name}={int(seconds * 1000)}" for name, seconds in parameters.items()
+        )
+    }
+
+
+_api_pool = dict(
+    pool_size=settings.API_DB_POOL_SIZE,
+    max_overflow=settings.API_DB_MAX_OVERFLOW,
+    pool_timeout=settings.API_DB_POOL_TIMEOUT_SECONDS,
+    pool_pre_ping=True,
+    connect_args=connect_options(
+        statement_timeout=settings.API_DB_STATEMENT_TIMEOUT_SECONDS
+    ),
+)
+
+engine = create_engine(str(settings.SQLALCHEMY_DATABASE_URI), **_api_pool)
+
+# For `async def` routes, so database I/O does not block the event loop.
+# psycopg 3 serves both engines with the same postgresql+psycopg URL.
+async_engine = create_async_engine(str(settings.SQLALCHEMY_DATABASE_URI), **_api_pool)
+
+_P = ParamSpec("_P")
+_T = TypeVar("_T")
+
+
+class AsyncSession(_AsyncSession):
+    # run_sync hands `fn` the sqlmodel Session this class is built with, but is
+    # typed against sqlalchemy's; accept helpers written for the sqlmodel one
+    async def run_sync(
+        self,
+        fn: Callable[Concatenate[Session, _P], _T],
+        *arg: _P.args,
+        **kw: _P.kwargs,
+    ) -> _T:
+        return await super().run_sync(fn, *arg, **kw)  # type: ignore[arg-type]
+
+
+# Used by `python -m app.worker`, so that long-running jobs can never take the
+# connections API requests need
+worker_engine = create_engine(
+    str(settings.SQLALCHEMY_DATABASE_URI),
+    pool_size=settings.WORKER_DB_POOL_SIZE,
+    max_overflow=settings.WORKER_DB_MAX_OVERFLOW,
+    pool_timeout=settings.WORKER_DB_POOL_TIMEOUT_SECONDS,
+    pool_pre_ping=True,
+    connect_args=connect_options(
+        statement_timeout=settings.WORKER_DB_STATEMENT_TIMEOUT_SECONDS,
+        idle_in_transaction_session_timeout=settings.WORKER_DB_IDLE_IN_TRANSACTION_TIMEOUT_SECONDS,
+    ),
+)
 
 
 # make sure all SQLModel models are imported (app.models) before initializing DB
@@ -3,6 +3,7 @@ from typing import Optional
 import uuid
 
 from pydantic import EmailStr
+from sqlalchemy import Index, text
 from sqlmodel import Field, Relationship, SQLModel
 
 
@@ -43,8 +44,13 @@ class UpdatePassword(SQLModel):
 
 # Database model, database table inferred from class name
 class User(UserBase, table=True):
+    __table_args__ = (Index("ix_user_created_at_id", "created_at", "id"),)
+
     id: uuid.UUID = Field(default_factory=uuid.uuid4, primary_key=True)
     hashed_password: str
+    created_at: datetime = Field(
+        default_factory=lambda: datetime.now(timezone.utc)
+    )
     items: list["Item"] = Relationship(back_populates="owner", cascade_delete=True)
     collections: list["Collection"] = Relationship(back_populates="user", cascade_delete=True)
 
@@ -56,7 +62,10 @@ class UserPublic(UserBase):
 
 class UsersPublic(SQLModel):
     data: list[UserPublic]
-    count: int
+    # None when the caller passed include_count=false; see app/services/row_counts.py
+    count: int | None
+    # Pass back as `cursor` to get the next page, None on the last page
+    next_cursor: str | None = None
 
 
 # Shared properties
@@ -121,10 +130,21 @@ class CollectionBase(SQLModel):
     department: str | None = None
     school: str | None = None
     is_evaluated: bool = Field(default=False)
+    # Name of a render profile from settings.RENDER_PROFILES, None means the default
+    render_profile: str | None = Field(default=None, max_length=64)
     
 class Collection(CollectionBase, table=True):
+    __table_args__ = (
+        # Keyset pagination of all collections and of one user's collections
+        Index("ix_collection_created_at_id", "created_at", "id"),
+        Index("ix_collection_user_id_created_at_id", "user_id", "created_at", "id"),
+    )
+
     id: uuid.UUID = Field(default_factory=uuid.uuid4, primary_key=True)
     user_id: uuid.UUID = Field(foreign_key="user.id", nullable=False)
+    created_at: datetime = Field(
+        default_factory=lambda: datetime.now(timezone.utc)
+    )
 
     # Relationships to other tables
     user: "User" = Relationship(back_populates="collections")
@@ -136,8 +156,13 @@ class AnsPdfFolderBase(SQLModel):
     name: str
 
 class AnsPdfFolder(AnsPdfFolderBase, table=True):
+    __table_args__ = (Index("ix_anspdffolder_created_at_id", "created_at", "id"),)
+
     id: uuid.UUID = Field(default_factory=uuid.uuid4, primary_key=True)
-    collection_id: uuid.UUID = Field(foreign_key="collection.id", nullable=False)
+    collection_id: uuid.UUID = Field(foreign_key="collection.id", nullable=False, index=True)
+    created_at: datetime = Field(
+        default_factory=lambda: datetime.now(timezone.utc)
+    )
 
     # Relationships
     collection: "Collection" = Relationship(back_populates="ans_pdf_folders")
@@ -152,22 +177,29 @@ class AnsPdfFolderPublic(AnsPdfFolderBase):
 
 class AnsPdfFoldersPublic(SQLModel):
     data: list[AnsPdfFolderPublic]
-    count: int
+    count: int | None
+    next_cursor: str | None = None
 
 class AnsPdfBase(SQLModel):
     name: str
 
 class AnsPdf(AnsPdfBase, table=True):
+    __table_args__ = (Index("ix_anspdf_uploaded_at_id", "uploaded_at", "id"),)
+
     id: uuid.UUID = Field(default_factory=uuid.uuid4, primary_key=True)
-    ans_pdf_folder_id: uuid.UUID = Field(foreign_key="anspdffolder.id", nullable=False)
+    ans_pdf_folder_id: uuid.UUID = Field(foreign_key="anspdffolder.id", nullable=False, index=True)
     filepath: str
     folder_path: str
+    # sha256 of the uploaded PDF, references PdfBlob (None for pre-dedup uploads)
+    content_hash: str | None = Field(default=None, max_length=64, index=True)
     uploaded_at: datetime = Field(
         default_factory=lambda: datetime.now(timezone.utc),
         nullable=False
     )
     
     is_evaluated: bool = Field(default=False, nullable=False)
+    # Set while an ingest job still owns the sheet; evaluation jobs leave it alone
+    is_ingesting: bool = Field(default=False, nullable=False)
 
     # Relationships
     ans_pdf_folder: "AnsPdfFolder" = Relationship(back_populates="ans_pdfs")
@@ -177,6 +209,7 @@ class AnsPdfCreate(AnsPdfBase):
     ans_pdf_folder_id: uuid.UUID # Required to link to an AnsPdfFolder
     filepath: str # Path to the saved PDF file
     folder_path: str # Path to the folder containing page images
+    content_hash: str | None = None # PdfBlob the PDF is stored in
 
 class AnsPdfPublic(AnsPdfBase):
     id: uuid.UUID
@@ -187,7 +220,8 @@ class AnsPdfPublic(AnsPdfBase):
 
 class AnsPdfsPublic(SQLModel):
     data: list[AnsPdfPublic]
-    count: int
+    count: int | None
+    next_cursor: str | None = None
 
 class QpPdfBase(SQLModel):
     name: str
@@ -196,8 +230,16 @@ class QpPdfBase(SQLModel):
     json_path: Optional[str] = None
 
 class QpPdf(QpPdfBase, table=True):
+    __table_args__ = (
+        # Latest question paper of a collection
+        Index("ix_qppdf_collection_id_created_at", "collection_id", "created_at"),
+        Index("ix_qppdf_created_at_id", "created_at", "id"),
+    )
+
     id: uuid.UUID = Field(default_factory=uuid.uuid4, primary_key=True)
     collection_id: uuid.UUID = Field(foreign_key="collection.id", nullable=False)
+    # sha256 of the uploaded PDF, references PdfBlob (None for pre-dedup uploads)
+    content_hash: str | None = Field(default=None, max_length=64, index=True)
     created_at: datetime = Field(
         default_factory=lambda: datetime.now(timezone.utc)
     )
@@ -205,14 +247,123 @@ class QpPdf(QpPdfBase, table=True):
     # Relationships
     collection: "Collection" = Relationship(back_populates="qp_pdfs")
 
+# Content-addressed store for uploaded PDFs, shared by every AnsPdf/QpPdf
+# with the same content. ref_count tracks how many of those rows point at it.
+class PdfBlob(SQLModel, table=True):
+    content_hash: str = Field(primary_key=True, max_length=64)
+    filepath: str
+    size_bytes: int
+    ref_count: int = Field(default=0, nullable=False)
+    created_at: datetime = Field(
+        default_factory=lambda: datetime.now(timezone.utc)
+    )
+
+# Pages of a PdfBlob rendered with one render profile, reused by later uploads
+class PdfRendition(SQLModel, table=True):
+    content_hash: str = Field(
+        foreign_key="pdfblob.content_hash", primary_key=True, max_length=64, ondelete="CASCADE"
+    )
+    profile_key: str = Field(primary_key=True, max_length=64)
+    folder_path: str
+    page_count: int
+    created_at: datetime = Field(
+        default_factory=lambda: datetime.now(timezone.utc)
+    )
+
+# Parsed question paper JSON, shared by every upload of the same PDF as long as
+# the parsing prompt and model are unchanged
+class QpParseCacheEntry(SQLModel, table=True):
+    content_hash: str = Field(primary_key=True, max_length=64)
+    prompt_version: str = Field(primary_key=True, max_length=32)
+    model: str = Field(primary_key=True, max_length=128)
+    json_path: str
+    created_at: datetime = Field(
+        default_factory=lambda: datetime.now(timezone.utc)
+    )
+
+# Raw LLM responses keyed by a hash of everything that determines them (images,
+# prompt, model and temperature), so identical requests are never paid for twice
+class LLMResponseCacheEntry(SQLModel, table=True):
+    cache_key: str = Field(primary_key=True, max_length=64)
+    model: str = Field(max_length=128)
+    response: str
+    hits: int = Field(default=0, nullable=False)
+    created_at: datetime = Field(
+        default_factory=lambda: datetime.now(timezone.utc)
+    )
+    last_accessed_at: datetime = Field(
+        default_factory=lambda: datetime.now(timezone.utc), index=True
+    )
+
+# Durable background work (question paper parsing, evaluation runs) picked up by
+# `python -m app.worker`. A job goes queued -> running -> succeeded; a failed
+# attempt goes back to queued after a backoff, or to dead once max_attempts is used.
+class JobBase(SQLModel):
+    kind: str = Field(max_length=64, index=True)
+    payload: str = Field(default="{}")  # JSON arguments for the handler
+    status: str = Field(default="queued", max_length=16)
+    dedupe_key: str | None = Field(default=None, max_length=255)
+    attempts: int = Field(default=0)
+    max_attempts: int = Field(default=5)
+    last_error: str | None = None
+    result: str | None = None  # JSON returned by the handler, e.g. pipeline stats
+    run_after: datetime = Field(
+        default_factory=lambda: datetime.now(timezone.utc)
+    )
+    created_at: datetime = Field(
+        default_factory=lambda: datetime.now(timezone.utc)
+    )
+    finished_at: datetime | None = None
+
+class Job(JobBase, table=True):
+    __table_args__ = (
+        Index("ix_job_status_run_after", "status", "run_after"),
+        # At most one queued or running job per dedupe key
+        Index(
+            "ix_job_dedupe_key_active",
+            "dedupe_key",
+            unique=True,
+            postgresql_where=text("status IN ('queued', 'running')"),
+        ),
+    )
+
+    id: uuid.UUID = Field(default_factory=uuid.uuid4, primary_key=True)
+    # Lease held by the worker running the job, extended by its heartbeats
+    locked_by: str | None = Field(default=None, max_length=255)
+    locked_until: datetime | None = None
+    heartbeat_at: datetime | None = None
+
+class JobPublic(JobBase):
+    id: uuid.UUID
+    locked_by: str | None
+    heartbeat_at: datetime | None
+
+class JobsPublic(SQLModel):
+    data: list[JobPublic]
+    count: int | None
+    next_cursor: str | None = None
+
+# In-process metrics (LLM rate limiter, LLM response cache, render pool) that each
+# `python -m app.worker` process reports periodically, read by /utils/metrics
+class WorkerMetrics(SQLModel, table=True):
+    worker_id: str = Field(primary_key=True, max_length=255)
+    metrics: str = Field(default="{}")  # JSON
+    updated_at: datetime = Field(
+        default_factory=lambda: datetime.now(timezone.utc)
+    )
+
 class PageBase(SQLModel):
     page_no: int
     image_path: str
     is_evaluated: bool = Field(default=False)
+    # Comma-separated question numbers (e.g. "1.1,1.2") found on the page by routing
+    question_nos: str | None = Field(default=None, max_length=1024)
 
 class Page(PageBase, table=True):
     id: uuid.UUID = Field(default_factory=uuid.uuid4, primary_key=True)
-    ans_pdf_id: uuid.UUID = Field(foreign_key="anspdf.id", nullable=False)
+    ans_pdf_id: uuid.UUID = Field(foreign_key="anspdf.id", nullable=False, index=True)
+    # Copied from the answer sheet's folder so per-collection queries skip the joins
+    collection_id: uuid.UUID = Field(foreign_key="collection.id", nullable=False, index=True)
 
     # Relationships
     ans_pdf: "AnsPdf" = Relationship(back_populates="pages")
@@ -226,8 +377,19 @@ class EvaluationBase(SQLModel):
     evaluation_json_path: str | None = None
 
 class Evaluation(EvaluationBase, table=True):
+    __table_args__ = (
+        # Results of a collection in keyset pagination order
+        Index("ix_evaluation_collection_id_created_at_id", "collection_id", "created_at", "id"),
+    )
+
     id: uuid.UUID = Field(default_factory=uuid.uuid4, primary_key=True)
-    page_id: uuid.UUID = Field(foreign_key="page.id", nullable=False)
+    page_id: uuid.UUID = Field(foreign_key="page.id", nullable=False, index=True)
+    # Copied from the page so per-sheet and per-collection queries skip the joins
+    ans_pdf_id: uuid.UUID = Field(foreign_key="anspdf.id", nullable=False, index=True)
+    collection_id: uuid.UUID = Field(foreign_key="collection.id", nullable=False)
+    created_at: datetime = Field(
+        default_factory=lambda: datetime.now(timezone.utc)
+    )
 
     # Relationships
     page: "Page" = Relationship(back_populates="evaluations")
@@ -235,10 +397,104 @@ class Evaluation(EvaluationBase, table=True):
 class EvaluationPublic(EvaluationBase):
     id: uuid.UUID
     page_id: uuid.UUID
+    ans_pdf_id: uuid.UUID
+    collection_id: uuid.UUID
 
 class EvaluationsPublic(SQLModel):
     data: list[EvaluationPublic]
-    count: int
+    count: int | None
+    next_cursor: str | None = None
+
+# Results of each graded answer sheet, refreshed whenever one of its pages' results
+# is committed (app/services/results_summary.py). Marks follow the question
+# paper's "answer any N" sections, so only a section's best N answers count.
+class AnswerSheetResult(SQLModel, table=True):
+    ans_pdf_id: uuid.UUID = Field(foreign_key="anspdf.id", primary_key=True, ondelete="CASCADE")
+    collection_id: uuid.UUID = Field(
+        foreign_key="collection.id", nullable=False, index=True, ondelete="CASCADE"
+    )
+    obtained_marks: float
+    max_marks: float
+    questions_graded: int
+    sections: str = Field(default="[]")  # JSON list of SectionResultPublic
+    updated_at: datetime = Field(
+        default_factory=lambda: datetime.now(timezone.utc)
+    )
+
+# Best marks of each question on each answer sheet
+class QuestionResult(SQLModel, table=True):
+    __table_args__ = (
+        Index("ix_questionresult_collection_id_question_no", "collection_id", "question_no"),
+    )
+
+    ans_pdf_id: uuid.UUID = Field(foreign_key="anspdf.id", primary_key=True, ondelete="CASCADE")
+    question_no: str = Field(primary_key=True, max_length=32)
+    collection_id: uuid.UUID = Field(foreign_key="collection.id", nullable=False, ondelete="CASCADE")
+    obtained_marks: int
+    max_marks: int
+    # False when the answer is outside the best N of an "answer any N" section
+    counted: bool = Field(default=True)
+
+class SectionResultPublic(SQLModel):
+    section_no: int | None  # None for answers that match no question of the paper
+    name: str | None = None
+    required: int | None = None  # N of "answer any N", None if every question counts
+    obtained_marks: float
+    max_marks: float
+    counted: list[str]
+
+class StudentResultPublic(SQLModel):
+    ans_pdf_id: uuid.UUID
+    name: str
+    is_evaluated: bool
+    obtained_marks: float
+    max_marks: float
+    questions_graded: int
+    sections: list[SectionResultPublic]
+
+class QuestionStatsPublic(SQLModel):
+    question_no: str
+    attempts: int
+    counted: int
+    mean_marks: float
+    min_marks: int
+    max_obtained_marks: int
+    max_marks: int
+
+class ResultsSummaryPublic(SQLModel):
+    collection_id: uuid.UUID
+    answer_sheets: int
+    graded_answer_sheets: int
+    mean_marks: float | None
+    students: list[StudentResultPublic]
+    questions: list[QuestionStatsPublic]
+
+# Item analysis of a collection (app/services/item_analysis.py). Statistics
+# that are undefined for the cohort, e.g. a spread over fewer than two
+# answers, are None.
+class QuestionAnalysisPublic(SQLModel):
+    question_no: str
+    attempts: int
+    max_marks: int
+    mean: float | None
+    std: float | None
+    facility: float | None  # mean / max_marks
+    discrimination: float | None  # top minus bottom group mean, / max_marks
+    histogram: list[int]  # students per mark, from 0 to max_marks
+
+class ScoreHistogramPublic(SQLModel):
+    edges: list[float]
+    counts: list[int]
+
+class ItemAnalysisPublic(SQLModel):
+    collection_id: uuid.UUID
+    students: int
+    mean_score: float | None
+    std_score: float | None
+    score_histogram: ScoreHistogramPublic
+    cronbach_alpha: float | None
+    last_evaluated_at: datetime | None
+    questions: list[QuestionAnalysisPublic]
 
 class EvaluationMonitorBase(SQLModel):
     estimated_total: int
@@ -264,6 +520,25 @@ class EvaluationMonitorsPublic(SQLModel):
     data: list[EvaluationMonitorPublic]
     count: int
 
+# Row counts of the list endpoints' common scopes, kept in step with every insert
+# and delete by database triggers (migration b7e3d9f2a6c4) so that a listing can
+# report its total without counting over a join
+class CollectionRowCounts(SQLModel, table=True):
+    collection_id: uuid.UUID = Field(
+        foreign_key="collection.id", primary_key=True, ondelete="CASCADE"
+    )
+    ans_pdf_folders: int = Field(default=0, nullable=False)
+    ans_pdfs: int = Field(default=0, nullable=False)
+    qp_pdfs: int = Field(default=0, nullable=False)
+    evaluations: int = Field(default=0, nullable=False)
+
+class UserRowCounts(SQLModel, table=True):
+    user_id: uuid.UUID = Field(foreign_key="user.id", primary_key=True, ondelete="CASCADE")
+    collections: int = Field(default=0, nullable=False)
+    ans_pdf_folders: int = Field(default=0, nullable=False)
+    ans_pdfs: int = Field(default=0, nullable=False)
+    qp_pdfs: int = Field(default=0, nullable=False)
+
 # Properties to receive on collection creation
 class CollectionCreate(CollectionBase):
     pass
@@ -275,6 +550,7 @@ class CollectionUpdate(SQLModel):
     department: str | None = Field(default=None)
     school: str | None = Field(default=None)
     is_evaluated: bool | None = Field(default=None)
+    render_profile: str | None = Field(default=None, max_length=64)
     
 # Properties to return via API, id is always required
 class CollectionPublic(CollectionBase):
@@ -283,11 +559,13 @@ class CollectionPublic(CollectionBase):
 
 class CollectionsPublic(SQLModel):
     data: list[CollectionPublic]
-    count: int
+    count: int | None
+    next_cursor: str | None = None
     
 # Properties to receive on QpPdf creation
 class QpPdfCreate(QpPdfBase):
     collection_id: uuid.UUID # Required to link to a collection
+    content_hash: str | None = None # PdfBlob the PDF is stored in
 
 # Properties to return via API, id is always required
 class QpPdfPublic(QpPdfBase):
@@ -296,4 +574,5 @@ class QpPdfPublic(QpPdfBase):
 
 class QpPdfsPublic(SQLModel):
     data: list[QpPdfPublic]
-    count: int
\ No newline at end of file
+    count: int | None
+    next_cursor: str | None = None
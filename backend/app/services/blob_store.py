@@ -0,0 +1,296 @@
+# app/services/blob_store.py
+
+import asyncio
+import hashlib
+import logging
+import shutil
+import uuid
+from collections.abc import Sequence
+from functools import partial
+from pathlib import Path
+from typing import BinaryIO
+
+from fastapi import UploadFile
+from sqlalchemy.dialects.postgresql import insert
+from sqlmodel import Session, col, delete, select
+
+from app.core.config import RenderProfile
+from app.core.db import AsyncSession, worker_engine
+from app.models import AnsPdf, AnsPdfFolder, Collection, PdfBlob, PdfRendition, QpPdf
+from app.services.render_service import (
+    IMAGE_MIME_TYPES,
+    RenderedPage,
+    archive_pages,
+    list_page_images,
+    render_service,
+)
+
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = 1024 * 1024
+
+
+def profile_key(profile: RenderProfile) -> str:
+    """Folder-safe identifier for the rendering parameters of a profile."""
+    colorspace = "gray" if profile.grayscale else "rgb"
+    return f"{profile.dpi}dpi-{colorspace}-{profile.format}-q{profile.quality}"
+
+
+def _copy_and_hash(source: BinaryIO, destination: Path) -> tuple[str, int]:
+    """Stream `source` into `destination`, hashing it on the way."""
+    digest = hashlib.sha256()
+    size = 0
+    with open(destination, "wb") as buffer:
+        while chunk := source.read(CHUNK_SIZE):
+            digest.update(chunk)
+            buffer.write(chunk)
+            size += len(chunk)
+    return digest.hexdigest(), size
+
+
+class BlobStore:
+    """
+    Content-addressed storage for uploaded PDFs. Each distinct PDF is stored once
+    under its sha256 together with its rendered pages, no matter how many
+    collections it is uploaded to. PdfBlob.ref_count tracks the AnsPdf/QpPdf rows
+    pointing at a blob so that its files are only removed once nothing uses them.
+    """
+
+    def __init__(self, root: Path):
+        self.root = root
+        # Background writes of freshly rendered pages, by (content hash, profile key)
+        self._archiving: dict[tuple[str, str], asyncio.Task[None]] = {}
+
+    def blob_folder(self, content_hash: str) -> Path:
+        return self.root / content_hash[:2] / content_hash
+
+    def blob_path(self, content_hash: str) -> Path:
+        return self.blob_folder(content_hash) / "source.pdf"
+
+    def rendition_folder(self, content_hash: str, profile: RenderProfile) -> Path:
+        return self.blob_folder(content_hash) / profile_key(profile)
+
+    async def store_upload(self, session: AsyncSession, file: UploadFile) -> PdfBlob:
+        """
+        Save an uploaded PDF, hashing it while it is written, and take a reference
+        on its blob. The caller owns that reference and must `release` it if the
+        upload is abandoned.
+        """
+        incoming = self.root / "incoming"
+        incoming.mkdir(parents=True, exist_ok=True)
+        tmp_path = incoming / f"{uuid.uuid4().hex}.pdf"
+        try:
+            content_hash, size = await asyncio.to_thread(
+                _copy_and_hash, file.file, tmp_path
+            )
+            return await session.run_sync(self._store, tmp_path, content_hash, size)
+        finally:
+            tmp_path.unlink(missing_ok=True)
+
+    def _store(self, session: Session, tmp_path: Path, content_hash: str, size: int) -> PdfBlob:
+        """
+        Take a reference on the blob and move the upload into place while its row
+        is locked, so that a concurrent `release` of the last reference cannot
+        delete the files in between. Commits.
+        """
+        blob = self.acquire(session, content_hash, size)
+        destination = self.blob_path(content_hash)
+        if destination.exists():
+            logger.info(f"Reusing stored PDF {content_hash}")
+        else:
+            destination.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path.replace(destination)
+        session.commit()
+        session.refresh(blob)
+        return blob
+
+    def acquire(self, session: Session, content_hash: str, size: int) -> PdfBlob:
+        """
+        Create the blob row if needed, increment its reference count and lock the
+        row for the rest of the transaction. Does not commit.
+        """
+        statement = (
+            insert(PdfBlob)
+            .values(
+                content_hash=content_hash,
+                filepath=str(self.blob_path(content_hash)),
+                size_bytes=size,
+                ref_count=1,
+            )
+            .on_conflict_do_update(
+                index_elements=["content_hash"],
+                set_={"ref_count": PdfBlob.ref_count + 1},
+            )
+        )
+        session.execute(statement)
+        return session.exec(
+            select(PdfBlob)
+            .where(PdfBlob.content_hash == content_hash)
+            .with_for_update()
+            .execution_options(populate_existing=True)
+        ).one()
+
+    def release(self, session: Session, content_hash: str) -> None:
+        """
+        Drop one reference to a blob. When the last reference goes away the blob,
+        its renditions and all of its files are deleted. The blob row stays locked
+        until the files are gone, so an upload of the same PDF waits for that
+        instead of finding files that are about to be removed. Commits.
+        """
+        blob = session.exec(
+            select(PdfBlob)
+            .where(PdfBlob.content_hash == content_hash)
+            .with_for_update()
+            .execution_options(populate_existing=True)
+        ).first()
+        if blob is None:
+            return
+        blob.ref_count -= 1
+        if blob.ref_count > 0:
+            session.add(blob)
+            session.commit()
+            return
+
+        logger.info(f"Removing unreferenced PDF blob {content_hash}")
+        # Renditions go with the blob through ON DELETE CASCADE
+        session.execute(delete(PdfBlob).where(col(PdfBlob.content_hash) == content_hash))
+        shutil.rmtree(self.blob_folder(content_hash), ignore_errors=True)
+        session.commit()
+
+    def collection_references(
+        self, session: Session, collection_ids: Sequence[uuid.UUID]
+    ) -> list[str]:
+        """
+        The content hash of every AnsPdf and QpPdf of the given collections, once
+        per reference, to `release` after the collections have been deleted.
+        """
+        if not collection_ids:
+            return []
+        ans_pdf_hashes = session.exec(
+            select(AnsPdf.content_hash)
+            .join(AnsPdfFolder)
+            .where(col(AnsPdfFolder.collection_id).in_(collection_ids))
+        ).all()
+        qp_pdf_hashes = session.exec(
+            select(QpPdf.content_hash).where(col(QpPdf.collection_id).in_(collection_ids))
+        ).all()
+        return [
+            content_hash
+            for content_hash in [*ans_pdf_hashes, *qp_pdf_hashes]
+            if content_hash
+        ]
+
+    def user_references(self, session: Session, user_id: uuid.UUID) -> list[str]:
+        """Like `collection_references`, for every collection of a user."""
+        collection_ids = session.exec(
+            select(Collection.id).where(Collection.user_id == user_id)
+        ).all()
+        return self.collection_references(session, list(collection_ids))
+
+    async def rendered_pages(
+        self, session: Session, blob: PdfBlob, profile: RenderProfile
+    ) -> list[RenderedPage] | None:
+        """
+        The pages of a blob rendered with `profile` by an earlier upload (their
+        `data` is None), or None if there is no complete rendition on disk.
+        """
+        rendition = session.get(PdfRendition, (blob.content_hash, profile_key(profile)))
+        return await self._rendition_pages(blob, profile, rendition)
+
+    async def _rendition_pages(
+        self, blob: PdfBlob, profile: RenderProfile, rendition: PdfRendition | None
+    ) -> list[RenderedPage] | None:
+        folder = self.rendition_folder(blob.content_hash, profile)
+        if not rendition or not folder.exists():
+            return None
+        image_paths = await asyncio.to_thread(list_page_images, folder)
+        if len(image_paths) != rendition.page_count:
+            return None
+        mime_type = IMAGE_MIME_TYPES[profile.format]
+        return [
+            RenderedPage(page_no=i + 1, image_path=path, data=None, mime_type=mime_type)
+            for i, path in enumerate(image_paths)
+        ]
+
+    def pages_written(
+        self, session: Session, content_hash: str | None, folder_path: str
+    ) -> bool:
+        """
+        Whether every page image in a rendition folder is on disk. Freshly
+        rendered pages are written after the upload has been committed, and
+        their rendition is only recorded once they are. PDFs stored before
+        content addressing had their pages written up front.
+        """
+        if content_hash is None:
+            return True
+        rendition = session.exec(
+            select(PdfRendition.content_hash).where(
+                PdfRendition.content_hash == content_hash,
+                PdfRendition.folder_path == folder_path,
+            )
+        ).first()
+        return rendition is not None
+
+    def record_rendition(
+        self, session: Session, content_hash: str, profile: RenderProfile, page_count: int
+    ) -> None:
+        """Record that every page of a blob has been written with `profile`. Commits."""
+        session.execute(
+            insert(PdfRendition)
+            .values(
+                content_hash=content_hash,
+                profile_key=profile_key(profile),
+                folder_path=str(self.rendition_folder(content_hash, profile)),
+                page_count=page_count,
+            )
+            .on_conflict_do_nothing()
+        )
+        session.commit()
+
+    async def render_pages(
+        self, session: AsyncSession, blob: PdfBlob, profile: RenderProfile
+    ) -> list[RenderedPage]:
+        """
+        Return the pages of a blob rendered with `profile`. Pages rendered by an
+        earlier upload are reused from disk (their `data` is None); otherwise the
+        PDF is rendered now and the in-memory bytes are returned as well, while a
+        background task writes them to disk and then records the rendition, so
+        the caller can commit without waiting for the disk. Anything that reads
+        the page files later checks `pages_written` first.
+        """
+        rendition = await session.get(
+            PdfRendition, (blob.content_hash, profile_key(profile))
+        )
+        pages = await self._rendition_pages(blob, profile, rendition)
+        if pages is not None:
+            return pages
+
+        folder = self.rendition_folder(blob.content_hash, profile)
+        folder.mkdir(parents=True, exist_ok=True)
+        pages = await render_service.render_pdf(Path(blob.filepath), folder, profile)
+        key = (blob.content_hash, profile_key(profile))
+        task = asyncio.create_task(self._archive(blob.content_hash, profile, pages))
+        self._archiving[key] = task
+        task.add_done_callback(partial(self._archive_done, key))
+        return pages
+
+    async def _archive(
+        self, content_hash: str, profile: RenderProfile, pages: list[RenderedPage]
+    ) -> None:
+        await archive_pages(pages)
+        # Only now can later uploads reuse the pages from disk
+        await asyncio.to_thread(self._record_archived, content_hash, profile, len(pages))
+
+    def _record_archived(self, content_hash: str, profile: RenderProfile, page_count: int) -> None:
+        with Session(worker_engine) as session:
+            self.record_rendition(session, content_hash, profile, page_count)
+
+    def _archive_done(self, key: tuple[str, str], task: asyncio.Task[None]) -> None:
+        if self._archiving.get(key) is task:
+            del self._archiving[key]
+        if not task.cancelled() and task.exception() is not None:
+            # The rendition stays unrecorded, so the next upload renders it again
+            logger.error(f"Writing the pages of PDF {key[0]} ({key[1]}) failed: {task.exception()}")
+
+
+blob_store = BlobStore(root=Path("uploads") / "blobs")
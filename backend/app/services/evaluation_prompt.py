@@ -0,0 +1,196 @@
+# app/services/evaluation_prompt.py
+
+import hashlib
+import json
+from collections.abc import Collection, Iterator
+from dataclasses import dataclass
+from typing import Any
+
+# Bump when the wording or the question paper encoding changes, so that cached
+# LLM responses and context caches built from older prompts are not reused
+EVALUATION_PROMPT_VERSION = "2"
+
+_TASK = (
+    "You are an intelligent exam evaluator. You will be provided with a student's answer sheet page and the structured question data from the question paper. "
+    "Your task is to: "
+    "1. Identify the main section number (e.g., Q1, Q2) from the page. "
+    "2. Identify each sub-question number (e.g., 1, 2, 3) within that section. "
+    "3. Combine them to form a complete question number in the format 'section.sub_question' (e.g., '1.1', '2.3'). "
+    "4. Evaluate the student's handwritten answer for each question found on the page. "
+)
+
+_RESULT_SCHEMA = (
+    "{"
+    '"question_no": "string" (e.g., \'1.1\', \'2.3\'),'
+    '"obtained_marks": "number",'
+    '"max_marks": "number",'
+    '"feedback": "string"'
+    "}"
+)
+
+_PAGE_INSTRUCTIONS = (
+    "5. Return a JSON object with a list of evaluation results, one for each question found."
+    f"\n\nJSON Schema:\n[{_RESULT_SCHEMA}]"
+    "Do not include any extra text."
+)
+
+_BATCH_INSTRUCTIONS = (
+    "You will be given several consecutive pages of the same answer sheet, each preceded by a label 'Page N:'. "
+    "An answer may continue from one page onto the next; grade it once, on the page where it starts, using everything the student wrote for it. "
+    "5. Return a JSON list with one entry per page, in order, including pages with no answers (empty results)."
+    "\n\nJSON Schema:\n["
+    '{"page_index": "number" (the N of the \'Page N:\' label),'
+    f'"results": [{_RESULT_SCHEMA}]'
+    "}]"
+    "Do not include any extra text."
+)
+
+_QUESTION_COLUMNS = ("question_no", "max_marks", "type", "question", "options", "correct_answer")
+
+
+@dataclass(frozen=True)
+class EvaluationPrompt:
+    """
+    Page evaluation prompt compiled once per collection run. `prefix` (the
+    instructions and the question paper) is identical for every call and can be
+    registered as cached content; `suffix` is sent right before the page images.
+    """
+
+    prefix: str
+    suffix: str
+    batch: bool
+    fingerprint: str
+
+    @property
+    def text(self) -> str:
+        return self.prefix + self.suffix
+
+
+def _cell(value: Any) -> str:
+    """Render a value as a single table cell."""
+    if value is None:
+        return ""
+    if isinstance(value, list):
+        value = "; ".join(_cell(item) for item in value)
+    return " ".join(str(value).split()).replace("|", "/")
+
+
+def _is_structured(qp_data: Any) -> bool:
+    """True if `qp_data` follows the question paper parse schema."""
+    sections = qp_data.get("sections") if isinstance(qp_data, dict) else None
+    return isinstance(sections, list) and all(
+        isinstance(section, dict) and isinstance(section.get("questions", []), list)
+        for section in sections
+    )
+
+
+def _iter_questions(
+    section_no: int, section: dict[str, Any]
+) -> Iterator[tuple[str, dict[str, Any]]]:
+    """Yield ('section.question', question) for the questions of a section."""
+    for question_no, question in enumerate(section.get("questions", []), start=1):
+        if isinstance(question, dict):
+            number = question.get("question_number") or question_no
+            yield f"{section_no}.{_cell(number)}", question
+
+
+def question_ids(qp_data: Any) -> list[str]:
+    """The 'section.question' ids of a question paper, in paper order."""
+    if not _is_structured(qp_data):
+        return []
+    return [
+        question_id
+        for section_no, section in enumerate(qp_data["sections"], start=1)
+        for question_id, _ in _iter_questions(section_no, section)
+    ]
+
+
+def question_sections(
+    qp_data: Any,
+) -> list[tuple[dict[str, Any], list[tuple[str, dict[str, Any]]]]]:
+    """Each section of a question paper with its ('section.question', question) pairs."""
+    if not _is_structured(qp_data):
+        return []
+    return [
+        (section, list(_iter_questions(section_no, section)))
+        for section_no, section in enumerate(qp_data["sections"], start=1)
+    ]
+
+
+def question_outline(qp_data: Any, text_chars: int = 80) -> str:
+    """One line per question with its id and the start of its text."""
+    if not _is_structured(qp_data):
+        return ""
+    lines = []
+    for section_no, section in enumerate(qp_data["sections"], start=1):
+        lines.append(f"Section {section_no}: {_cell(section.get('section_name'))}")
+        for question_id, question in _iter_questions(section_no, section):
+            lines.append(f"{question_id}: {_cell(question.get('question_text'))[:text_chars]}")
+    return "\n".join(lines)
+
+
+def encode_question_paper(qp_data: Any, only: Collection[str] | None = None) -> str:
+    """
+    Encode parsed question paper data as a compact pipe-separated table with one
+    row per question, numbered 'section.question' like the expected results.
+    `only` restricts the table to the given question ids (sections without any
+    of them are left out, but keep their numbering).
+    Data that does not follow the parse schema falls back to minified JSON.
+    """
+    if not _is_structured(qp_data):
+        return json.dumps(qp_data, separators=(",", ":"), ensure_ascii=False)
+
+    lines = []
+    exam = qp_data.get("exam_details")
+    if isinstance(exam, dict):
+        lines.append(
+            "Exam: "
+            + " | ".join(
+                f"{key}={_cell(exam[key])}" for key in exam if exam[key] not in (None, "")
+            )
+        )
+    for section_no, section in enumerate(qp_data["sections"], start=1):
+        rows = [
+            " | ".join(
+                [
+                    question_id,
+                    _cell(question.get("max_marks")),
+                    _cell(question.get("question_type")),
+                    _cell(question.get("question_text")),
+                    _cell(question.get("options")),
+                    _cell(question.get("correct_answer")),
+                ]
+            )
+            for question_id, question in _iter_questions(section_no, section)
+            if only is None or question_id in only
+        ]
+        if only is not None and not rows:
+            continue
+        lines.append(f"Section {section_no}: {_cell(section.get('section_name'))}")
+        if section.get("instructions"):
+            lines.append(f"Instructions: {_cell(section['instructions'])}")
+        lines.append(" | ".join(_QUESTION_COLUMNS))
+        lines.extend(rows)
+    return "\n".join(lines)
+
+
+def compile_evaluation_prompt(
+    qp_data: Any, batch: bool, only: Collection[str] | None = None
+) -> EvaluationPrompt:
+    """
+    Build the evaluation prompt for a question paper, either for one page per
+    call or for batches of labelled pages. `only` limits the question paper to
+    the given question ids, e.g. the ones routing found on the pages.
+    """
+    prefix = (
+        _TASK
+        + (_BATCH_INSTRUCTIONS if batch else _PAGE_INSTRUCTIONS)
+        + f"\n\nQuestion Paper Data:\n{encode_question_paper(qp_data, only)}"
+    )
+    suffix = (
+        "\n\nStudent Answer Sheet Pages:" if batch else "\n\nStudent Answer Sheet Page Image:"
+    )
+    fingerprint = hashlib.sha256(
+        f"{EVALUATION_PROMPT_VERSION}\n{prefix}{suffix}".encode()
+    ).hexdigest()
+    return EvaluationPrompt(prefix=prefix, suffix=suffix, batch=batch, fingerprint=fingerprint)
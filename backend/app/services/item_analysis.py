@@ -0,0 +1,226 @@
+# app/services/item_analysis.py
+
+import uuid
+from collections import OrderedDict
+from collections.abc import Sequence
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any
+
+import numpy as np
+from sqlmodel import Session, func, select
+
+from app.core.config import settings
+from app.models import (
+    AnswerSheetResult,
+    ItemAnalysisPublic,
+    QuestionAnalysisPublic,
+    QuestionResult,
+    ScoreHistogramPublic,
+)
+from app.services.results_summary import question_no_key
+
+
+@dataclass
+class ResultsMatrix:
+    """Marks of a collection as students × questions, NaN where a question was not answered."""
+
+    question_nos: list[str]
+    marks: np.ndarray
+    max_marks: np.ndarray
+
+    @classmethod
+    def from_rows(cls, rows: Sequence[tuple[Any, str, int, int]]) -> "ResultsMatrix":
+        """From (ans_pdf_id, question_no, obtained_marks, max_marks) rows."""
+        if not rows:
+            return cls([], np.empty((0, 0)), np.empty(0))
+        ans_pdf_ids, question_nos, obtained, max_marks = zip(*rows, strict=True)
+        _, students = np.unique(np.asarray(ans_pdf_ids, dtype=str), return_inverse=True)
+        names, questions = np.unique(np.asarray(question_nos, dtype=str), return_inverse=True)
+
+        # Columns in question paper order
+        order = sorted(range(len(names)), key=lambda i: question_no_key(str(names[i])))
+        rank = np.empty(len(names), dtype=np.intp)
+        rank[order] = np.arange(len(names))
+        questions = rank[questions]
+
+        marks = np.full((students.max() + 1, len(names)), np.nan)
+        marks[students, questions] = obtained
+        question_max = np.zeros(len(names))
+        np.maximum.at(question_max, questions, np.asarray(max_marks, dtype=float))
+        return cls([str(names[i]) for i in order], marks, question_max)
+
+
+def _column_means(marks: np.ndarray, answered: np.ndarray) -> np.ndarray:
+    counts = answered.sum(axis=0)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        means: np.ndarray = np.where(answered, marks, 0.0).sum(axis=0) / counts
+    return means
+
+
+def _number(value: Any) -> float | None:
+    """JSON-safe statistic: None for NaN and infinities."""
+    value = float(value)
+    return round(value, 4) if np.isfinite(value) else None
+
+
+def cronbach_alpha(marks: np.ndarray) -> float:
+    """
+    Cronbach's alpha from the item covariance matrix. Each covariance is taken
+    over the students who answered both questions, so optional questions do not
+    drop students from the whole calculation. NaN when undefined.
+    """
+    items = marks.shape[1]
+    answered = ~np.isnan(marks)
+    if items < 2:
+        return np.nan
+    x = np.where(answered, marks, 0.0)
+    both = answered.astype(float)
+    pairs = both.T @ both
+    # [i, j]: sum of question i's marks over the students who answered j as well
+    sums = x.T @ both
+    with np.errstate(invalid="ignore", divide="ignore"):
+        covariance = (x.T @ x - sums * sums.T / pairs) / (pairs - 1)
+    covariance = np.where(pairs >= 2, covariance, np.nan)
+    total_variance = covariance.sum()
+    if not np.isfinite(total_variance) or total_variance <= 0:
+        return np.nan
+    return float(items / (items - 1) * (1 - np.trace(covariance) / total_variance))
+
+
+def analyse_results(
+    matrix: ResultsMatrix,
+    collection_id: uuid.UUID,
+    last_evaluated_at: datetime | None,
+    group_fraction: float,
+    histogram_bins: int,
+) -> ItemAnalysisPublic:
+    """
+    Per-question mean, standard deviation, facility and discrimination indexes
+    and mark histograms, the distribution of total scores and Cronbach's alpha,
+    each computed over the whole matrix at once.
+    """
+    marks, max_marks = matrix.marks, matrix.max_marks
+    answered = ~np.isnan(marks)
+    students, questions = marks.shape
+    attempts = answered.sum(axis=0)
+
+    mean = _column_means(marks, answered)
+    deviations = np.where(answered, marks - mean, 0.0)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        std = np.sqrt((deviations**2).sum(axis=0) / (attempts - 1))
+        facility = mean / max_marks
+    std[attempts < 2] = np.nan
+
+    # Mean of the top group minus the bottom group, ranked by total score
+    totals = np.where(answered, marks, 0.0).sum(axis=1)
+    discrimination = np.full(questions, np.nan)
+    if students >= 2:
+        group = min(max(1, round(students * group_fraction)), students // 2)
+        ranked = np.argsort(totals, kind="stable")
+        lower, upper = ranked[:group], ranked[-group:]
+        with np.errstate(invalid="ignore", divide="ignore"):
+            discrimination = (
+                _column_means(marks[upper], answered[upper])
+                - _column_means(marks[lower], answered[lower])
+            ) / max_marks
+
+    # Students per mark of every question, from one bincount over the matrix
+    width = int(max_marks.max()) + 1 if questions else 1
+    _, columns = np.nonzero(answered)
+    given = np.clip(marks[answered], 0, max_marks[columns]).astype(np.intp)
+    histograms = np.bincount(
+        columns * width + given, minlength=questions * width
+    ).reshape(questions, width)
+
+    paper_total = max(float(max_marks.sum()), float(totals.max()) if students else 0.0)
+    counts, edges = np.histogram(totals, bins=histogram_bins, range=(0.0, paper_total or 1.0))
+
+    return ItemAnalysisPublic(
+        collection_id=collection_id,
+        students=students,
+        mean_score=_number(totals.mean()) if students else None,
+        std_score=_number(totals.std(ddof=1)) if students >= 2 else None,
+        score_histogram=ScoreHistogramPublic(
+            edges=[round(float(edge), 4) for edge in edges],
+            counts=counts.tolist(),
+        ),
+        cronbach_alpha=_number(cronbach_alpha(marks)),
+        last_evaluated_at=last_evaluated_at,
+        questions=[
+            QuestionAnalysisPublic(
+                question_no=question_no,
+                attempts=int(attempts[i]),
+                max_marks=int(max_marks[i]),
+                mean=_number(mean[i]),
+                std=_number(std[i]),
+                facility=_number(facility[i]),
+                discrimination=_number(discrimination[i]),
+                histogram=histograms[i, : int(max_marks[i]) + 1].tolist(),
+            )
+            for i, question_no in enumerate(matrix.question_nos)
+        ],
+    )
+
+
+class ItemAnalysis:
+    """
+    Item analysis of a collection's results, read from the results summary
+    (QuestionResult) and cached per API process. A cached analysis is used
+    while the collection's last-evaluation timestamp and graded answer sheet
+    count are unchanged, so checking it costs one indexed aggregate over
+    AnswerSheetResult.
+    """
+
+    def __init__(self, cache_size: int, group_fraction: float, histogram_bins: int):
+        self.cache_size = cache_size
+        self.group_fraction = group_fraction
+        self.histogram_bins = histogram_bins
+        self._cache: OrderedDict[uuid.UUID, tuple[Any, ItemAnalysisPublic]] = OrderedDict()
+
+    def version(self, session: Session, collection_id: uuid.UUID) -> tuple[datetime | None, int]:
+        """When the collection's results were last updated, and how many sheets are graded."""
+        last_evaluated_at, sheets = session.exec(
+            select(func.max(AnswerSheetResult.updated_at), func.count()).where(
+                AnswerSheetResult.collection_id == collection_id
+            )
+        ).one()
+        return last_evaluated_at, sheets
+
+    def cached(self, collection_id: uuid.UUID, version: Any) -> ItemAnalysisPublic | None:
+        entry = self._cache.get(collection_id)
+        if entry is None or entry[0] != version:
+            return None
+        self._cache.move_to_end(collection_id)
+        return entry[1]
+
+    def store(self, collection_id: uuid.UUID, version: Any, analysis: ItemAnalysisPublic) -> None:
+        self._cache[collection_id] = (version, analysis)
+        self._cache.move_to_end(collection_id)
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+
+    def load(self, session: Session, collection_id: uuid.UUID) -> ResultsMatrix:
+        rows = session.exec(
+            select(
+                QuestionResult.ans_pdf_id,
+                QuestionResult.question_no,
+                QuestionResult.obtained_marks,
+                QuestionResult.max_marks,
+            ).where(QuestionResult.collection_id == collection_id)
+        ).all()
+        return ResultsMatrix.from_rows(rows)
+
+    def analyse(
+        self, matrix: ResultsMatrix, collection_id: uuid.UUID, last_evaluated_at: datetime | None
+    ) -> ItemAnalysisPublic:
+        return analyse_results(
+            matrix, collection_id, last_evaluated_at, self.group_fraction, self.histogram_bins
+        )
+
+
+item_analysis = ItemAnalysis(
+    settings.ITEM_ANALYSIS_CACHE_SIZE,
+    settings.ITEM_ANALYSIS_GROUP_FRACTION,
+    settings.ITEM_ANALYSIS_HISTOGRAM_BINS,
+)
@@ -0,0 +1,259 @@
+# app/services/job_queue.py
+
+import json
+import logging
+import uuid
+from collections.abc import Callable, Coroutine
+from datetime import datetime, timedelta, timezone
+from typing import Any
+
+from sqlalchemy.dialects.postgresql import insert
+from sqlmodel import Session, and_, col, func, or_, select, update
+
+from app.core.config import settings
+from app.models import Job
+
+logger = logging.getLogger(__name__)
+
+JOB_QUEUED = "queued"
+JOB_RUNNING = "running"
+JOB_SUCCEEDED = "succeeded"
+JOB_DEAD = "dead"
+JOB_STATUSES = (JOB_QUEUED, JOB_RUNNING, JOB_SUCCEEDED, JOB_DEAD)
+
+JobHandler = Callable[[dict[str, Any]], Coroutine[Any, Any, dict[str, Any] | None]]
+
+# Filled by the @job_handler decorators when the modules defining them are imported
+job_handlers: dict[str, JobHandler] = {}
+
+
+def job_handler(kind: str) -> Callable[[JobHandler], JobHandler]:
+    """
+    Register a coroutine as the handler for jobs of `kind`. It receives the job
+    payload and must raise to have the attempt retried. Whatever it returns is
+    stored as the job's result.
+    """
+
+    def register(handler: JobHandler) -> JobHandler:
+        job_handlers[kind] = handler
+        return handler
+
+    return register
+
+
+def retry_delay(attempts: int, base_seconds: float, max_seconds: float) -> float:
+    """Exponential backoff before the next attempt, after `attempts` attempts."""
+    return min(max_seconds, base_seconds * 2.0 ** max(0, attempts - 1))
+
+
+class JobQueue:
+    """
+    Durable job queue on top of the `job` table. Workers lease jobs with
+    SELECT ... FOR UPDATE SKIP LOCKED so that any number of them can poll the
+    same table, and keep the lease alive with heartbeats. A job whose lease runs
+    out (the worker crashed or was killed) is picked up again by another worker.
+    Apart from `enqueue`, every method commits its own work on the given session.
+    """
+
+    def __init__(
+        self,
+        lease_seconds: int,
+        max_attempts: int,
+        backoff_seconds: float,
+        backoff_max_seconds: float,
+    ):
+        self.lease = timedelta(seconds=lease_seconds)
+        self.max_attempts = max_attempts
+        self.backoff_seconds = backoff_seconds
+        self.backoff_max_seconds = backoff_max_seconds
+
+    def enqueue(
+        self,
+        session: Session,
+        kind: str,
+        payload: dict[str, Any],
+        dedupe_key: str | None = None,
+        delay_seconds: float = 0,
+    ) -> Job | None:
+        """
+        Add a job. With a `dedupe_key`, nothing is added while another job with
+        the same key is queued or running, and None is returned.
+        Unlike the other methods this does not commit, so that the job can be
+        created in the same transaction as the rows it belongs with.
+        """
+        now = datetime.now(timezone.utc)
+        job_id = session.exec(
+            insert(Job)  # type: ignore
+            .values(
+                id=uuid.uuid4(),
+                kind=kind,
+                payload=json.dumps(payload, default=str),
+                status=JOB_QUEUED,
+                dedupe_key=dedupe_key,
+                attempts=0,
+                max_attempts=self.max_attempts,
+                run_after=now + timedelta(seconds=delay_seconds),
+                created_at=now,
+            )
+            .on_conflict_do_nothing()
+            .returning(Job.id)
+        ).first()
+        if job_id is None:
+            logger.info(f"Job {kind} for {dedupe_key} is already queued or running")
+            return None
+        return session.get(Job, job_id[0])
+
+    def claim(self, session: Session, worker_id: str) -> Job | None:
+        """
+        Lease the next due job, or one whose previous lease expired. A job whose
+        last allowed attempt was lost with its worker is marked dead instead.
+        """
+        while True:
+            now = datetime.now(timezone.utc)
+            job = session.exec(
+                select(Job)
+                .where(
+                    or_(
+                        and_(Job.status == JOB_QUEUED, Job.run_after <= now),
+                        and_(Job.status == JOB_RUNNING, Job.locked_until < now),  # type: ignore
+                    )
+                )
+                .order_by(Job.run_after)  # type: ignore
+                .limit(1)
+                .with_for_update(skip_locked=True)
+            ).first()
+            if job is None:
+                session.commit()
+                return None
+
+            if job.status == JOB_RUNNING:
+                logger.warning(f"Lease of job {job.id} held by {job.locked_by} expired")
+                if job.attempts >= job.max_attempts:
+                    self._finish(job, JOB_DEAD, now, "Lease expired on the last attempt")
+                    session.add(job)
+                    session.commit()
+                    continue
+
+            job.status = JOB_RUNNING
+            job.attempts += 1
+            job.locked_by = worker_id
+            job.locked_until = now + self.lease
+            job.heartbeat_at = now
+            session.add(job)
+            session.commit()
+            session.refresh(job)
+            return job
+
+    def heartbeat(self, session: Session, job_id: uuid.UUID, worker_id: str) -> bool:
+        """Extend the lease on a job. False means the lease was lost."""
+        now = datetime.now(timezone.utc)
+        renewed = session.exec(
+            update(Job)  # type: ignore
+            .where(
+                col(Job.id) == job_id,
+                col(Job.locked_by) == worker_id,
+                col(Job.status) == JOB_RUNNING,
+            )
+            .values(locked_until=now + self.lease, heartbeat_at=now)
+            .returning(Job.id)
+        ).first()
+        session.commit()
+        return renewed is not None
+
+    def complete(
+        self,
+        session: Session,
+        job_id: uuid.UUID,
+        worker_id: str,
+        result: dict[str, Any] | None = None,
+    ) -> None:
+        job = self._leased(session, job_id, worker_id)
+        if job:
+            self._finish(job, JOB_SUCCEEDED, datetime.now(timezone.utc))
+            if result is not None:
+                job.result = json.dumps(result, default=str)
+            session.add(job)
+        session.commit()
+
+    def fail(
+        self, session: Session, job_id: uuid.UUID, worker_id: str, error: str
+    ) -> None:
+        """Schedule a retry with backoff, or mark the job dead if it is out of attempts."""
+        job = self._leased(session, job_id, worker_id)
+        if job:
+            now = datetime.now(timezone.utc)
+            if job.attempts >= job.max_attempts:
+                logger.error(f"Job {job.id} ({job.kind}) is dead after {job.attempts} attempts: {error}")
+                self._finish(job, JOB_DEAD, now, error)
+            else:
+                delay = retry_delay(
+                    job.attempts, self.backoff_seconds, self.backoff_max_seconds
+                )
+                logger.warning(f"Job {job.id} ({job.kind}) failed, retrying in {delay:.0f}s: {error}")
+                job.status = JOB_QUEUED
+                job.last_error = error
+                job.run_after = now + timedelta(seconds=delay)
+                job.locked_by = None
+                job.locked_until = None
+            session.add(job)
+        session.commit()
+
+    def release(self, session: Session, job_id: uuid.UUID, worker_id: str) -> None:
+        """
+        Give a job back without counting the attempt, e.g. when its worker shuts
+        down, so another worker can start it right away.
+        """
+        job = self._leased(session, job_id, worker_id)
+        if job:
+            job.status = JOB_QUEUED
+            job.attempts = max(0, job.attempts - 1)
+            job.run_after = datetime.now(timezone.utc)
+            job.locked_by = None
+            job.locked_until = None
+            session.add(job)
+        session.commit()
+
+    def retry(self, session: Session, job: Job) -> Job:
+        """Requeue a dead job with a fresh set of attempts."""
+        job.status = JOB_QUEUED
+        job.attempts = 0
+        job.run_after = datetime.now(timezone.utc)
+        job.finished_at = None
+        session.add(job)
+        session.commit()
+        session.refresh(job)
+        return job
+
+    def stats(self, session: Session) -> dict[str, int]:
+        counts = dict.fromkeys(JOB_STATUSES, 0)
+        for status, count in session.exec(
+            select(Job.status, func.count()).group_by(Job.status)
+        ).all():
+            counts[status] = count
+        return counts
+
+    def _leased(self, session: Session, job_id: uuid.UUID, worker_id: str) -> Job | None:
+        job = session.exec(
+            select(Job).where(Job.id == job_id).with_for_update()
+        ).first()
+        if not job or job.locked_by != worker_id or job.status != JOB_RUNNING:
+            logger.warning(f"Worker {worker_id} no longer holds the lease on job {job_id}")
+            return None
+        return job
+
+    @staticmethod
+    def _finish(job: Job, status: str, now: datetime, error: str | None = None) -> None:
+        job.status = status
+        job.finished_at = now
+        job.locked_by = None
+        job.locked_until = None
+        if error is not None:
+            job.last_error = error
+
+
+job_queue = JobQueue(
+    lease_seconds=settings.JOB_LEASE_SECONDS,
+    max_attempts=settings.JOB_MAX_ATTEMPTS,
+    backoff_seconds=settings.JOB_RETRY_BACKOFF_SECONDS,
+    backoff_max_seconds=settings.JOB_RETRY_BACKOFF_MAX_SECONDS,
+)
@@ -0,0 +1,152 @@
+# app/services/llm_cache.py
+
+import asyncio
+import hashlib
+import logging
+from datetime import datetime, timedelta, timezone
+from typing import Any, cast
+
+from sqlalchemy import CursorResult
+from sqlalchemy.dialects.postgresql import insert
+from sqlmodel import Session, col, delete, func, select, update
+
+from app.core.config import settings
+from app.core.db import worker_engine
+from app.models import LLMResponseCacheEntry
+
+logger = logging.getLogger(__name__)
+
+
+def response_cache_key(
+    images: list[bytes], prompt: str, model: str, temperature: float | None
+) -> str:
+    """
+    sha256 over the image hashes, the prompt hash, the model and the temperature.
+    """
+    digest = hashlib.sha256()
+    for image_data in images:
+        digest.update(hashlib.sha256(image_data).digest())
+    digest.update(hashlib.sha256(prompt.encode("utf-8")).digest())
+    digest.update(f"{model}|{temperature}".encode())
+    return digest.hexdigest()
+
+
+class LLMResponseCache:
+    """
+    Durable cache of LLM responses in Postgres. Entries expire after `ttl` and the
+    least recently used ones are evicted once there are more than `max_entries`.
+    Database work runs in a thread so callers on the event loop never block. LLM
+    calls only happen in background jobs, so it uses the worker's connection pool.
+    """
+
+    def __init__(self, ttl: timedelta, max_entries: int, evict_every: int = 500):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.evict_every = evict_every
+        self._hits = 0
+        self._misses = 0
+        self._writes = 0
+        self._evicted = 0
+
+    def _get(self, cache_key: str) -> str | None:
+        now = datetime.now(timezone.utc)
+        with Session(worker_engine) as session:
+            row = session.exec(
+                update(LLMResponseCacheEntry)  # type: ignore
+                .where(col(LLMResponseCacheEntry.cache_key) == cache_key)
+                .where(col(LLMResponseCacheEntry.last_accessed_at) > now - self.ttl)
+                .values(last_accessed_at=now, hits=LLMResponseCacheEntry.hits + 1)
+                .returning(LLMResponseCacheEntry.response)
+            ).first()
+            session.commit()
+        return row[0] if row else None
+
+    def _put(self, cache_key: str, model: str, response: str) -> None:
+        now = datetime.now(timezone.utc)
+        with Session(worker_engine) as session:
+            session.execute(
+                insert(LLMResponseCacheEntry)
+                .values(
+                    cache_key=cache_key,
+                    model=model,
+                    response=response,
+                    hits=0,
+                    created_at=now,
+                    last_accessed_at=now,
+                )
+                .on_conflict_do_update(
+                    index_elements=["cache_key"],
+                    set_={"response": response, "last_accessed_at": now},
+                )
+            )
+            session.commit()
+
+    def _evict(self) -> int:
+        """Drop expired entries, then the least recently used ones over the cap."""
+        with Session(worker_engine) as session:
+            expired = cast(
+                CursorResult[Any],
+                session.execute(
+                    delete(LLMResponseCacheEntry).where(
+                        col(LLMResponseCacheEntry.last_accessed_at)
+                        <= datetime.now(timezone.utc) - self.ttl
+                    )
+                ),
+            ).rowcount
+            count = session.exec(
+                select(func.count()).select_from(LLMResponseCacheEntry)
+            ).one()
+            overflow = 0
+            if count > self.max_entries:
+                oldest = (
+                    select(LLMResponseCacheEntry.cache_key)
+                    .order_by(LLMResponseCacheEntry.last_accessed_at)  # type: ignore
+                    .limit(count - self.max_entries)
+                )
+                overflow = cast(
+                    CursorResult[Any],
+                    session.execute(
+                        delete(LLMResponseCacheEntry).where(
+                            col(LLMResponseCacheEntry.cache_key).in_(oldest)
+                        )
+                    ),
+                ).rowcount
+            session.commit()
+        return expired + overflow
+
+    async def get(self, cache_key: str) -> str | None:
+        try:
+            response = await asyncio.to_thread(self._get, cache_key)
+        except Exception as e:
+            logger.warning(f"LLM response cache lookup failed: {e}")
+            response = None
+        if response is None:
+            self._misses += 1
+        else:
+            self._hits += 1
+        return response
+
+    async def put(self, cache_key: str, model: str, response: str) -> None:
+        try:
+            await asyncio.to_thread(self._put, cache_key, model, response)
+            self._writes += 1
+            if self._writes % self.evict_every == 0:
+                self._evicted += await asyncio.to_thread(self._evict)
+        except Exception as e:
+            logger.warning(f"LLM response cache write failed: {e}")
+
+    def stats(self) -> dict[str, Any]:
+        lookups = self._hits + self._misses
+        return {
+            "hits": self._hits,
+            "misses": self._misses,
+            "hit_ratio": self._hits / lookups if lookups else 0.0,
+            "writes": self._writes,
+            "evicted": self._evicted,
+        }
+
+
+llm_response_cache = LLMResponseCache(
+    ttl=timedelta(days=settings.LLM_CACHE_TTL_DAYS),
+    max_entries=settings.LLM_CACHE_MAX_ENTRIES,
+)
@@ -1,25 +1,114 @@
 # app/services/llm_service.py
 
+import asyncio
 import json
+import time
+from dataclasses import dataclass
 from typing import Dict, Any, List, Optional
 import logging
 from pathlib import Path
 import base64
 
+from google.ai import generativelanguage_v1beta as glm
+from google.api_core.client_options import ClientOptions
+from google.api_core.exceptions import DeadlineExceeded, NotFound, ResourceExhausted
+from google.protobuf import duration_pb2
 from langchain_google_genai import ChatGoogleGenerativeAI
-from langchain_core.messages import HumanMessage
+from langchain_core.messages import BaseMessage, HumanMessage
 from langchain.prompts import PromptTemplate
 
+from app.core.config import settings
+from app.services.llm_cache import llm_response_cache, response_cache_key
+from app.services.rate_limiter import AdaptiveRateLimiter
+
 logger = logging.getLogger(__name__)
 
+# One limiter for every LLMService in the process, so QP parsing and page
+# evaluation share the same request and token budget
+rate_limiter = AdaptiveRateLimiter(
+    requests_per_minute=settings.LLM_REQUESTS_PER_MINUTE,
+    tokens_per_minute=settings.LLM_TOKENS_PER_MINUTE,
+    initial_concurrency=settings.LLM_INITIAL_CONCURRENCY,
+    max_concurrency=settings.LLM_MAX_CONCURRENCY,
+)
+
+IMAGE_MIME_TYPES = {
+    ".png": "image/png",
+    ".jpg": "image/jpeg",
+    ".jpeg": "image/jpeg",
+}
+
+
+def image_mime_type(image_path: str) -> str:
+    """Return the MIME type for a rendered page image based on its extension."""
+    return IMAGE_MIME_TYPES.get(Path(image_path).suffix.lower(), "image/png")
+
+
+def estimate_tokens(prompt: str, image_count: int) -> int:
+    """Rough token count of a request, used to reserve tokens-per-minute budget."""
+    return (
+        len(prompt) // 4
+        + image_count * settings.LLM_TOKENS_PER_IMAGE
+        + settings.LLM_EXPECTED_OUTPUT_TOKENS
+    )
+
+
+def is_throttling_error(error: Exception) -> bool:
+    """True for 429/RESOURCE_EXHAUSTED responses and timeouts."""
+    if isinstance(error, (ResourceExhausted, DeadlineExceeded, asyncio.TimeoutError)):
+        return True
+    message = str(error)
+    return "429" in message or "RESOURCE_EXHAUSTED" in message
+
+
+def is_cache_miss_error(error: Exception) -> bool:
+    """True when a call names cached content that has expired or was deleted."""
+    if isinstance(error, NotFound):
+        return True
+    message = str(error).lower()
+    return "cachedcontent" in message and (
+        "not found" in message or "permission" in message or "expired" in message
+    )
+
+
+def image_content(image_data: bytes, mime_type: str) -> Dict[str, Any]:
+    """Build a multimodal message part from encoded image bytes."""
+    encoded_image = base64.b64encode(image_data).decode("ascii")
+    return {
+        "type": "image_url",
+        "image_url": {"url": f"data:{mime_type};base64,{encoded_image}"},
+    }
+
+
+@dataclass
+class CachedPrefix:
+    """A prompt prefix registered with Gemini context caching."""
+
+    name: str
+    fingerprint: str
+    expires_at: float
+    # Sent in full instead once the cached content is gone
+    text: str
+
+
 class LLMService:
     """Service for handling OCR and evaluation of exam answersheets using Gemini."""
 
     def __init__(self, api_key: str, model: str = "gemini-1.5-flash"):
+        self.api_key = api_key
+        self.model = model
+        self.temperature = 0.2
+        self._cached_prefixes: Dict[str, CachedPrefix] = {}
+        # One registration per prefix, however many pages ask for it at once
+        self._prefix_locks: dict[str, asyncio.Lock] = {}
+        # Created on first use, inside the event loop its gRPC channel belongs to
+        self._cache_client: glm.CacheServiceAsyncClient | None = None
         self.llm = ChatGoogleGenerativeAI(
             model=model,
             google_api_key=api_key,
-            temperature=0.2,  
+            temperature=self.temperature,
+            # Retries are handled in `_invoke` so that the rate limiter sees every 429
+            max_retries=0,
         )
 
         # The prompt is now a simple template for the LLM's instructions.
@@ -31,38 +120,169 @@ class LLMService:
             "2. A short feedback (2-3 sentences).\n"
         )
     
+    async def _invoke(
+        self,
+        messages: List[BaseMessage],
+        estimated_tokens: int,
+        cached_content: Optional[str] = None,
+    ) -> Any:
+        """
+        Call the model through the shared rate limiter, retrying throttled and
+        timed-out calls with exponential backoff.
+        """
+        kwargs: dict[str, Any] = {"cached_content": cached_content} if cached_content else {}
+        for attempt in range(settings.LLM_MAX_RETRIES + 1):
+            await rate_limiter.acquire(estimated_tokens)
+            try:
+                response = await asyncio.wait_for(
+                    self.llm.ainvoke(messages, **kwargs),
+                    timeout=settings.LLM_REQUEST_TIMEOUT_SECONDS,
+                )
+            except Exception as e:
+                throttled = is_throttling_error(e)
+                await rate_limiter.release(
+                    estimated_tokens, throttled=throttled, failed=not throttled
+                )
+                if not throttled or attempt == settings.LLM_MAX_RETRIES:
+                    raise
+                delay = settings.LLM_RETRY_BACKOFF_SECONDS * 2**attempt
+                logger.warning(
+                    f"LLM call throttled ({e}), retrying in {delay:.1f}s "
+                    f"(attempt {attempt + 1}/{settings.LLM_MAX_RETRIES})"
+                )
+                await asyncio.sleep(delay)
+                continue
+
+            usage = getattr(response, "usage_metadata", None) or {}
+            await rate_limiter.release(
+                estimated_tokens, used_tokens=usage.get("total_tokens")
+            )
+            return response
+
+    async def _invoke_uncached(
+        self,
+        message_content: list[Any],
+        prompt: str,
+        image_count: int,
+        cached_prefix: CachedPrefix,
+        error: Exception,
+    ) -> Any:
+        """
+        Retry a call whose cached prefix expired or was deleted, sending the
+        prefix in full. The stale entry is dropped so the next `cache_prefix`
+        call registers it again.
+        """
+        logger.warning(f"Cached prompt prefix {cached_prefix.name} is gone: {error}")
+        if self._cached_prefixes.get(cached_prefix.fingerprint) == cached_prefix:
+            del self._cached_prefixes[cached_prefix.fingerprint]
+        full_prompt = cached_prefix.text + prompt
+        content = [{"type": "text", "text": full_prompt}, *message_content[1:]]
+        return await self._invoke(
+            [HumanMessage(content=content)],
+            estimate_tokens(full_prompt, image_count),
+        )
+
+    async def cache_prefix(self, text: str, fingerprint: str) -> Optional[CachedPrefix]:
+        """
+        Register a prompt prefix as Gemini cached content so that later calls only
+        send what follows it. Prefixes are reused while at least half of their TTL
+        is left. Returns None if the prefix could not be cached; callers then send
+        the full prompt.
+        """
+        ttl = settings.LLM_CONTEXT_CACHE_TTL_SECONDS
+        lock = self._prefix_locks.setdefault(fingerprint, asyncio.Lock())
+        async with lock:
+            cached = self._cached_prefixes.get(fingerprint)
+            if cached and cached.expires_at - time.monotonic() > ttl / 2:
+                return cached
+
+            try:
+                if self._cache_client is None:
+                    self._cache_client = glm.CacheServiceAsyncClient(
+                        client_options=ClientOptions(api_key=self.api_key)
+                    )
+                cached_content = await self._cache_client.create_cached_content(
+                    cached_content=glm.CachedContent(
+                        model=f"models/{self.model}",
+                        display_name=f"evaluation-{fingerprint[:16]}",
+                        contents=[glm.Content(role="user", parts=[glm.Part(text=text)])],
+                        ttl=duration_pb2.Duration(seconds=ttl),
+                    )
+                )
+            except Exception as e:
+                logger.warning(f"Context caching unavailable, sending full prompts: {e}")
+                return None
+
+            cached = CachedPrefix(
+                name=cached_content.name,
+                fingerprint=fingerprint,
+                expires_at=time.monotonic() + ttl,
+                text=text,
+            )
+            self._cached_prefixes[fingerprint] = cached
+            logger.info(f"Registered cached prompt prefix {cached.name}")
+            return cached
+
+    async def _cached_response(
+        self, images: List[bytes], prompt: str, refresh: bool = False
+    ) -> tuple[str | None, str | None]:
+        """
+        Look up a previous response for exactly these images and prompt.
+        Returns (cache_key, response); both are None when caching is disabled.
+        With `refresh` the lookup is skipped, so the new response replaces the
+        cached one.
+        """
+        if not settings.LLM_CACHE_ENABLED:
+            return None, None
+        cache_key = response_cache_key(images, prompt, self.model, self.temperature)
+        if refresh:
+            return cache_key, None
+        return cache_key, await llm_response_cache.get(cache_key)
+
+    async def cache_response(self, cache_key: str | None, response: str) -> None:
+        """
+        Store a response returned by `process_images`/`process_image_data`, or
+        an evaluation returned by `evaluate_answer`, once the caller has parsed
+        and validated it. Responses are never cached before that, so an
+        unparseable or error response is asked for again next time.
+        """
+        if cache_key:
+            await llm_response_cache.put(cache_key, self.model, response)
+
     async def evaluate_answer(
         self, image_path: str, max_marks: int
     ) -> Dict[str, Any]:
         """
         Evaluate an answer directly from an image using the LLM.
+        The result carries the `cache_key` to pass to `cache_response` once the
+        evaluation has been checked; it is None for a cached evaluation.
         """
         try:
             path = Path(image_path)
             if not path.exists():
                 raise FileNotFoundError(f"Image not found: {image_path}")
-            
-            # Read image as bytes and encode to base64
-            with open(image_path, "rb") as f:
-                image_bytes = f.read()
-            encoded_image = base64.b64encode(image_bytes).decode("utf-8")
+
+            image_bytes = await asyncio.to_thread(path.read_bytes)
             
             # The prompt now includes both the evaluation instructions and the image
+            prompt = self.evaluation_prompt.format(max_marks=max_marks)
             message = HumanMessage(
                 content=[
                     {
                         "type": "text",
-                        "text": self.evaluation_prompt.format(max_marks=max_marks),
-                    },
-                    {
-                        "type": "image_url",
-                        "image_url": {"url": f"data:image/png;base64,{encoded_image}"},
+                        "text": prompt,
                     },
+                    image_content(image_bytes, image_mime_type(image_path)),
                 ]
             )
 
-            response = await self.llm.ainvoke([message])
-            return {"evaluation": response.content.strip()} # type: ignore
+            cache_key, cached = await self._cached_response([image_bytes], prompt)
+            if cached is not None:
+                return {"evaluation": cached, "cache_key": None}
+
+            response = await self._invoke([message], estimate_tokens(prompt, 1))
+            evaluation = response.content.strip()
+            return {"evaluation": evaluation, "cache_key": cache_key}
 
         except Exception as e:
             logger.error(f"Evaluation failed for image {image_path}: {e}")
@@ -81,50 +301,106 @@ class LLMService:
             eval_result = await self.evaluate_answer(
                 image_path=img_path, max_marks=max_marks
             )
+            # An empty evaluation is asked for again next time
+            if eval_result.get("evaluation"):
+                await self.cache_response(eval_result["cache_key"], eval_result["evaluation"])
             results.append(eval_result)
         return results
     
-    async def process_images(self, image_paths: List[str], prompt: str) -> str:
+    async def load_images(self, image_paths: List[str]) -> List[tuple[bytes, str]]:
+        """
+        Read page images from disk in a worker thread, skipping missing files.
+        Returns (image_bytes, mime_type) pairs in the order given.
+        """
+        images = []
+        for image_path in image_paths:
+            path = Path(image_path)
+            if not path.exists():
+                logger.warning(f"Image not found, skipping: {image_path}")
+                continue
+            image_bytes = await asyncio.to_thread(path.read_bytes)
+            images.append((image_bytes, image_mime_type(image_path)))
+        return images
+
+    async def process_images(
+        self,
+        image_paths: List[str],
+        prompt: str,
+        image_labels: Optional[List[str]] = None,
+        cached_prefix: Optional[CachedPrefix] = None,
+        refresh: bool = False,
+    ) -> tuple[str, str | None]:
         """
         Processes multiple images with a single prompt using Gemini's multimodal capabilities.
+        Returns the response and the key to pass to `cache_response` once the
+        response has been validated (None if it must not be cached).
         """
         try:
-            message_content = []
-            
-            # Add the text prompt first
-            message_content.append(
-                {
-                    "type": "text",
-                    "text": prompt,
-                }
-            )
+            images = await self.load_images(image_paths)
+        except Exception as e:
+            logger.error(f"Reading images for LLM failed: {e}")
+            return json.dumps({"error": str(e)}), None
+        if image_labels is not None and len(images) != len(image_paths):
+            # A skipped image would shift every label after it
+            return json.dumps({"error": "Some images could not be read."}), None
+        return await self.process_image_data(
+            images, prompt, image_labels, cached_prefix, refresh
+        )
 
-            # Read each image, encode it, and add it to the message content list
-            for image_path in image_paths:
-                path = Path(image_path)
-                if not path.exists():
-                    logger.warning(f"Image not found, skipping: {image_path}")
-                    continue
-
-                with open(image_path, "rb") as f:
-                    image_bytes = f.read()
-                encoded_image = base64.b64encode(image_bytes).decode("utf-8")
-                
-                message_content.append(
-                    {
-                        "type": "image_url",
-                        "image_url": {"url": f"data:image/png;base64,{encoded_image}"},
-                    }
-                )
+    async def process_image_data(
+        self,
+        images: List[tuple[bytes, str]],
+        prompt: str,
+        image_labels: Optional[List[str]] = None,
+        cached_prefix: Optional[CachedPrefix] = None,
+        refresh: bool = False,
+    ) -> tuple[str, str | None]:
+        """
+        Same as `process_images`, but takes already encoded (image_bytes, mime_type)
+        pairs, e.g. straight from the renderer, so no disk read is needed.
+        `image_labels`, if given, are sent as text right before each image.
+        With `cached_prefix`, `prompt` is only the part that follows the cached
+        prefix; if that cached content is gone, the prefix is sent in full
+        instead. With `refresh`, the model is asked again even if a response is
+        cached.
+        """
+        try:
+            if not images:
+                return json.dumps({"error": "No valid images found to process."}), None
 
-            if not message_content:
-                return json.dumps({"error": "No valid images found to process."})
+            labels = image_labels or []
+            key_text = [cached_prefix.fingerprint] if cached_prefix else []
+            cache_key, cached = await self._cached_response(
+                [image_data for image_data, _ in images],
+                "\n".join([*key_text, prompt, *labels]),
+                refresh,
+            )
+            if cached is not None:
+                return cached, None
+
+            # Add the text prompt first, then every image (after its label, if any)
+            message_content = [{"type": "text", "text": prompt}]
+            for i, (image_data, mime_type) in enumerate(images):
+                if i < len(labels):
+                    message_content.append({"type": "text", "text": labels[i]})
+                message_content.append(image_content(image_data, mime_type))
 
-            message = HumanMessage(content=message_content)
+            message = HumanMessage(content=message_content)  # type: ignore
 
-            response = await self.llm.ainvoke([message])
+            try:
+                response = await self._invoke(
+                    [message],
+                    estimate_tokens(prompt, len(images)),
+                    cached_content=cached_prefix.name if cached_prefix else None,
+                )
+            except Exception as e:
+                if cached_prefix is None or not is_cache_miss_error(e):
+                    raise
+                response = await self._invoke_uncached(
+                    message_content, prompt, len(images), cached_prefix, e
+                )
             
-            cleaned_response = response.content.strip() # type: ignore
+            cleaned_response = response.content.strip()
             if cleaned_response.startswith("```"):
                 cleaned_response = cleaned_response.strip("`")
                 # remove the first line (```json or ```)
@@ -132,8 +408,9 @@ class LLMService:
                 # remove the last line (closing ```)
                 if cleaned_response.strip().endswith("```"):
                     cleaned_response = "\n".join(cleaned_response.split("\n")[:-1])
-            return cleaned_response.strip() # type: ignore
+            cleaned_response = cleaned_response.strip()
+            return cleaned_response, cache_key
 
         except Exception as e:
             logger.error(f"Processing images with LLM failed: {e}")
-            return json.dumps({"error": str(e)})
\ No newline at end of file
+            return json.dumps({"error": str(e)}), None
@@ -0,0 +1,349 @@
+# app/services/omr.py
+
+import logging
+import re
+from dataclasses import dataclass, field
+from typing import Any
+
+import fitz
+import numpy as np
+
+from app.core.config import settings
+from app.services.evaluation_prompt import question_sections
+
+logger = logging.getLogger(__name__)
+
+# "a. mass", "(b) force", "3) none of these"
+_OPTION_LABEL = re.compile(r"^\s*\(?([a-z]|\d{1,2})\s*[.):]\s*", re.IGNORECASE)
+
+# A bubble is roughly as wide as it is tall; wider or narrower ink is text
+_BUBBLE_ASPECT = (0.6, 1.6)
+_MIN_BUBBLE_PX = 6
+# Bubble centres within this fraction of a bubble of a grid column belong to it
+_COLUMN_TOLERANCE = 0.35
+# A row whose least-inked option is this full has every option shaded
+_FULL_ROW_FILL = 0.6
+
+BLANK = -1
+
+
+@dataclass(frozen=True)
+class McqQuestion:
+    question_id: str
+    labels: list[str]
+    correct: int | None  # index of the correct option, None if it cannot be told
+    max_marks: float
+
+
+@dataclass
+class GridPage:
+    """Questions read off one response grid page."""
+
+    question_ids: list[str] = field(default_factory=list)
+    # Evaluation items of the questions graded locally
+    results: list[dict[str, Any]] = field(default_factory=list)
+    # Questions whose marks could not be read with confidence
+    ambiguous: list[str] = field(default_factory=list)
+
+
+def _option_labels(options: list[Any]) -> tuple[list[str], list[str]]:
+    """The label and the text of each option, labelled a, b, c... when unnumbered."""
+    labels, texts = [], []
+    for position, option in enumerate(options):
+        option = str(option)
+        match = _OPTION_LABEL.match(option)
+        if match:
+            labels.append(match.group(1).lower())
+            texts.append(option[match.end():].strip().lower())
+        else:
+            labels.append(chr(ord("a") + position))
+            texts.append(option.strip().lower())
+    return labels, texts
+
+
+def _correct_option(correct_answer: Any, labels: list[str], texts: list[str]) -> int | None:
+    answer = " ".join(str(correct_answer or "").split()).lower()
+    if not answer:
+        return None
+    match = _OPTION_LABEL.match(answer)
+    for label in (match.group(1) if match else None, answer.strip("() .")):
+        if label in labels:
+            return labels.index(label)
+    if answer in texts:
+        return texts.index(answer)
+    return None
+
+
+def _marks(value: Any) -> float:
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return 1.0
+
+
+def mcq_questions(qp_data: Any) -> list[McqQuestion]:
+    """Multiple choice questions of a question paper in paper order, i.e. response grid order."""
+    mcqs = []
+    for _, questions in question_sections(qp_data):
+        for question_id, question in questions:
+            options = question.get("options")
+            if not isinstance(options, list) or len(options) < 2:
+                continue
+            labels, texts = _option_labels(options)
+            mcqs.append(
+                McqQuestion(
+                    question_id=question_id,
+                    labels=labels,
+                    correct=_correct_option(question.get("correct_answer"), labels, texts),
+                    max_marks=_marks(question.get("max_marks")),
+                )
+            )
+    return mcqs
+
+
+def load_ink(image_path: str, ink_threshold: float) -> np.ndarray:
+    """Dark pixels of a page image, as a boolean height x width array."""
+    pixmap = fitz.Pixmap(image_path)
+    if pixmap.alpha:
+        pixmap = fitz.Pixmap(pixmap, 0)
+    if pixmap.n != 1:
+        pixmap = fitz.Pixmap(fitz.csGRAY, pixmap)
+    gray = np.frombuffer(pixmap.samples, dtype=np.uint8).reshape(pixmap.height, pixmap.width)
+    return gray < ink_threshold * 255
+
+
+def _runs(mask: np.ndarray) -> np.ndarray:
+    """[start, end) of every run of True in a 1-D mask."""
+    edges = np.flatnonzero(np.diff(np.concatenate(([0], mask.astype(np.int8), [0]))))
+    return edges.reshape(-1, 2)
+
+
+def _merge_runs(runs: np.ndarray, max_gap: int) -> np.ndarray:
+    """Join runs separated by at most `max_gap`, e.g. the strokes of one letter."""
+    if len(runs) < 2:
+        return runs
+    first = np.concatenate(([True], runs[1:, 0] - runs[:-1, 1] > max_gap))
+    starts = np.flatnonzero(first)
+    last = np.concatenate((starts[1:] - 1, [len(runs) - 1]))
+    return np.stack([runs[starts, 0], runs[last, 1]], axis=1)
+
+
+def _candidate_rows(ink: np.ndarray) -> list[tuple[int, int, np.ndarray]]:
+    """Horizontal bands of ink holding at least two bubble-like blobs, with their [x0, x1)."""
+    candidates = []
+    for y0, y1 in _runs(ink.sum(axis=1) >= 2):
+        height = y1 - y0
+        if height < _MIN_BUBBLE_PX:
+            continue
+        runs = _merge_runs(_runs(np.asarray(ink[y0:y1].any(axis=0))), height // 4)
+        widths = runs[:, 1] - runs[:, 0]
+        bubbles = runs[(widths >= _BUBBLE_ASPECT[0] * height) & (widths <= _BUBBLE_ASPECT[1] * height)]
+        if len(bubbles) >= 2:
+            candidates.append((int(y0), int(y1), bubbles))
+    return candidates
+
+
+def _grid_columns(rows: list[tuple[int, int, np.ndarray]], min_rows: int) -> np.ndarray | None:
+    """
+    Option column centres, from the rows with the most common number of bubbles.
+    Columns must be evenly spaced, which drops question numbers printed left of
+    the bubbles.
+    """
+    counts = np.array([len(bubbles) for _, _, bubbles in rows])
+    modal = int(np.bincount(counts).argmax())
+    full_rows = [bubbles.mean(axis=1) for (_, _, bubbles), count in zip(rows, counts, strict=True) if count == modal]
+    if len(full_rows) < min_rows:
+        return None
+    columns = np.median(np.stack(full_rows), axis=0)
+    gaps = np.diff(columns)
+    first = len(columns) - 1
+    while first > 0 and abs(gaps[first - 1] - gaps[-1]) <= 0.2 * gaps[-1]:
+        first -= 1
+    return columns[first:] if len(columns) - first >= 2 else None
+
+
+def read_response_grid(ink: np.ndarray, min_rows: int) -> np.ndarray | None:
+    """
+    Find a response grid on a page: evenly spaced rows of equally sized bubbles,
+    one row per question, whose options line up in columns. Returns how strongly
+    every option cell is marked as a rows x columns array, top row first, or None
+    if the page holds no such grid. A cell's mark is the ink density of its
+    bubble plus that of the margin around it, so filled bubbles and options
+    circled by hand both stand out from unmarked ones.
+    """
+    candidates = _candidate_rows(ink)
+    if len(candidates) < min_rows:
+        return None
+    heights = np.array([y1 - y0 for y0, y1, _ in candidates])
+    size = float(np.median(heights))
+    candidates = [row for row, height in zip(candidates, heights, strict=True) if abs(height - size) <= 0.3 * size]
+    if len(candidates) < min_rows:
+        return None
+    columns = _grid_columns(candidates, min_rows)
+    if columns is None:
+        return None
+
+    centres = []
+    for y0, y1, bubbles in candidates:
+        distance = np.abs(bubbles.mean(axis=1)[:, None] - columns[None, :]).min(axis=1)
+        matched = int((distance <= _COLUMN_TOLERANCE * size).sum())
+        if matched >= 2 and matched * 2 >= len(bubbles):
+            centres.append((y0 + y1) / 2)
+    if len(centres) < min_rows:
+        return None
+
+    height, width = ink.shape
+    grid_x0 = int(max(columns[0] - size, 0))
+    grid_x1 = int(min(columns[-1] + size, width))
+
+    def band_ink(centre: float) -> float:
+        y0, y1 = int(max(centre - size / 2, 0)), int(min(centre + size / 2, height))
+        return float(ink[y0:y1, grid_x0:grid_x1].mean()) if y1 > y0 else 0.0
+
+    # Rows whose marks overflowed them (a large circle, a smudge) are missing
+    # from the candidates; put them back where the row pitch says they are,
+    # unless that gap is empty, like a spacer between blocks of rows
+    pitch = float(np.median(np.diff(centres))) if len(centres) > 1 else 2 * size
+    row_ink = float(np.median([band_ink(centre) for centre in centres]))
+    rows = [centres[0]]
+    for centre in centres[1:]:
+        steps = round((centre - rows[-1]) / pitch)
+        if steps >= 2 and abs(centre - rows[-1] - steps * pitch) <= 0.2 * pitch:
+            for _step in range(1, steps):
+                missing = rows[-1] + pitch
+                if band_ink(missing) < row_ink / 2:
+                    break
+                rows.append(missing)
+        rows.append(centre)
+    row_centres = np.array(rows)
+    column_pitch = float(np.diff(columns).min())
+
+    # Ink of every bubble and of every cell around it from a summed-area table
+    table = np.zeros((height + 1, width + 1))
+    table[1:, 1:] = ink.cumsum(axis=0).cumsum(axis=1)
+
+    def box_sums(half_height: float, half_width: float) -> tuple[np.ndarray, np.ndarray]:
+        y0 = np.clip(np.round(row_centres - half_height), 0, height).astype(np.intp)[:, None]
+        y1 = np.clip(np.round(row_centres + half_height), 0, height).astype(np.intp)[:, None]
+        x0 = np.clip(np.round(columns - half_width), 0, width).astype(np.intp)[None, :]
+        x1 = np.clip(np.round(columns + half_width), 0, width).astype(np.intp)[None, :]
+        sums = table[y1, x1] - table[y0, x1] - table[y1, x0] + table[y0, x0]
+        return sums, (y1 - y0) * (x1 - x0)
+
+    bubble_ink, bubble_area = box_sums(size / 2, size / 2)
+    cell_ink, cell_area = box_sums(min(pitch, 2 * size) / 2, min(column_pitch, 2 * size) / 2)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        margin = (cell_ink - bubble_ink) / (cell_area - bubble_area)
+    fills: np.ndarray = bubble_ink / np.maximum(bubble_area, 1) + np.nan_to_num(margin)
+    return fills
+
+
+def read_mark(fills: np.ndarray, mark_contrast: float) -> int | None:
+    """
+    The option marked in a row of cell fills, BLANK if none is, or None if the
+    row cannot be read with confidence: several or faint marks, or every option
+    shaded. Marks are judged against the least-inked option of the row.
+    """
+    contrast = fills - fills.min()
+    marked = np.flatnonzero(contrast >= mark_contrast)
+    faint = np.flatnonzero((contrast >= mark_contrast / 2) & (contrast < mark_contrast))
+    if len(faint):
+        return None
+    if len(marked) == 1:
+        return int(marked[0])
+    if not len(marked) and fills.min() < _FULL_ROW_FILL:
+        return BLANK
+    return None
+
+
+def _number(value: float) -> float | int:
+    return int(value) if float(value).is_integer() else value
+
+
+def grade_question(question: McqQuestion, fills: np.ndarray, mark_contrast: float) -> dict[str, Any] | None:
+    """Evaluation item of one grid row, or None if it is left to the LLM."""
+    if question.correct is None or len(question.labels) > len(fills):
+        return None
+    mark = read_mark(fills[: len(question.labels)], mark_contrast)
+    if mark is None:
+        return None
+    correct_label = question.labels[question.correct]
+    if mark == BLANK:
+        feedback = f"No option marked. The correct answer is {correct_label}."
+    elif mark == question.correct:
+        feedback = f"Marked {correct_label}, which is correct."
+    else:
+        feedback = f"Marked {question.labels[mark]}; the correct answer is {correct_label}."
+    return {
+        "question_no": question.question_id,
+        "obtained_marks": _number(question.max_marks) if mark == question.correct else 0,
+        "max_marks": _number(question.max_marks),
+        "feedback": feedback,
+    }
+
+
+class OmrGrader:
+    """
+    Grades the multiple choice questions of answer sheets answered on a standard
+    response grid: one row of option bubbles per question, in question paper
+    order, continuing across pages. Filled or circled options are read from the
+    page images and compared with the parsed correct answers, so only rows that
+    cannot be read with confidence go to the LLM. A sheet whose grid rows do not
+    add up to the paper's multiple choice questions is left to the LLM entirely,
+    rather than risk grading a row against the wrong question.
+    """
+
+    def __init__(self, ink_threshold: float, mark_contrast: float, min_grid_rows: int):
+        self.ink_threshold = ink_threshold
+        self.mark_contrast = mark_contrast
+        self.min_grid_rows = min_grid_rows
+
+    def read_page(self, image_path: str) -> np.ndarray | None:
+        try:
+            ink = load_ink(image_path, self.ink_threshold)
+        except Exception as e:
+            logger.warning(f"Could not read page image {image_path} for mark detection: {e}")
+            return None
+        return read_response_grid(ink, self.min_grid_rows)
+
+    def grade_answer_sheet(
+        self, image_paths: list[str], mcqs: list[McqQuestion]
+    ) -> list[GridPage | None] | None:
+        """
+        The grid page read from each page image (None for other pages), or None
+        if the sheet was not answered on a response grid for these questions.
+        CPU bound; run it in a thread.
+        """
+        grids = [self.read_page(image_path) for image_path in image_paths]
+        rows = sum(len(grid) for grid in grids if grid is not None)
+        if not rows:
+            return None
+        if rows != len(mcqs):
+            logger.info(
+                f"Found {rows} response grid rows for {len(mcqs)} multiple choice "
+                "questions; grading the answer sheet with the LLM"
+            )
+            return None
+
+        questions = iter(mcqs)
+        pages: list[GridPage | None] = []
+        for grid in grids:
+            if grid is None:
+                pages.append(None)
+                continue
+            page = GridPage()
+            for fills in grid:
+                question = next(questions)
+                page.question_ids.append(question.question_id)
+                result = grade_question(question, fills, self.mark_contrast)
+                if result is None:
+                    page.ambiguous.append(question.question_id)
+                else:
+                    page.results.append(result)
+            pages.append(page)
+        return pages
+
+
+omr_grader = OmrGrader(
+    settings.OMR_INK_THRESHOLD, settings.OMR_MARK_CONTRAST, settings.OMR_MIN_GRID_ROWS
+)
@@ -0,0 +1,61 @@
+# app/services/page_batching.py
+
+import logging
+import uuid
+from collections.abc import Sequence
+from typing import Any, TypeVar
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+def pages_per_batch(
+    prompt_tokens: int,
+    token_budget: int,
+    tokens_per_page: int,
+    max_pages: int,
+) -> int:
+    """
+    Number of answer pages that fit in one request: the shared prompt is paid once
+    and every page adds `tokens_per_page` (its image plus its share of the output).
+    Always at least 1 and at most `max_pages`.
+    """
+    available = token_budget - prompt_tokens
+    return max(1, min(max_pages, available // max(1, tokens_per_page)))
+
+
+def split_batches(items: Sequence[T], batch_size: int) -> list[list[T]]:
+    """Split `items` into consecutive batches of at most `batch_size`."""
+    batch_size = max(1, batch_size)
+    return [list(items[i : i + batch_size]) for i in range(0, len(items), batch_size)]
+
+
+def map_batch_results(
+    eval_data: Any, page_ids: Sequence[uuid.UUID]
+) -> dict[uuid.UUID, list[dict[str, Any]]]:
+    """
+    Map a batched response of the form
+        [{"page_index": 1, "results": [...]}, ...]
+    back to page ids, where page_index is 1-based in the order the pages were sent.
+    Pages the response does not mention are left out so the caller can treat them
+    as not evaluated. Raises ValueError if the response has the wrong shape.
+    """
+    if not isinstance(eval_data, list):
+        raise ValueError(f"Expected a list of page results, got {type(eval_data).__name__}")
+
+    results: dict[uuid.UUID, list[dict[str, Any]]] = {}
+    for entry in eval_data:
+        if not isinstance(entry, dict):
+            raise ValueError(f"Expected a page result object, got {entry!r}")
+        page_index = entry.get("page_index")
+        items = entry.get("results", [])
+        if not isinstance(page_index, int) or not 1 <= page_index <= len(page_ids):
+            logger.warning(f"Ignoring result for unknown page_index {page_index!r}")
+            continue
+        if not isinstance(items, list):
+            raise ValueError(f"Expected a list of results for page {page_index}")
+        results.setdefault(page_ids[page_index - 1], []).extend(
+            item for item in items if isinstance(item, dict)
+        )
+    return results
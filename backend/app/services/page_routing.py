@@ -0,0 +1,79 @@
+# app/services/page_routing.py
+
+import logging
+import uuid
+from collections.abc import Sequence
+from typing import Any
+
+from app.services.evaluation_prompt import question_outline
+
+logger = logging.getLogger(__name__)
+
+
+def build_routing_prompt(qp_data: Any) -> str:
+    """
+    Prompt for the cheap routing pass: given the pages of one answer sheet and an
+    outline of the question paper, list which questions each page answers.
+    """
+    return (
+        "You are given the pages of one student's answer sheet, each preceded by a label 'Page N:', "
+        "and the list of questions in the question paper. "
+        "For every page, list the ids of the questions the student answers on it, "
+        "including answers continued from a previous page. Do not grade anything."
+        "\n\nJSON Schema:\n["
+        '{"page_index": "number" (the N of the \'Page N:\' label),'
+        '"question_nos": ["string"] (ids from the list below, e.g. \'1.1\')}'
+        "]"
+        "Do not include any extra text."
+        f"\n\nQuestions:\n{question_outline(qp_data)}"
+        "\n\nStudent Answer Sheet Pages:"
+    )
+
+
+def parse_page_routes(
+    route_data: Any, page_ids: Sequence[uuid.UUID], known_question_ids: Sequence[str]
+) -> dict[uuid.UUID, list[str]]:
+    """
+    Map a routing response back to page ids, keeping only known question ids in
+    paper order. Pages without any recognised question are left out.
+    Raises ValueError if the response has the wrong shape.
+    """
+    if not isinstance(route_data, list):
+        raise ValueError(f"Expected a list of page routes, got {type(route_data).__name__}")
+
+    order = {question_id: i for i, question_id in enumerate(known_question_ids)}
+    routes: dict[uuid.UUID, list[str]] = {}
+    for entry in route_data:
+        if not isinstance(entry, dict):
+            raise ValueError(f"Expected a page route object, got {entry!r}")
+        page_index = entry.get("page_index")
+        if not isinstance(page_index, int) or not 1 <= page_index <= len(page_ids):
+            logger.warning(f"Ignoring route for unknown page_index {page_index!r}")
+            continue
+        question_nos = {
+            str(question_no).strip() for question_no in entry.get("question_nos") or []
+        }
+        tags = sorted(question_nos & order.keys(), key=order.__getitem__)
+        if tags:
+            routes[page_ids[page_index - 1]] = tags
+    return routes
+
+
+def fill_unrouted_pages(
+    page_ids: Sequence[uuid.UUID], routes: dict[uuid.UUID, list[str]]
+) -> dict[uuid.UUID, list[str] | None]:
+    """
+    Give every page a list of question ids. A page the router could not tag is
+    assumed to continue the last question of the page before it; pages with no
+    tagged page before them get None, meaning the whole question paper.
+    """
+    filled: dict[uuid.UUID, list[str] | None] = {}
+    previous: list[str] | None = None
+    for page_id in page_ids:
+        tags = routes.get(page_id)
+        if tags:
+            filled[page_id] = tags
+            previous = tags
+        else:
+            filled[page_id] = previous[-1:] if previous else None
+    return filled
@@ -0,0 +1,186 @@
+# app/services/pipeline.py
+
+import asyncio
+import logging
+import time
+from collections.abc import AsyncIterable, Awaitable, Callable
+from dataclasses import dataclass
+from typing import Any
+
+logger = logging.getLogger(__name__)
+
+Emit = Callable[[Any], Awaitable[None]]
+StageHandler = Callable[[Any, Emit], Awaitable[None]]
+StageFlush = Callable[[Emit], Awaitable[None]]
+
+# Put on a stage queue once per worker when the stage before it is done
+_END = object()
+
+
+@dataclass
+class Stage:
+    """
+    One step of a Pipeline. `handler(item, emit)` processes an item taken from
+    the stage queue and calls `emit` for every item it passes on, so a stage can
+    drop, split or group items. `flush(emit)`, if given, runs once the stage has
+    seen its last item, e.g. to pass on a partly filled group; a stage with a
+    flush should have a single worker.
+    """
+
+    name: str
+    handler: StageHandler
+    workers: int = 1
+    queue_size: int = 16
+    flush: StageFlush | None = None
+
+
+@dataclass
+class StageStats:
+    items_in: int = 0
+    items_out: int = 0
+    errors: int = 0
+    busy_seconds: float = 0.0
+    blocked_seconds: float = 0.0
+    max_queue_depth: int = 0
+    started_at: float | None = None
+    finished_at: float | None = None
+
+    def as_dict(self) -> dict[str, Any]:
+        elapsed = (
+            (self.finished_at or time.monotonic()) - self.started_at
+            if self.started_at is not None
+            else 0.0
+        )
+        return {
+            "items_in": self.items_in,
+            "items_out": self.items_out,
+            "errors": self.errors,
+            "busy_seconds": round(self.busy_seconds, 3),
+            # Time spent waiting for room in the next stage's queue
+            "blocked_seconds": round(self.blocked_seconds, 3),
+            "max_queue_depth": self.max_queue_depth,
+            "items_per_second": round(self.items_in / elapsed, 3) if elapsed else None,
+        }
+
+
+class Pipeline:
+    """
+    Runs items through a chain of stages connected by bounded queues. Every stage
+    has its own workers, so all stages work at the same time on different items.
+    When a stage falls behind its queue fills up and the stage before it waits
+    in `emit`, which in turn holds back the stage before that, down to the
+    source. An item whose handler raises is logged, counted and dropped.
+    The source is reported in the stats as `source_name`.
+    """
+
+    def __init__(self, stages: list[Stage], source_name: str = "source"):
+        if not stages:
+            raise ValueError("A pipeline needs at least one stage")
+        self.stages = stages
+        self.source_name = source_name
+        self._source_stats = StageStats()
+        self._stats = {stage.name: StageStats() for stage in stages}
+        self._queues: list[asyncio.Queue[Any]] = []
+        self._started_at: float | None = None
+        self._finished_at: float | None = None
+
+    async def run(self, source: AsyncIterable[Any]) -> None:
+        """Feed every item of `source` through the stages and wait until all are done."""
+        self._queues = [asyncio.Queue(maxsize=stage.queue_size) for stage in self.stages]
+        self._started_at = time.monotonic()
+        tasks = [
+            asyncio.create_task(self._run_stage(i), name=f"pipeline-{stage.name}")
+            for i, stage in enumerate(self.stages)
+        ]
+        source_stats = self._source_stats
+        source_stats.started_at = self._started_at
+        try:
+            async for item in source:
+                source_stats.items_in += 1
+                source_stats.items_out += 1
+                waited = time.monotonic()
+                await self._queues[0].put(item)
+                source_stats.blocked_seconds += time.monotonic() - waited
+            source_stats.finished_at = time.monotonic()
+            for _ in range(self.stages[0].workers):
+                await self._queues[0].put(_END)
+            await asyncio.gather(*tasks)
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            self._finished_at = time.monotonic()
+
+    def _emitter(self, index: int) -> Emit:
+        stats = self._stats[self.stages[index].name]
+        next_queue = self._queues[index + 1] if index + 1 < len(self.stages) else None
+
+        async def emit(item: Any) -> None:
+            stats.items_out += 1
+            if next_queue is None:
+                return
+            waited = time.monotonic()
+            await next_queue.put(item)
+            stats.blocked_seconds += time.monotonic() - waited
+
+        return emit
+
+    async def _run_stage(self, index: int) -> None:
+        stage = self.stages[index]
+        stats = self._stats[stage.name]
+        queue = self._queues[index]
+        emit = self._emitter(index)
+
+        async def work() -> None:
+            while True:
+                item = await queue.get()
+                if item is _END:
+                    return
+                stats.max_queue_depth = max(stats.max_queue_depth, queue.qsize() + 1)
+                if stats.started_at is None:
+                    stats.started_at = time.monotonic()
+                stats.items_in += 1
+                started = time.monotonic()
+                try:
+                    await stage.handler(item, emit)
+                except Exception as e:
+                    stats.errors += 1
+                    logger.error(f"Pipeline stage {stage.name} failed on an item: {e}")
+                finally:
+                    stats.busy_seconds += time.monotonic() - started
+
+        await asyncio.gather(*(work() for _ in range(stage.workers)))
+        if stage.flush is not None:
+            try:
+                await stage.flush(emit)
+            except Exception as e:
+                stats.errors += 1
+                logger.error(f"Pipeline stage {stage.name} failed to flush: {e}")
+        stats.finished_at = time.monotonic()
+        if index + 1 < len(self.stages):
+            for _ in range(self.stages[index + 1].workers):
+                await self._queues[index + 1].put(_END)
+
+    def stats(self) -> dict[str, Any]:
+        elapsed = (
+            (self._finished_at or time.monotonic()) - self._started_at
+            if self._started_at is not None
+            else 0.0
+        )
+        return {
+            "elapsed_seconds": round(elapsed, 3),
+            "stages": {
+                self.source_name: self._source_stats.as_dict(),
+                **{
+                    stage.name: {
+                        "workers": stage.workers,
+                        "queue_size": stage.queue_size,
+                        "queue_depth": (
+                            self._queues[i].qsize() if i < len(self._queues) else 0
+                        ),
+                        **self._stats[stage.name].as_dict(),
+                    }
+                    for i, stage in enumerate(self.stages)
+                },
+            },
+        }
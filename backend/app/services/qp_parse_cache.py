@@ -0,0 +1,87 @@
+# app/services/qp_parse_cache.py
+
+import json
+import logging
+import uuid
+from pathlib import Path
+from typing import Any, cast
+
+from sqlalchemy import CursorResult
+from sqlalchemy.dialects.postgresql import insert
+from sqlmodel import Session, col, delete
+
+from app.models import QpParseCacheEntry
+
+logger = logging.getLogger(__name__)
+
+
+class QpParseCache:
+    """
+    Persistent cache of parsed question papers, keyed by PDF content hash, parsing
+    prompt version and model name. The JSON files live outside the blob store so
+    that entries outlive the uploads that produced them.
+    """
+
+    def __init__(self, root: Path):
+        self.root = root
+
+    def json_path(self, content_hash: str, prompt_version: str, model: str) -> Path:
+        """
+        A new file for every parse: question papers parsed before an invalidation
+        keep reading the data they were parsed with.
+        """
+        return self.root / content_hash / f"{prompt_version}-{model}-{uuid.uuid4().hex}.json"
+
+    def get(
+        self, session: Session, content_hash: str, prompt_version: str, model: str
+    ) -> str | None:
+        """Return the cached qp_data.json path, or None on a miss."""
+        entry = session.get(QpParseCacheEntry, (content_hash, prompt_version, model))
+        if entry and Path(entry.json_path).exists():
+            return entry.json_path
+        return None
+
+    def put(
+        self,
+        session: Session,
+        content_hash: str,
+        prompt_version: str,
+        model: str,
+        qp_data: dict[str, Any],
+    ) -> Path:
+        """Write parsed question paper data and record it in the cache."""
+        json_file_path = self.json_path(content_hash, prompt_version, model)
+        json_file_path.parent.mkdir(parents=True, exist_ok=True)
+        with open(json_file_path, "w") as f:
+            json.dump(qp_data, f, indent=4)
+
+        session.execute(
+            insert(QpParseCacheEntry)
+            .values(
+                content_hash=content_hash,
+                prompt_version=prompt_version,
+                model=model,
+                json_path=str(json_file_path),
+            )
+            .on_conflict_do_update(
+                index_elements=["content_hash", "prompt_version", "model"],
+                set_={"json_path": str(json_file_path)},
+            )
+        )
+        session.commit()
+        return json_file_path
+
+    def invalidate(self, session: Session, content_hash: str | None = None) -> int:
+        """
+        Drop cache entries, either for one PDF or all of them. The JSON files are
+        kept because existing QpPdf rows may still point at them.
+        """
+        statement = delete(QpParseCacheEntry)
+        if content_hash:
+            statement = statement.where(col(QpParseCacheEntry.content_hash) == content_hash)
+        result = cast(CursorResult[Any], session.execute(statement))
+        session.commit()
+        return result.rowcount
+
+
+qp_parse_cache = QpParseCache(root=Path("uploads") / "qp_cache")
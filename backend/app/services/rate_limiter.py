@@ -0,0 +1,173 @@
+# app/services/rate_limiter.py
+
+import asyncio
+import time
+from typing import Any
+
+
+class TokenBucket:
+    """
+    Classic token bucket refilled continuously at `rate_per_minute`. The bucket
+    holds at most one minute worth of tokens.
+    """
+
+    def __init__(self, rate_per_minute: float):
+        self.rate_per_second = rate_per_minute / 60.0
+        self.capacity = rate_per_minute
+        self.tokens = rate_per_minute
+        self._updated_at = time.monotonic()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.tokens = min(
+            self.capacity, self.tokens + (now - self._updated_at) * self.rate_per_second
+        )
+        self._updated_at = now
+
+    def wait_time(self, amount: float) -> float:
+        """Seconds until `amount` tokens are available (0 if they already are)."""
+        self._refill()
+        # Requests larger than the whole bucket are let through once it is full
+        amount = min(amount, self.capacity)
+        if self.tokens >= amount:
+            return 0.0
+        return (amount - self.tokens) / self.rate_per_second
+
+    def consume(self, amount: float) -> None:
+        self._refill()
+        self.tokens -= amount
+
+    def refund(self, amount: float) -> None:
+        self._refill()
+        self.tokens = min(self.capacity, self.tokens + amount)
+
+
+class AdaptiveRateLimiter:
+    """
+    Client-side limiter for LLM calls, shared by every caller in the process.
+
+    Requests-per-minute and tokens-per-minute are enforced with token buckets.
+    On top of that, the number of calls in flight follows AIMD: the limit grows by
+    `increase / limit` after every success (about +`increase` per round trip of
+    calls) and is multiplied by `decrease_factor` when the provider throttles us
+    or a call times out. Decreases are applied at most once per
+    `decrease_cooldown` seconds so that a burst of 429s from calls that were
+    already in flight only counts once.
+    """
+
+    def __init__(
+        self,
+        requests_per_minute: float,
+        tokens_per_minute: float,
+        initial_concurrency: float = 4,
+        min_concurrency: float = 1,
+        max_concurrency: float = 64,
+        increase: float = 1.0,
+        decrease_factor: float = 0.5,
+        decrease_cooldown: float = 2.0,
+    ):
+        self.requests = TokenBucket(requests_per_minute)
+        self.tokens = TokenBucket(tokens_per_minute)
+        self.limit = float(initial_concurrency)
+        self.min_concurrency = float(min_concurrency)
+        self.max_concurrency = float(max_concurrency)
+        self.increase = increase
+        self.decrease_factor = decrease_factor
+        self.decrease_cooldown = decrease_cooldown
+        self.in_flight = 0
+        self._condition: asyncio.Condition | None = None
+        self._last_decrease = 0.0
+        self._waiting = 0
+        self._successes = 0
+        self._throttled = 0
+        self._errors = 0
+        self._tokens_used = 0
+
+    @property
+    def condition(self) -> asyncio.Condition:
+        # Created lazily so the limiter can be built at import time
+        if self._condition is None:
+            self._condition = asyncio.Condition()
+        return self._condition
+
+    async def acquire(self, estimated_tokens: int) -> None:
+        """
+        Wait for a concurrency slot and for enough request and token budget.
+        Every `acquire` must be paired with exactly one `release`.
+        """
+        async with self.condition:
+            self._waiting += 1
+            try:
+                while True:
+                    if self.in_flight < max(1, int(self.limit)):
+                        delay = max(
+                            self.requests.wait_time(1),
+                            self.tokens.wait_time(estimated_tokens),
+                        )
+                        if delay == 0:
+                            break
+                        try:
+                            await asyncio.wait_for(self.condition.wait(), timeout=delay)
+                        except asyncio.TimeoutError:
+                            pass
+                    else:
+                        await self.condition.wait()
+            finally:
+                self._waiting -= 1
+
+            self.requests.consume(1)
+            self.tokens.consume(estimated_tokens)
+            self.in_flight += 1
+
+    async def release(
+        self,
+        estimated_tokens: int,
+        used_tokens: int | None = None,
+        throttled: bool = False,
+        failed: bool = False,
+    ) -> None:
+        """
+        Return a slot and adjust the concurrency limit.
+        `throttled` covers 429/RESOURCE_EXHAUSTED and timeouts; `failed` covers
+        any other error, which leaves the limit unchanged.
+        """
+        async with self.condition:
+            self.in_flight -= 1
+            if used_tokens is not None:
+                # Settle the estimate against what the provider actually counted
+                difference = used_tokens - estimated_tokens
+                if difference > 0:
+                    self.tokens.consume(difference)
+                else:
+                    self.tokens.refund(-difference)
+                self._tokens_used += used_tokens
+
+            if throttled:
+                self._throttled += 1
+                now = time.monotonic()
+                if now - self._last_decrease >= self.decrease_cooldown:
+                    self.limit = max(
+                        self.min_concurrency, self.limit * self.decrease_factor
+                    )
+                    self._last_decrease = now
+            elif failed:
+                self._errors += 1
+            else:
+                self._successes += 1
+                self.limit = min(
+                    self.max_concurrency, self.limit + self.increase / self.limit
+                )
+            self.condition.notify_all()
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "concurrency_limit": round(self.limit, 2),
+            "in_flight": self.in_flight,
+            "waiting": self._waiting,
+            "successes": self._successes,
+            "throttled": self._throttled,
+            "errors": self._errors,
+            "tokens_used": self._tokens_used,
+            "request_budget_available": round(self.requests.tokens, 2),
+            "token_budget_available": round(self.tokens.tokens, 2),
+        }
@@ -0,0 +1,364 @@
+# app/services/render_service.py
+
+import asyncio
+import logging
+import multiprocessing
+import os
+import re
+import time
+from collections import deque
+from collections.abc import AsyncIterator
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any
+
+import fitz
+
+from app.core.config import RenderProfile, settings
+
+logger = logging.getLogger(__name__)
+
+IMAGE_EXTENSIONS = {"png": ".png", "jpeg": ".jpg"}
+IMAGE_MIME_TYPES = {"png": "image/png", "jpeg": "image/jpeg"}
+
+_PAGE_IMAGE_PATTERN = re.compile(r"^page(\d+)\.(png|jpg)$")
+
+
+class RenderQueueFullError(Exception):
+    """Raised when the rendering executor cannot accept more documents."""
+
+
+@dataclass
+class RenderedPage:
+    """
+    An encoded page image. `data` holds the freshly rendered bytes so they can go
+    straight to the LLM; it is None when the page was reused from an earlier render.
+    """
+
+    page_no: int
+    image_path: Path
+    data: bytes | None
+    mime_type: str
+
+
+def get_render_profile(name: str | None = None) -> RenderProfile:
+    """
+    Look up a configured render profile. Collections without one, or whose
+    stored profile is no longer configured, use the default profile.
+    """
+    if name and name not in settings.RENDER_PROFILES:
+        logger.warning(
+            f'Render profile "{name}" is not configured, using '
+            f'"{settings.DEFAULT_RENDER_PROFILE}"'
+        )
+        name = None
+    return settings.RENDER_PROFILES[name or settings.DEFAULT_RENDER_PROFILE]
+
+
+def list_page_images(folder: Path) -> list[Path]:
+    """
+    Return the rendered page{n} images in `folder`, ordered by page number.
+    """
+    pages = []
+    for path in folder.iterdir():
+        match = _PAGE_IMAGE_PATTERN.match(path.name)
+        if match:
+            pages.append((int(match.group(1)), path))
+    return [path for _, path in sorted(pages)]
+
+
+def available_cpus() -> int:
+    """CPUs this process may run on, which a container or taskset can limit."""
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        # Not available on macOS and Windows
+        return os.cpu_count() or 1
+
+
+def split_page_ranges(
+    page_count: int, max_chunks: int, min_chunk_pages: int
+) -> list[tuple[int, int]]:
+    """
+    Split pages [0, page_count) into at most `max_chunks` contiguous, half-open
+    ranges of at least `min_chunk_pages` pages each (except when the document is
+    shorter than that). Range sizes differ by at most one page.
+    """
+    if page_count <= 0:
+        return []
+    chunks = max(1, min(max_chunks, page_count // max(1, min_chunk_pages)))
+    base, extra = divmod(page_count, chunks)
+    ranges = []
+    start = 0
+    for i in range(chunks):
+        end = start + base + (1 if i < extra else 0)
+        ranges.append((start, end))
+        start = end
+    return ranges
+
+
+async def archive_pages(pages: list[RenderedPage]) -> None:
+    """Write freshly rendered pages to their `image_path` from worker threads."""
+    await asyncio.gather(
+        *(
+            asyncio.to_thread(page.image_path.write_bytes, page.data)
+            for page in pages
+            if page.data is not None
+        )
+    )
+
+
+def _count_pdf_pages(pdf_path: str) -> int:
+    doc = fitz.open(pdf_path)
+    try:
+        page_count: int = doc.page_count
+        return page_count
+    finally:
+        doc.close()
+
+
+def _encode_pixmap(pix: fitz.Pixmap, profile: RenderProfile) -> bytes:
+    data: bytes
+    if profile.format == "jpeg":
+        data = pix.tobytes("jpeg", jpg_quality=profile.quality)
+    else:
+        data = pix.tobytes("png")
+    return data
+
+
+def _render_pdf_pages(
+    pdf_path: str, start: int, end: int, profile: RenderProfile
+) -> list[tuple[int, bytes, float]]:
+    """
+    Render and encode pages [start, end) of a PDF using a render profile. Runs inside
+    a worker process, which opens the document itself so that only the path goes in
+    and only the encoded image bytes come back.
+    Returns a (page_no, image_bytes, render_seconds) tuple for each page.
+    """
+    colorspace = fitz.csGRAY if profile.grayscale else fitz.csRGB
+    rendered = []
+    doc = fitz.open(pdf_path)
+    try:
+        for i in range(start, end):
+            started = time.perf_counter()
+            pix = doc[i].get_pixmap(dpi=profile.dpi, colorspace=colorspace)
+            data = _encode_pixmap(pix, profile)
+            rendered.append((i + 1, data, time.perf_counter() - started))
+    finally:
+        doc.close()
+    return rendered
+
+
+class RenderService:
+    """
+    Renders PDF pages in a dedicated process pool so that CPU-bound rasterization
+    never runs on the event loop. Large documents are split into page ranges that
+    are rendered in parallel. Submissions are bounded: once every worker is busy
+    and `queue_size` documents are waiting, new documents are rejected. A document
+    fans out into several chunks, so the queue depth is counted in chunks.
+    """
+
+    def __init__(
+        self,
+        max_workers: int | None = None,
+        queue_size: int = 16,
+        workers_per_document: int | None = None,
+        min_chunk_pages: int = 8,
+        pools_per_host: int = 1,
+    ):
+        self.max_workers = max_workers or max(1, available_cpus() // max(1, pools_per_host))
+        self.queue_size = queue_size
+        self.workers_per_document = workers_per_document or self.max_workers
+        self.min_chunk_pages = min_chunk_pages
+        self._executor: ProcessPoolExecutor | None = None
+        # Documents admitted and not yet finished
+        self._pending = 0
+        # Executor tasks (page counts and page-range chunks) submitted and not done
+        self._tasks = 0
+        self._rejected = 0
+        self._documents_rendered = 0
+        self._pages_rendered = 0
+        self._bytes_rendered = 0
+        self._page_seconds_total = 0.0
+        self._page_seconds_max = 0.0
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        # Created lazily so that importing this module never forks processes
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.max_workers,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return self._executor
+
+    @property
+    def capacity(self) -> int:
+        return self.max_workers + self.queue_size
+
+    @property
+    def queue_depth(self) -> int:
+        """Number of chunks waiting for a free worker."""
+        return max(0, self._tasks - self.max_workers)
+
+    def _submit(self, fn: Any, *args: Any) -> asyncio.Future[Any]:
+        future = asyncio.get_running_loop().run_in_executor(
+            self._get_executor(), fn, *args
+        )
+        self._tasks += 1
+
+        def done(_: asyncio.Future[Any]) -> None:
+            self._tasks -= 1
+
+        future.add_done_callback(done)
+        return future
+
+    def _admit(self) -> None:
+        if self._pending >= self.capacity:
+            self._rejected += 1
+            raise RenderQueueFullError(
+                f"Render queue is full ({self._pending} documents pending)."
+            )
+        self._pending += 1
+
+    def _record_page(self, data: bytes, seconds: float) -> None:
+        self._pages_rendered += 1
+        self._bytes_rendered += len(data)
+        self._page_seconds_total += seconds
+        self._page_seconds_max = max(self._page_seconds_max, seconds)
+
+    async def render_pdf(
+        self, pdf_path: Path, output_folder: Path, profile: RenderProfile | None = None
+    ) -> list[RenderedPage]:
+        """
+        Render every page of `pdf_path` using the default render profile unless one
+        is given. The encoded images are returned in memory, ordered by page number.
+        Nothing is written to disk; `archive_pages` stores them in `output_folder`
+        as page{n}.<ext>.
+        """
+        profile = profile or get_render_profile()
+        self._admit()
+        try:
+            page_count = await self._submit(_count_pdf_pages, str(pdf_path))
+            page_ranges = split_page_ranges(
+                page_count, self.workers_per_document, self.min_chunk_pages
+            )
+            chunks = await asyncio.gather(
+                *(
+                    self._submit(_render_pdf_pages, str(pdf_path), start, end, profile)
+                    for start, end in page_ranges
+                )
+            )
+        finally:
+            self._pending -= 1
+
+        extension = IMAGE_EXTENSIONS[profile.format]
+        mime_type = IMAGE_MIME_TYPES[profile.format]
+        # Ranges are gathered in submission order, but sort anyway so that
+        # callers can rely on page{n} ordering
+        pages = []
+        for page_no, data, seconds in sorted(
+            (page for chunk in chunks for page in chunk), key=lambda page: page[0]
+        ):
+            pages.append(
+                RenderedPage(
+                    page_no=page_no,
+                    image_path=output_folder / f"page{page_no}{extension}",
+                    data=data,
+                    mime_type=mime_type,
+                )
+            )
+            self._record_page(data, seconds)
+        self._documents_rendered += 1
+        return pages
+
+    async def iter_pdf_pages(
+        self,
+        pdf_path: Path,
+        output_folder: Path,
+        profile: RenderProfile | None = None,
+        chunk_pages: int = 4,
+    ) -> AsyncIterator[RenderedPage]:
+        """
+        Render a PDF in chunks of `chunk_pages` pages and yield the pages in order
+        as soon as their chunk is done, so that later stages can start on page 1
+        while the rest is still rendering. At most `workers_per_document` chunks
+        are rendered ahead of the consumer, so a slow consumer holds back the
+        renderer. Nothing is written to disk; `image_path` is where the caller
+        should archive each page.
+        """
+        profile = profile or get_render_profile()
+        extension = IMAGE_EXTENSIONS[profile.format]
+        mime_type = IMAGE_MIME_TYPES[profile.format]
+        self._admit()
+        in_flight: deque[asyncio.Future[list[tuple[int, bytes, float]]]] = deque()
+        try:
+            page_count = await self._submit(_count_pdf_pages, str(pdf_path))
+            chunk_pages = max(1, chunk_pages)
+            page_ranges = iter(
+                [
+                    (start, min(start + chunk_pages, page_count))
+                    for start in range(0, page_count, chunk_pages)
+                ]
+            )
+
+            def submit_next() -> None:
+                page_range = next(page_ranges, None)
+                if page_range is not None:
+                    in_flight.append(
+                        self._submit(_render_pdf_pages, str(pdf_path), *page_range, profile)
+                    )
+
+            for _ in range(self.workers_per_document):
+                submit_next()
+            while in_flight:
+                chunk = await in_flight.popleft()
+                submit_next()
+                for page_no, data, seconds in chunk:
+                    self._record_page(data, seconds)
+                    yield RenderedPage(
+                        page_no=page_no,
+                        image_path=output_folder / f"page{page_no}{extension}",
+                        data=data,
+                        mime_type=mime_type,
+                    )
+            self._documents_rendered += 1
+        finally:
+            for future in in_flight:
+                future.cancel()
+            self._pending -= 1
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "max_workers": self.max_workers,
+            "queue_size": self.queue_size,
+            "workers_per_document": self.workers_per_document,
+            "min_chunk_pages": self.min_chunk_pages,
+            "pending": self._pending,
+            "tasks_in_flight": self._tasks,
+            "queue_depth": self.queue_depth,
+            "rejected": self._rejected,
+            "documents_rendered": self._documents_rendered,
+            "pages_rendered": self._pages_rendered,
+            "bytes_rendered": self._bytes_rendered,
+            "page_render_seconds_avg": (
+                self._page_seconds_total / self._pages_rendered
+                if self._pages_rendered
+                else 0.0
+            ),
+            "page_render_seconds_max": self._page_seconds_max,
+        }
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+render_service = RenderService(
+    max_workers=settings.RENDER_MAX_WORKERS,
+    queue_size=settings.RENDER_QUEUE_SIZE,
+    workers_per_document=settings.RENDER_WORKERS_PER_DOCUMENT,
+    min_chunk_pages=settings.RENDER_MIN_CHUNK_PAGES,
+    pools_per_host=settings.RENDER_POOLS_PER_HOST,
+)
@@ -0,0 +1,335 @@
+# app/services/results_summary.py
+
+import json
+import logging
+import os
+import re
+import uuid
+from dataclasses import asdict, dataclass
+from datetime import datetime, timezone
+from functools import lru_cache
+from typing import Any
+
+from sqlalchemy import Integer, cast
+from sqlalchemy.dialects.postgresql import insert
+from sqlmodel import Session, col, delete, desc, func, select
+
+from app.models import (
+    AnsPdf,
+    AnswerSheetResult,
+    CollectionRowCounts,
+    Evaluation,
+    QpPdf,
+    QuestionResult,
+    QuestionStatsPublic,
+    ResultsSummaryPublic,
+    SectionResultPublic,
+    StudentResultPublic,
+)
+from app.services.evaluation_prompt import question_sections
+
+logger = logging.getLogger(__name__)
+
+_NUMBER_WORDS = {
+    "one": 1, "two": 2, "three": 3, "four": 4, "five": 5,
+    "six": 6, "seven": 7, "eight": 8, "nine": 9, "ten": 10,
+}
+# "Answer any TWO out of four", "Attempt any 3 questions"
+_ANY_N = re.compile(r"\bany\s+(\d+|" + "|".join(_NUMBER_WORDS) + r")\b", re.IGNORECASE)
+
+UNNUMBERED_QUESTION = "?"
+
+
+def required_questions(section: dict[str, Any], question_count: int) -> int | None:
+    """
+    How many of a section's questions count, read from instructions such as
+    "Answer any TWO out of four". None when every question counts.
+    """
+    match = _ANY_N.search(str(section.get("instructions") or ""))
+    if not match:
+        return None
+    word = match.group(1).lower()
+    required = int(word) if word.isdigit() else _NUMBER_WORDS[word]
+    return required if 0 < required < question_count else None
+
+
+def _marks(value: Any) -> float | None:
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+@dataclass
+class SectionScore:
+    section_no: int | None
+    name: str | None
+    required: int | None
+    obtained_marks: float
+    max_marks: float
+    counted: list[str]
+
+
+@dataclass
+class SheetScore:
+    obtained_marks: float
+    max_marks: float
+    sections: list[SectionScore]
+
+    @property
+    def counted(self) -> set[str]:
+        return {question_no for section in self.sections for question_no in section.counted}
+
+
+def score_answer_sheet(qp_data: Any, scores: dict[str, tuple[int, int]]) -> SheetScore:
+    """
+    Total an answer sheet from its (obtained, max) marks per question id. In a
+    section of the paper that asks for any N of its questions only the N best
+    answers count, and the section is worth its N highest-valued questions.
+    Answers that match no question of the paper (or every answer, when the paper
+    is not structured) are counted as graded.
+    """
+    sections: list[SectionScore] = []
+    matched: set[str] = set()
+    for section_no, (section, questions) in enumerate(question_sections(qp_data), start=1):
+        ids = [question_id for question_id, _ in questions]
+        matched.update(ids)
+        required = required_questions(section, len(ids))
+        answered = sorted(
+            (question_id for question_id in ids if question_id in scores),
+            key=lambda question_id: scores[question_id][0],
+            reverse=True,
+        )
+        counted = answered[:required] if required else answered
+        paper_marks = sorted(
+            (_marks(question.get("max_marks")) or 0.0 for _, question in questions),
+            reverse=True,
+        )
+        max_marks = sum(paper_marks[:required] if required else paper_marks)
+        if not max_marks:
+            max_marks = sum(scores[question_id][1] for question_id in counted)
+        sections.append(
+            SectionScore(
+                section_no=section_no,
+                name=section.get("section_name"),
+                required=required,
+                obtained_marks=sum(scores[question_id][0] for question_id in counted),
+                max_marks=max_marks,
+                counted=sorted(counted, key=ids.index),
+            )
+        )
+
+    unmatched = sorted(question_id for question_id in scores if question_id not in matched)
+    if unmatched:
+        sections.append(
+            SectionScore(
+                section_no=None,
+                name=None,
+                required=None,
+                obtained_marks=sum(scores[question_id][0] for question_id in unmatched),
+                max_marks=sum(scores[question_id][1] for question_id in unmatched),
+                counted=unmatched,
+            )
+        )
+    return SheetScore(
+        obtained_marks=sum(section.obtained_marks for section in sections),
+        max_marks=sum(section.max_marks for section in sections),
+        sections=sections,
+    )
+
+
+def question_no_key(question_no: str) -> tuple[Any, ...]:
+    """Sort '1.2' before '1.10' and numbered questions before anything else."""
+    parts = question_no.split(".")
+    if all(part.isdigit() for part in parts):
+        return (0, *map(int, parts))
+    return (1, question_no)
+
+
+@lru_cache(maxsize=32)
+def _load_question_paper(json_path: str, _modified: float) -> Any:
+    # `_modified` is only part of the cache key, so a rewritten file is read again
+    with open(json_path) as f:
+        return json.load(f)
+
+
+class ResultsSummary:
+    """
+    Per-student and per-question results of a collection, kept in
+    AnswerSheetResult and QuestionResult. An answer sheet's rows are rebuilt
+    from its own evaluations (a range of ix_evaluation_ans_pdf_id) in the same
+    transaction that commits new results for it, so reading the summary of a
+    collection never touches the Evaluation table.
+    """
+
+    def question_paper(self, session: Session, collection_id: uuid.UUID) -> Any:
+        """Parsed data of the collection's latest question paper, or None."""
+        json_path = session.exec(
+            select(QpPdf.json_path)
+            .where(QpPdf.collection_id == collection_id, col(QpPdf.json_path).is_not(None))
+            .order_by(desc(QpPdf.created_at))
+        ).first()
+        if not json_path:
+            return None
+        try:
+            return _load_question_paper(json_path, os.path.getmtime(json_path))
+        except (OSError, ValueError) as e:
+            logger.warning(f"Could not read question paper data {json_path}: {e}")
+            return None
+
+    def refresh_answer_sheet(
+        self,
+        session: Session,
+        collection_id: uuid.UUID,
+        ans_pdf_id: uuid.UUID,
+        qp_data: Any = None,
+    ) -> None:
+        """Rebuild the results of one answer sheet from its evaluations. Does not commit."""
+        if qp_data is None:
+            qp_data = self.question_paper(session, collection_id)
+        rows = session.exec(
+            select(
+                Evaluation.question_no,
+                func.max(Evaluation.obtained_marks),
+                func.max(Evaluation.max_marks),
+            )
+            .where(Evaluation.ans_pdf_id == ans_pdf_id)
+            .group_by(Evaluation.question_no)
+        ).all()
+        scores: dict[str, tuple[int, int]] = {}
+        for question_no, obtained_marks, max_marks in rows:
+            key = (question_no or UNNUMBERED_QUESTION).strip()[:32]
+            previous = scores.get(key, (0, 0))
+            scores[key] = (max(previous[0], obtained_marks), max(previous[1], max_marks))
+
+        if not scores:
+            self.clear_answer_sheet(session, ans_pdf_id)
+            return
+        session.execute(delete(QuestionResult).where(QuestionResult.ans_pdf_id == ans_pdf_id))  # type: ignore
+
+        score = score_answer_sheet(qp_data, scores)
+        counted = score.counted
+        session.execute(
+            insert(QuestionResult).values(
+                [
+                    {
+                        "ans_pdf_id": ans_pdf_id,
+                        "question_no": question_no,
+                        "collection_id": collection_id,
+                        "obtained_marks": obtained_marks,
+                        "max_marks": max_marks,
+                        "counted": question_no in counted,
+                    }
+                    for question_no, (obtained_marks, max_marks) in scores.items()
+                ]
+            )
+        )
+        values = {
+            "collection_id": collection_id,
+            "obtained_marks": score.obtained_marks,
+            "max_marks": score.max_marks,
+            "questions_graded": len(scores),
+            "sections": json.dumps([asdict(section) for section in score.sections]),
+            "updated_at": datetime.now(timezone.utc),
+        }
+        session.execute(
+            insert(AnswerSheetResult)
+            .values(ans_pdf_id=ans_pdf_id, **values)
+            .on_conflict_do_update(index_elements=["ans_pdf_id"], set_=values)
+        )
+
+    def clear_answer_sheet(self, session: Session, ans_pdf_id: uuid.UUID) -> None:
+        """Drop the results of an answer sheet whose evaluations were removed. Does not commit."""
+        session.execute(delete(QuestionResult).where(QuestionResult.ans_pdf_id == ans_pdf_id))  # type: ignore
+        session.execute(delete(AnswerSheetResult).where(AnswerSheetResult.ans_pdf_id == ans_pdf_id))  # type: ignore
+
+    def refresh_collection(self, session: Session, collection_id: uuid.UUID) -> int:
+        """
+        Rebuild the results of every answer sheet of a collection, e.g. after a
+        new question paper changed how sections are totalled. Commits after each
+        sheet. Returns the number of sheets refreshed.
+        """
+        qp_data = self.question_paper(session, collection_id)
+        ans_pdf_ids = session.exec(
+            select(Evaluation.ans_pdf_id)
+            .where(Evaluation.collection_id == collection_id)
+            .distinct()
+        ).all()
+        for ans_pdf_id in ans_pdf_ids:
+            self.refresh_answer_sheet(session, collection_id, ans_pdf_id, qp_data)
+            session.commit()
+        return len(ans_pdf_ids)
+
+    def read(self, session: Session, collection_id: uuid.UUID) -> ResultsSummaryPublic:
+        sheets = session.exec(
+            select(AnswerSheetResult, AnsPdf.name, AnsPdf.is_evaluated)
+            .join(AnsPdf, col(AnsPdf.id) == AnswerSheetResult.ans_pdf_id)
+            .where(AnswerSheetResult.collection_id == collection_id)
+            .order_by(col(AnsPdf.name), col(AnsPdf.id))
+        ).all()
+        students = [
+            StudentResultPublic(
+                ans_pdf_id=result.ans_pdf_id,
+                name=name,
+                is_evaluated=is_evaluated,
+                obtained_marks=result.obtained_marks,
+                max_marks=result.max_marks,
+                questions_graded=result.questions_graded,
+                sections=[SectionResultPublic(**section) for section in json.loads(result.sections)],
+            )
+            for result, name, is_evaluated in sheets
+        ]
+
+        # sqlmodel only types select() for up to four columns
+        question_rows = session.exec(
+            select(  # type: ignore[call-overload]
+                QuestionResult.question_no,
+                func.count(),
+                func.sum(cast(QuestionResult.counted, Integer)),
+                func.avg(QuestionResult.obtained_marks),
+                func.min(QuestionResult.obtained_marks),
+                func.max(QuestionResult.obtained_marks),
+                func.max(QuestionResult.max_marks),
+            )
+            .where(QuestionResult.collection_id == collection_id)
+            .group_by(QuestionResult.question_no)
+        ).all()
+        questions = sorted(
+            (
+                QuestionStatsPublic(
+                    question_no=question_no,
+                    attempts=attempts,
+                    counted=counted or 0,
+                    mean_marks=round(float(mean_marks), 3),
+                    min_marks=min_marks,
+                    max_obtained_marks=max_obtained_marks,
+                    max_marks=max_marks,
+                )
+                for (
+                    question_no, attempts, counted, mean_marks,
+                    min_marks, max_obtained_marks, max_marks,
+                ) in question_rows
+            ),
+            key=lambda stats: question_no_key(stats.question_no),
+        )
+
+        answer_sheets = session.exec(
+            select(CollectionRowCounts.ans_pdfs).where(
+                CollectionRowCounts.collection_id == collection_id
+            )
+        ).first()
+        return ResultsSummaryPublic(
+            collection_id=collection_id,
+            answer_sheets=answer_sheets or 0,
+            graded_answer_sheets=len(students),
+            mean_marks=(
+                round(sum(student.obtained_marks for student in students) / len(students), 3)
+                if students
+                else None
+            ),
+            students=students,
+            questions=questions,
+        )
+
+
+results_summary = ResultsSummary()
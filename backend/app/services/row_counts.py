@@ -0,0 +1,53 @@
+# app/services/row_counts.py
+
+import uuid
+from typing import Any
+
+from sqlalchemy import text
+from sqlmodel import Session, func, select
+
+from app.core.config import settings
+from app.models import CollectionRowCounts, UserRowCounts
+
+
+class RowCounts:
+    """
+    Totals for the list endpoints that avoid counting rows on every request.
+    Listings scoped to a collection or a user read the counters kept by database
+    triggers in CollectionRowCounts and UserRowCounts. Unscoped listings, which
+    only superusers see, report the planner's estimate of the table size, which
+    is refreshed by autovacuum and can lag behind recent writes; small tables
+    are counted exactly.
+    """
+
+    def __init__(self, exact_count_threshold: int):
+        self.exact_count_threshold = exact_count_threshold
+
+    def for_collection(self, session: Session, collection_id: uuid.UUID, column: Any) -> int:
+        """`column` is a CollectionRowCounts counter, e.g. CollectionRowCounts.evaluations."""
+        value = session.exec(
+            select(column).where(CollectionRowCounts.collection_id == collection_id)
+        ).first()
+        return value or 0
+
+    def for_user(self, session: Session, user_id: uuid.UUID, column: Any) -> int:
+        """`column` is a UserRowCounts counter, e.g. UserRowCounts.collections."""
+        value = session.exec(
+            select(column).where(UserRowCounts.user_id == user_id)
+        ).first()
+        return value or 0
+
+    def estimate(self, session: Session, model: Any) -> int:
+        """Approximate number of rows in the table of `model`."""
+        estimate: int | None = session.execute(
+            text("SELECT reltuples::bigint FROM pg_class WHERE oid = to_regclass(quote_ident(:table))"),
+            {"table": model.__tablename__},
+        ).scalar()
+        # -1 until the table is first analyzed
+        if estimate is None or estimate < self.exact_count_threshold:
+            count: int = session.exec(select(func.count()).select_from(model)).one()
+            return count
+        return estimate
+
+
+row_counts = RowCounts(settings.EXACT_COUNT_THRESHOLD)
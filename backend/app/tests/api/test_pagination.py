@@ -0,0 +1,60 @@
+import uuid
+from datetime import datetime
+
+import pytest
+from fastapi import HTTPException
+from sqlalchemy.dialects import postgresql
+from sqlmodel import select
+
+from app.api.pagination import decode_cursor, encode_cursor, next_cursor, paginate
+from app.models import Collection
+
+
+def compile_sql(statement: object) -> str:
+    return str(statement.compile(dialect=postgresql.dialect()))  # type: ignore
+
+
+def test_cursor_round_trips() -> None:
+    created_at = datetime(2025, 10, 14, 9, 30, 15, 123456)
+    id = uuid.uuid4()
+    assert decode_cursor(encode_cursor(created_at, id)) == (created_at, id)
+
+
+@pytest.mark.parametrize("cursor", ["", "not-a-cursor", "WzFd"])
+def test_invalid_cursor_is_rejected(cursor: str) -> None:
+    with pytest.raises(HTTPException) as e:
+        decode_cursor(cursor)
+    assert e.value.status_code == 400
+
+
+def test_cursor_replaces_the_offset() -> None:
+    cursor = encode_cursor(datetime(2025, 1, 1), uuid.uuid4())
+    sql = compile_sql(
+        paginate(
+            select(Collection), Collection.created_at, Collection.id,
+            skip=50, limit=10, cursor=cursor,
+        )
+    )
+    assert "(collection.created_at, collection.id) >" in sql
+    assert "ORDER BY collection.created_at ASC, collection.id ASC" in sql
+    assert "OFFSET" not in sql
+
+    sql = compile_sql(
+        paginate(
+            select(Collection), Collection.created_at, Collection.id,
+            skip=50, limit=10, cursor=None, descending=True,
+        )
+    )
+    assert "ORDER BY collection.created_at DESC, collection.id DESC" in sql
+    assert "OFFSET" in sql
+
+
+def test_next_cursor_points_past_the_last_row_of_a_full_page() -> None:
+    rows = [
+        Collection(name=str(i), user_id=uuid.uuid4(), created_at=datetime(2025, 1, i + 1))
+        for i in range(3)
+    ]
+    assert next_cursor(rows, Collection.created_at, limit=4) is None
+    cursor = next_cursor(rows, Collection.created_at, limit=3)
+    assert cursor is not None
+    assert decode_cursor(cursor) == (rows[-1].created_at, rows[-1].id)
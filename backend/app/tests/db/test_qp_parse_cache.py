@@ -0,0 +1,36 @@
+import json
+from collections.abc import Generator
+from pathlib import Path
+
+import pytest
+from sqlmodel import Session
+
+from app.core.db import engine
+from app.services.qp_parse_cache import QpParseCache
+
+
+@pytest.fixture()
+def session() -> Generator[Session, None, None]:
+    """Session whose writes are all rolled back at the end of the test."""
+    with engine.connect() as connection:
+        transaction = connection.begin()
+        with Session(bind=connection, join_transaction_mode="create_savepoint") as session:
+            yield session
+        transaction.rollback()
+
+
+def test_reparse_after_invalidation_keeps_older_data(session: Session, tmp_path: Path) -> None:
+    cache = QpParseCache(root=tmp_path)
+    content_hash = "f" * 64
+    first = cache.put(session, content_hash, "1", "gemini", {"sections": ["old"]})
+    assert cache.get(session, content_hash, "1", "gemini") == str(first)
+
+    assert cache.invalidate(session, content_hash) == 1
+    assert cache.get(session, content_hash, "1", "gemini") is None
+
+    second = cache.put(session, content_hash, "1", "gemini", {"sections": ["new"]})
+    assert second != first
+    assert cache.get(session, content_hash, "1", "gemini") == str(second)
+    # Question papers parsed before the invalidation still read their own data
+    assert json.loads(first.read_text()) == {"sections": ["old"]}
+    assert json.loads(second.read_text()) == {"sections": ["new"]}
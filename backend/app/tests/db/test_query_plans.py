@@ -0,0 +1,195 @@
+import json
+import uuid
+from collections.abc import Generator, Iterator
+from typing import Any
+
+import pytest
+from sqlalchemy import Connection, desc, text
+from sqlmodel import Session, col, select
+
+from app.core.config import settings
+from app.core.db import engine
+from app.models import AnsPdf, AnsPdfFolder, Evaluation, Page, QpPdf, User
+
+# Large enough that scanning a whole table costs far more than an index lookup
+COLLECTIONS = 500
+SHEETS_PER_COLLECTION = 4
+PAGES_PER_SHEET = 8
+EVALUATIONS_PER_PAGE = 2
+QP_PDFS_PER_COLLECTION = 3
+
+HOT_TABLES = ["collection", "anspdffolder", "anspdf", "qppdf", "page", "evaluation"]
+
+SEED = [
+    """
+    INSERT INTO collection (id, name, is_evaluated, user_id, created_at)
+    SELECT gen_random_uuid(), 'query-plan-' || n, false, :user_id, now()
+    FROM generate_series(1, :collections) AS n
+    """,
+    """
+    INSERT INTO anspdffolder (id, name, collection_id, created_at)
+    SELECT gen_random_uuid(), c.name, c.id, now()
+    FROM collection c WHERE c.name LIKE 'query-plan-%'
+    """,
+    """
+    INSERT INTO anspdf (id, name, ans_pdf_folder_id, filepath, folder_path, uploaded_at, is_evaluated)
+    SELECT gen_random_uuid(), 'query-plan-sheet-' || n, f.id, '', '', now(), false
+    FROM anspdffolder f CROSS JOIN generate_series(1, :sheets) AS n
+    WHERE f.name LIKE 'query-plan-%'
+    """,
+    """
+    INSERT INTO page (id, page_no, image_path, is_evaluated, ans_pdf_id, collection_id)
+    SELECT gen_random_uuid(), n, 'query-plan', n % 2 = 0, a.id, f.collection_id
+    FROM anspdf a JOIN anspdffolder f ON f.id = a.ans_pdf_folder_id
+    CROSS JOIN generate_series(1, :pages) AS n
+    WHERE a.name LIKE 'query-plan-sheet-%'
+    """,
+    """
+    INSERT INTO evaluation (
+        id, question_no, obtained_marks, max_marks, feedback, page_id, ans_pdf_id,
+        collection_id, created_at
+    )
+    SELECT gen_random_uuid(), n::text, 1, 2, '', p.id, p.ans_pdf_id, p.collection_id, now()
+    FROM page p CROSS JOIN generate_series(1, :evaluations) AS n
+    WHERE p.image_path = 'query-plan'
+    """,
+    """
+    INSERT INTO qppdf (id, name, filepath, folder_path, collection_id, created_at)
+    SELECT gen_random_uuid(), c.name, '', '', c.id, now() - n * interval '1 day'
+    FROM collection c CROSS JOIN generate_series(1, :qp_pdfs) AS n
+    WHERE c.name LIKE 'query-plan-%'
+    """,
+]
+
+
+@pytest.fixture(scope="module")
+def seeded(db: Session) -> Generator[tuple[Connection, uuid.UUID, uuid.UUID], None, None]:
+    """
+    Seed the hot tables with synthetic rows and fresh statistics inside a
+    transaction that is rolled back afterwards, yielding the connection, one
+    collection id and one answer sheet id of that collection.
+    """
+    user = db.exec(select(User).where(User.email == settings.FIRST_SUPERUSER)).one()
+    params = {
+        "user_id": user.id,
+        "collections": COLLECTIONS,
+        "sheets": SHEETS_PER_COLLECTION,
+        "pages": PAGES_PER_SHEET,
+        "evaluations": EVALUATIONS_PER_PAGE,
+        "qp_pdfs": QP_PDFS_PER_COLLECTION,
+    }
+    with engine.connect() as connection:
+        transaction = connection.begin()
+        try:
+            for statement in SEED:
+                connection.execute(text(statement), params)
+            for table in HOT_TABLES:
+                connection.exec_driver_sql(f"ANALYZE {table}")
+            collection_id: uuid.UUID = connection.execute(
+                text("SELECT id FROM collection WHERE name = 'query-plan-1'")
+            ).scalar_one()
+            ans_pdf_id: uuid.UUID = connection.execute(
+                text(
+                    "SELECT a.id FROM anspdf a JOIN anspdffolder f ON f.id = a.ans_pdf_folder_id "
+                    "WHERE f.collection_id = :collection_id LIMIT 1"
+                ),
+                {"collection_id": collection_id},
+            ).scalar_one()
+            yield connection, collection_id, ans_pdf_id
+        finally:
+            transaction.rollback()
+
+
+def plan_nodes(node: dict[str, Any]) -> Iterator[dict[str, Any]]:
+    yield node
+    for child in node.get("Plans", []):
+        yield from plan_nodes(child)
+
+
+def explain(connection: Connection, statement: Any) -> list[dict[str, Any]]:
+    compiled = statement.compile(dialect=connection.dialect)
+    plan: Any = connection.exec_driver_sql(
+        f"EXPLAIN (FORMAT JSON) {compiled.string}", compiled.params
+    ).scalar_one()
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return list(plan_nodes(plan[0]["Plan"]))
+
+
+def assert_uses_indexes(nodes: list[dict[str, Any]], *index_names: str) -> None:
+    seq_scans = [
+        node["Relation Name"]
+        for node in nodes
+        if node["Node Type"] == "Seq Scan" and node.get("Relation Name") in HOT_TABLES
+    ]
+    assert not seq_scans, f"Sequential scan on {seq_scans}"
+    used = {node["Index Name"] for node in nodes if "Index Name" in node}
+    missing = set(index_names) - used
+    assert not missing, f"Plan does not use {sorted(missing)}, only {sorted(used)}"
+
+
+def test_evaluations_by_collection_are_one_index_range(
+    seeded: tuple[Connection, uuid.UUID, uuid.UUID],
+) -> None:
+    connection, collection_id, _ = seeded
+    statement = (
+        select(Evaluation)
+        .where(Evaluation.collection_id == collection_id)
+        .order_by(col(Evaluation.created_at), col(Evaluation.id))
+        .limit(100)
+    )
+    nodes = explain(connection, statement)
+    assert_uses_indexes(nodes, "ix_evaluation_collection_id_created_at_id")
+    assert not [node for node in nodes if node["Node Type"] in ("Sort", "Hash Join", "Nested Loop")]
+
+
+def test_evaluations_of_a_sheet_use_index_scans(
+    seeded: tuple[Connection, uuid.UUID, uuid.UUID],
+) -> None:
+    connection, _, ans_pdf_id = seeded
+    statement = select(Evaluation).where(Evaluation.ans_pdf_id == ans_pdf_id)
+    assert_uses_indexes(explain(connection, statement), "ix_evaluation_ans_pdf_id")
+
+
+def test_ans_pdfs_by_collection_use_index_scans(
+    seeded: tuple[Connection, uuid.UUID, uuid.UUID],
+) -> None:
+    connection, collection_id, _ = seeded
+    statement = (
+        select(AnsPdf)
+        .join(AnsPdfFolder)
+        .where(AnsPdfFolder.collection_id == collection_id)
+        .limit(100)
+    )
+    assert_uses_indexes(
+        explain(connection, statement),
+        "ix_anspdffolder_collection_id",
+        "ix_anspdf_ans_pdf_folder_id",
+    )
+
+
+def test_pending_pages_of_a_sheet_use_index_scans(
+    seeded: tuple[Connection, uuid.UUID, uuid.UUID],
+) -> None:
+    connection, _, ans_pdf_id = seeded
+    statement = (
+        select(Page)
+        .where(Page.ans_pdf_id == ans_pdf_id, Page.is_evaluated == False)  # noqa: E712
+        .order_by(col(Page.page_no))
+    )
+    assert_uses_indexes(explain(connection, statement), "ix_page_ans_pdf_id")
+
+
+def test_latest_question_paper_reads_the_index_in_order(
+    seeded: tuple[Connection, uuid.UUID, uuid.UUID],
+) -> None:
+    connection, collection_id, _ = seeded
+    statement = (
+        select(QpPdf)
+        .where(QpPdf.collection_id == collection_id)
+        .order_by(desc(col(QpPdf.created_at)))
+        .limit(1)
+    )
+    nodes = explain(connection, statement)
+    assert_uses_indexes(nodes, "ix_qppdf_collection_id_created_at")
+    assert not [node for node in nodes if node["Node Type"] == "Sort"]
@@ -0,0 +1,72 @@
+from collections.abc import Generator
+
+import pytest
+from sqlmodel import Session, select
+
+from app.core.config import settings
+from app.core.db import engine
+from app.models import AnsPdf, AnsPdfFolder, Collection, Evaluation, Page, User
+from app.services.results_summary import results_summary
+
+
+@pytest.fixture()
+def session() -> Generator[Session, None, None]:
+    """Session whose writes are all rolled back at the end of the test."""
+    with engine.connect() as connection:
+        transaction = connection.begin()
+        with Session(bind=connection, join_transaction_mode="create_savepoint") as session:
+            yield session
+        transaction.rollback()
+
+
+def test_summary_follows_refreshed_answer_sheets(session: Session) -> None:
+    user = session.exec(select(User).where(User.email == settings.FIRST_SUPERUSER)).one()
+    collection = Collection(name="results summary", user_id=user.id)
+    session.add(collection)
+    session.flush()
+    folder = AnsPdfFolder(name="answers", collection_id=collection.id)
+    session.add(folder)
+    session.flush()
+    sheets = [
+        AnsPdf(name=f"sheet {i}", ans_pdf_folder_id=folder.id, filepath="", folder_path="")
+        for i in range(2)
+    ]
+    session.add_all(sheets)
+    session.flush()
+
+    for sheet, marks in zip(sheets, [(3, 1), (5, 4)], strict=True):
+        page = Page(page_no=1, image_path="", ans_pdf_id=sheet.id, collection_id=collection.id)
+        session.add(page)
+        session.flush()
+        session.add_all(
+            Evaluation(
+                page_id=page.id,
+                ans_pdf_id=sheet.id,
+                collection_id=collection.id,
+                question_no=question_no,
+                obtained_marks=obtained_marks,
+                max_marks=5,
+                feedback="",
+            )
+            for question_no, obtained_marks in zip(["1", "2"], marks, strict=True)
+        )
+        session.flush()
+        results_summary.refresh_answer_sheet(session, collection.id, sheet.id)
+
+    summary = results_summary.read(session, collection.id)
+    assert (summary.answer_sheets, summary.graded_answer_sheets) == (2, 2)
+    assert [student.obtained_marks for student in summary.students] == [4, 9]
+    assert summary.mean_marks == 6.5
+    assert [(q.question_no, q.attempts, q.mean_marks) for q in summary.questions] == [
+        ("1", 2, 4.0),
+        ("2", 2, 2.5),
+    ]
+
+    # Refreshing a sheet with no evaluations left drops it from the summary
+    for evaluation in session.exec(select(Evaluation).where(Evaluation.ans_pdf_id == sheets[0].id)):
+        session.delete(evaluation)
+    session.flush()
+    results_summary.refresh_answer_sheet(session, collection.id, sheets[0].id)
+    summary = results_summary.read(session, collection.id)
+    assert [student.name for student in summary.students] == ["sheet 1"]
+    assert summary.questions[0].attempts == 1
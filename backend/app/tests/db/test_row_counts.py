@@ -0,0 +1,99 @@
+from collections.abc import Generator
+
+import pytest
+from sqlmodel import Session, col, delete, select
+
+from app.core.config import settings
+from app.core.db import engine
+from app.models import (
+    AnsPdf,
+    AnsPdfFolder,
+    Collection,
+    CollectionRowCounts,
+    Evaluation,
+    Page,
+    QpPdf,
+    User,
+    UserRowCounts,
+)
+from app.services.row_counts import row_counts
+
+
+@pytest.fixture()
+def session() -> Generator[Session, None, None]:
+    """Session whose writes are all rolled back at the end of the test."""
+    with engine.connect() as connection:
+        transaction = connection.begin()
+        with Session(bind=connection, join_transaction_mode="create_savepoint") as session:
+            yield session
+        transaction.rollback()
+
+
+def counts(session: Session, collection: Collection) -> tuple[CollectionRowCounts, UserRowCounts]:
+    session.expire_all()
+    return (
+        session.exec(
+            select(CollectionRowCounts).where(CollectionRowCounts.collection_id == collection.id)
+        ).one(),
+        session.exec(
+            select(UserRowCounts).where(UserRowCounts.user_id == collection.user_id)
+        ).one(),
+    )
+
+
+def test_counters_follow_inserts_and_deletes(session: Session) -> None:
+    user = session.exec(select(User).where(User.email == settings.FIRST_SUPERUSER)).one()
+    collections_before = row_counts.for_user(session, user.id, UserRowCounts.collections)
+
+    collection = Collection(name="row counts", user_id=user.id)
+    session.add(collection)
+    session.flush()
+    folder = AnsPdfFolder(name="answers", collection_id=collection.id)
+    session.add(folder)
+    session.add(QpPdf(name="qp", filepath="", folder_path="", collection_id=collection.id))
+    session.flush()
+    sheets = [
+        AnsPdf(name=f"sheet {i}", ans_pdf_folder_id=folder.id, filepath="", folder_path="")
+        for i in range(3)
+    ]
+    session.add_all(sheets)
+    session.flush()
+    pages = [
+        Page(page_no=1, image_path="", ans_pdf_id=sheet.id, collection_id=collection.id)
+        for sheet in sheets
+    ]
+    session.add_all(pages)
+    session.flush()
+    session.add_all(
+        Evaluation(
+            page_id=page.id,
+            ans_pdf_id=page.ans_pdf_id,
+            collection_id=collection.id,
+            obtained_marks=1,
+            max_marks=2,
+            feedback="",
+        )
+        for page in pages
+        for _ in range(2)
+    )
+    session.flush()
+
+    collection_counts, user_counts = counts(session, collection)
+    assert (
+        collection_counts.ans_pdf_folders,
+        collection_counts.ans_pdfs,
+        collection_counts.qp_pdfs,
+        collection_counts.evaluations,
+    ) == (1, 3, 1, 6)
+    assert user_counts.collections == collections_before + 1
+    assert row_counts.for_collection(session, collection.id, CollectionRowCounts.evaluations) == 6
+
+    # Bulk deletes are counted as well as ORM ones
+    session.execute(delete(Evaluation).where(col(Evaluation.page_id) == pages[0].id))
+    collection_counts, _ = counts(session, collection)
+    assert collection_counts.evaluations == 4
+
+    session.delete(collection)
+    session.flush()
+    assert row_counts.for_collection(session, collection.id, CollectionRowCounts.evaluations) == 0
+    assert row_counts.for_user(session, user.id, UserRowCounts.collections) == collections_before
@@ -0,0 +1,59 @@
+from app.services.evaluation_prompt import (
+    compile_evaluation_prompt,
+    encode_question_paper,
+)
+
+QP_DATA = {
+    "exam_details": {"name": "Physics", "course_code": "PH101", "marks": 20},
+    "sections": [
+        {
+            "section_name": "Section A",
+            "instructions": "Answer all questions.",
+            "questions": [
+                {
+                    "question_number": 1,
+                    "question_text": "Define   force.",
+                    "question_type": "short",
+                    "max_marks": 5,
+                },
+                {
+                    "question_number": 2,
+                    "question_text": "Pick one",
+                    "question_type": "mcq",
+                    "options": ["a. mass", "b. a|b"],
+                    "correct_answer": "a",
+                    "max_marks": 1,
+                },
+            ],
+        }
+    ],
+}
+
+
+def test_encode_question_paper_as_table() -> None:
+    encoded = encode_question_paper(QP_DATA)
+    lines = encoded.splitlines()
+    assert lines[0] == "Exam: name=Physics | course_code=PH101 | marks=20"
+    assert "1.1 | 5 | short | Define force. |  | " in lines
+    assert "1.2 | 1 | mcq | Pick one | a. mass; b. a/b | a" in lines
+
+
+def test_encode_question_paper_falls_back_to_minified_json() -> None:
+    assert encode_question_paper({"questions": [1, 2]}) == '{"questions":[1,2]}'
+
+
+def test_compiled_prompt_fingerprint() -> None:
+    prompt = compile_evaluation_prompt(QP_DATA, batch=True)
+    assert prompt.fingerprint == compile_evaluation_prompt(QP_DATA, batch=True).fingerprint
+    assert prompt.fingerprint != compile_evaluation_prompt(QP_DATA, batch=False).fingerprint
+    assert prompt.text.startswith(prompt.prefix)
+    assert "Define force." in prompt.prefix
+
+
+def test_encode_question_paper_slice() -> None:
+    encoded = encode_question_paper(QP_DATA, only={"1.2"})
+    assert "1.2 | 1 | mcq" in encoded
+    assert "1.1 |" not in encoded
+    assert encode_question_paper(QP_DATA, only={"3.1"}).splitlines() == [
+        "Exam: name=Physics | course_code=PH101 | marks=20"
+    ]
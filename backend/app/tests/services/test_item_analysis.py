@@ -0,0 +1,88 @@
+import math
+import uuid
+
+import numpy as np
+
+from app.services.item_analysis import (
+    ItemAnalysis,
+    ResultsMatrix,
+    analyse_results,
+    cronbach_alpha,
+)
+
+STUDENTS = [uuid.uuid4() for _ in range(4)]
+# Marks out of 2 for question 1 and out of 4 for question 10; the last student
+# skipped question 10
+ROWS = [
+    (STUDENTS[0], "10", 4, 4),
+    (STUDENTS[0], "1", 2, 2),
+    (STUDENTS[1], "10", 3, 4),
+    (STUDENTS[1], "1", 2, 2),
+    (STUDENTS[2], "10", 0, 4),
+    (STUDENTS[2], "1", 0, 2),
+    (STUDENTS[3], "1", 1, 2),
+]
+
+
+def test_results_matrix_from_rows() -> None:
+    matrix = ResultsMatrix.from_rows(ROWS)
+
+    assert matrix.question_nos == ["1", "10"]
+    assert matrix.marks.shape == (4, 2)
+    assert matrix.max_marks.tolist() == [2, 4]
+    assert np.isnan(matrix.marks).sum() == 1
+    assert sorted(matrix.marks[:, 0].tolist()) == [0, 1, 2, 2]
+
+
+def test_analyse_results() -> None:
+    collection_id = uuid.uuid4()
+    analysis = analyse_results(
+        ResultsMatrix.from_rows(ROWS), collection_id, None, group_fraction=0.27, histogram_bins=3
+    )
+
+    assert analysis.students == 4
+    q1, q10 = analysis.questions
+    assert (q1.attempts, q1.mean, q1.facility) == (4, 1.25, 0.625)
+    assert q1.std == round(float(np.std([2, 2, 0, 1], ddof=1)), 4)
+    assert q1.histogram == [1, 1, 2]
+    assert (q10.attempts, q10.histogram) == (3, [1, 0, 0, 1, 1])
+    # One student per group: totals 6 (top) and 0 (bottom)
+    assert q1.discrimination == 1.0
+    assert q10.discrimination == 1.0
+    assert analysis.mean_score == 3.0
+    assert analysis.score_histogram.counts == [2, 0, 2]
+    assert analysis.score_histogram.edges == [0.0, 2.0, 4.0, 6.0]
+    assert analysis.cronbach_alpha is not None
+
+
+def test_cronbach_alpha_of_complete_results() -> None:
+    marks = np.array([[1, 2, 2], [2, 3, 3], [3, 3, 4], [4, 5, 4]], dtype=float)
+    items = marks.shape[1]
+    expected = items / (items - 1) * (
+        1 - marks.var(axis=0, ddof=1).sum() / marks.sum(axis=1).var(ddof=1)
+    )
+
+    assert math.isclose(cronbach_alpha(marks), expected)
+    assert math.isnan(cronbach_alpha(marks[:, :1]))
+
+
+def test_analysis_of_empty_collection() -> None:
+    analysis = analyse_results(
+        ResultsMatrix.from_rows([]), uuid.uuid4(), None, group_fraction=0.27, histogram_bins=2
+    )
+
+    assert (analysis.students, analysis.questions, analysis.mean_score) == (0, [], None)
+    assert analysis.cronbach_alpha is None
+
+
+def test_cache_follows_version() -> None:
+    cache = ItemAnalysis(cache_size=1, group_fraction=0.27, histogram_bins=2)
+    first, second = uuid.uuid4(), uuid.uuid4()
+    analysis = cache.analyse(ResultsMatrix.from_rows(ROWS), first, None)
+
+    cache.store(first, (None, 4), analysis)
+    assert cache.cached(first, (None, 4)) is analysis
+    assert cache.cached(first, (None, 5)) is None
+
+    cache.store(second, (None, 1), analysis)
+    assert cache.cached(first, (None, 4)) is None
@@ -0,0 +1,16 @@
+from typing import Any
+
+from app.services.job_queue import job_handler, job_handlers, retry_delay
+
+
+def test_retry_delay_backs_off_exponentially_up_to_max() -> None:
+    assert [retry_delay(n, 30, 1800) for n in range(1, 5)] == [30, 60, 120, 240]
+    assert retry_delay(10, 30, 1800) == 1800
+
+
+def test_job_handler_registers_coroutine() -> None:
+    @job_handler("test_job")
+    async def handle(payload: dict[str, Any]) -> None:  # noqa: ARG001
+        return None
+
+    assert job_handlers.pop("test_job") is handle
@@ -0,0 +1,15 @@
+from app.services.llm_cache import response_cache_key
+
+
+def test_response_cache_key_is_stable() -> None:
+    key = response_cache_key([b"page1", b"page2"], "prompt", "gemini", 0.2)
+    assert key == response_cache_key([b"page1", b"page2"], "prompt", "gemini", 0.2)
+    assert len(key) == 64
+
+
+def test_response_cache_key_changes_with_every_input() -> None:
+    key = response_cache_key([b"page1", b"page2"], "prompt", "gemini", 0.2)
+    assert key != response_cache_key([b"page2", b"page1"], "prompt", "gemini", 0.2)
+    assert key != response_cache_key([b"page1", b"page2"], "prompt2", "gemini", 0.2)
+    assert key != response_cache_key([b"page1", b"page2"], "prompt", "other", 0.2)
+    assert key != response_cache_key([b"page1", b"page2"], "prompt", "gemini", 0.0)
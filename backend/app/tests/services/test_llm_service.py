@@ -0,0 +1,213 @@
+import asyncio
+import json
+import time
+import uuid
+from pathlib import Path
+from types import SimpleNamespace
+from typing import Any
+
+import pytest
+from google.ai import generativelanguage_v1beta as glm
+
+from app.api.routes import evaluate
+from app.core.config import settings
+from app.services import llm_service as llm_service_module
+from app.services.evaluation_prompt import EvaluationPrompt
+
+
+class FakeResponseCache:
+    def __init__(self) -> None:
+        self.entries: dict[str, str] = {}
+
+    async def get(self, cache_key: str) -> str | None:
+        return self.entries.get(cache_key)
+
+    async def put(self, cache_key: str, model: str, response: str) -> None:  # noqa: ARG002
+        self.entries[cache_key] = response
+
+
+@pytest.fixture
+def response_cache(monkeypatch: pytest.MonkeyPatch) -> FakeResponseCache:
+    cache = FakeResponseCache()
+    monkeypatch.setattr(llm_service_module, "llm_response_cache", cache)
+    monkeypatch.setattr(settings, "LLM_CACHE_ENABLED", True)
+    return cache
+
+
+def answer_image(tmp_path: Path) -> str:
+    image_path = tmp_path / "page1.png"
+    image_path.write_bytes(b"page image")
+    return str(image_path)
+
+
+def reply_with(monkeypatch: pytest.MonkeyPatch, responses: list[str]) -> list[str]:
+    """Make the LLM return `responses` in turn; returns the list of prompts it was sent."""
+    calls: list[str] = []
+
+    async def invoke(messages: Any, estimated_tokens: int, cached_content: Any = None) -> Any:  # noqa: ARG001
+        calls.append(messages[0].content[0]["text"])
+        return SimpleNamespace(content=responses[len(calls) - 1])
+
+    monkeypatch.setattr(evaluate.llm_service, "_invoke", invoke)
+    return calls
+
+
+def grade(image_path: str, prompt: EvaluationPrompt, refresh: bool = False) -> Any:
+    return asyncio.run(
+        evaluate.evaluate_page(
+            uuid.uuid4(), image_path, prompt, asyncio.Semaphore(1), refresh=refresh
+        )
+    )
+
+
+def test_invalid_responses_are_not_cached(
+    monkeypatch: pytest.MonkeyPatch, response_cache: FakeResponseCache, tmp_path: Path
+) -> None:
+    image_path = answer_image(tmp_path)
+    prompt = EvaluationPrompt(prefix="Grade this page.", suffix="", batch=False, fingerprint="test")
+    results = [{"question_no": "1.1", "obtained_marks": 2}]
+    calls = reply_with(monkeypatch, ["not json", '{"error": "blocked"}', json.dumps(results)])
+
+    assert grade(image_path, prompt) is None
+    assert grade(image_path, prompt) is None
+    assert response_cache.entries == {}
+
+    eval_data, _ = grade(image_path, prompt)
+    assert eval_data == results
+    assert list(response_cache.entries.values()) == [json.dumps(results)]
+
+    # Served from the cache without another call
+    assert grade(image_path, prompt)[0] == results
+    assert len(calls) == 3
+
+
+def test_refresh_regrades_and_replaces_cached_response(
+    monkeypatch: pytest.MonkeyPatch, response_cache: FakeResponseCache, tmp_path: Path
+) -> None:
+    image_path = answer_image(tmp_path)
+    prompt = EvaluationPrompt(prefix="Grade this page.", suffix="", batch=False, fingerprint="test")
+    first = [{"question_no": "1.1", "obtained_marks": 1}]
+    regraded = [{"question_no": "1.1", "obtained_marks": 2}]
+    calls = reply_with(monkeypatch, [json.dumps(first), json.dumps(regraded)])
+
+    assert grade(image_path, prompt)[0] == first
+    assert grade(image_path, prompt)[0] == first
+    assert len(calls) == 1
+
+    # A forced run asks the model again and caches the new response
+    assert grade(image_path, prompt, refresh=True)[0] == regraded
+    assert len(calls) == 2
+    assert grade(image_path, prompt)[0] == regraded
+    assert list(response_cache.entries.values()) == [json.dumps(regraded)]
+
+
+def test_evaluate_answer_leaves_caching_to_its_caller(
+    monkeypatch: pytest.MonkeyPatch, response_cache: FakeResponseCache, tmp_path: Path
+) -> None:
+    image_path = answer_image(tmp_path)
+    service = evaluate.llm_service
+    calls = reply_with(monkeypatch, ["", "Marks: 4. Well argued."])
+
+    result = asyncio.run(service.evaluate_answer(image_path, max_marks=5))
+    assert result["evaluation"] == ""
+    assert result["cache_key"] is not None
+    assert response_cache.entries == {}
+
+    # An empty evaluation was not cached, so the model is asked again
+    [result] = asyncio.run(service.batch_evaluate([image_path], [5]))
+    assert result["evaluation"] == "Marks: 4. Well argued."
+    assert list(response_cache.entries.values()) == ["Marks: 4. Well argued."]
+    assert asyncio.run(service.evaluate_answer(image_path, max_marks=5)) == {
+        "evaluation": "Marks: 4. Well argued.",
+        "cache_key": None,
+    }
+    assert len(calls) == 2
+
+def test_concurrent_pages_register_one_cached_prefix(monkeypatch: pytest.MonkeyPatch) -> None:
+    clients: list[Any] = []
+    created: list[Any] = []
+
+    class FakeCacheClient:
+        def __init__(self, **kwargs: Any) -> None:  # noqa: ARG002
+            clients.append(self)
+
+        async def create_cached_content(self, cached_content: Any) -> Any:
+            await asyncio.sleep(0.01)
+            created.append(cached_content)
+            return SimpleNamespace(name=f"cachedContents/{len(created)}")
+
+    monkeypatch.setattr(glm, "CacheServiceAsyncClient", FakeCacheClient)
+    service = llm_service_module.LLMService(api_key="test")
+
+    async def register(fingerprint: str, times: int) -> list[Any]:
+        return await asyncio.gather(
+            *(service.cache_prefix("Question paper", fingerprint) for _ in range(times))
+        )
+
+    first = asyncio.run(register("a", 5))
+    assert {prefix.name for prefix in first} == {"cachedContents/1"}
+    asyncio.run(register("b", 2))
+
+    assert len(created) == 2
+    assert len(clients) == 1
+
+
+def test_grading_outlives_an_expired_cached_prefix(
+    monkeypatch: pytest.MonkeyPatch, tmp_path: Path
+) -> None:
+    image_path = answer_image(tmp_path)
+    prompt = EvaluationPrompt(
+        prefix="Question paper. ", suffix="Grade this page.", batch=False, fingerprint="qp"
+    )
+    results = [{"question_no": "1.1", "obtained_marks": 2}]
+    created: list[Any] = []
+    expired: set[str] = set()
+    calls: list[tuple[str | None, str]] = []
+
+    class FakeCacheClient:
+        def __init__(self, **kwargs: Any) -> None:  # noqa: ARG002
+            pass
+
+        async def create_cached_content(self, cached_content: Any) -> Any:
+            created.append(cached_content)
+            return SimpleNamespace(name=f"cachedContents/{len(created)}")
+
+    async def invoke(messages: Any, estimated_tokens: int, cached_content: Any = None) -> Any:  # noqa: ARG001
+        calls.append((cached_content, messages[0].content[0]["text"]))
+        if cached_content in expired:
+            raise RuntimeError("404 CachedContent not found (or permission denied)")
+        return SimpleNamespace(content=json.dumps(results))
+
+    service = evaluate.llm_service
+    monkeypatch.setattr(settings, "LLM_CACHE_ENABLED", False)
+    monkeypatch.setattr(glm, "CacheServiceAsyncClient", FakeCacheClient)
+    monkeypatch.setattr(service, "_cache_client", None)
+    monkeypatch.setattr(service, "_cached_prefixes", {})
+    monkeypatch.setattr(service, "_invoke", invoke)
+
+    def grade_page() -> Any:
+        return asyncio.run(
+            evaluate.evaluate_page(
+                uuid.uuid4(), image_path, prompt, asyncio.Semaphore(1), use_cached_prefix=True
+            )
+        )
+
+    assert grade_page()[0] == results
+    # Gone on the server before its local TTL ran out: resend the whole prompt once
+    expired.add("cachedContents/1")
+    assert grade_page()[0] == results
+    # ...and register it again for the next page
+    assert grade_page()[0] == results
+    # Close to its local expiry the prefix is registered again before use
+    service._cached_prefixes["qp"].expires_at = time.monotonic()
+    assert grade_page()[0] == results
+
+    assert [cached_content for cached_content, _ in calls] == [
+        "cachedContents/1",
+        "cachedContents/1",
+        None,
+        "cachedContents/2",
+        "cachedContents/3",
+    ]
+    assert calls[2][1] == prompt.text
+    assert calls[3][1] == prompt.suffix
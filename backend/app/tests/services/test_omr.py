@@ -0,0 +1,193 @@
+import asyncio
+import json
+import uuid
+from pathlib import Path
+from types import SimpleNamespace
+from typing import Any
+
+import fitz
+import numpy as np
+import pytest
+
+from app.api.routes import evaluate
+from app.core.config import settings
+from app.services.evaluation_prompt import compile_evaluation_prompt
+from app.services.omr import (
+    BLANK,
+    GridPage,
+    OmrGrader,
+    mcq_questions,
+    omr_grader,
+    read_mark,
+    read_response_grid,
+)
+
+BUBBLE = 14
+_offsets = np.hypot(*np.mgrid[-BUBBLE : BUBBLE + 1, -BUBBLE : BUBBLE + 1])
+RING = (_offsets <= BUBBLE / 2) & (_offsets >= BUBBLE / 2 - 2)
+DISK = _offsets <= BUBBLE / 2
+CIRCLE = (_offsets <= BUBBLE - 1) & (_offsets >= BUBBLE - 3)
+
+
+def grid_page(
+    marks: list[list[int]], circled: dict[int, int] | None = None, options: int = 4
+) -> np.ndarray:
+    """A response grid page with a header and question numbers; `marks` lists the filled options of each row."""
+    page = np.full((800, 600), 255, dtype=np.uint8)
+    page[40:60, 50:400] = 0
+    for row, filled in enumerate(marks):
+        y = 120 + row * 30
+        page[y - 5 : y + 5, 100:104] = 0
+        page[y - 5 : y + 5, 107:111] = 0
+        for option in range(options):
+            x = 160 + option * 36
+            cell = page[y - BUBBLE : y + BUBBLE + 1, x - BUBBLE : x + BUBBLE + 1]
+            cell[RING] = 0
+            if option in filled:
+                cell[DISK] = 0
+            if (circled or {}).get(row) == option:
+                cell[CIRCLE] = 0
+    return page
+
+
+def save(image: np.ndarray, path: Path) -> str:
+    fitz.Pixmap(fitz.csGRAY, image.shape[1], image.shape[0], image.tobytes(), 0).save(str(path))
+    return str(path)
+
+
+def ink(image: np.ndarray) -> np.ndarray:
+    return image < 128
+
+
+def test_mcq_questions() -> None:
+    qp_data = {
+        "sections": [
+            {
+                "questions": [
+                    {"question_number": 1, "options": ["a. mass", "b. force"], "correct_answer": "b"},
+                    {"question_number": 2, "question_text": "Define force."},
+                    {"question_number": 3, "options": ["1) one", "2) two"], "correct_answer": "2. two", "max_marks": 2},
+                    {"question_number": 4, "options": ["red", "blue"], "correct_answer": "Blue"},
+                    {"question_number": 5, "options": ["(a) x", "(b) y"], "correct_answer": "(c)"},
+                ]
+            }
+        ]
+    }
+
+    mcqs = mcq_questions(qp_data)
+
+    assert [mcq.question_id for mcq in mcqs] == ["1.1", "1.3", "1.4", "1.5"]
+    assert [mcq.correct for mcq in mcqs] == [1, 1, 1, None]
+    assert mcqs[1].labels == ["1", "2"]
+    assert (mcqs[0].max_marks, mcqs[1].max_marks) == (1.0, 2.0)
+
+
+def test_read_mark() -> None:
+    assert read_mark(np.array([0.3, 0.7, 0.3, 0.3]), 0.15) == 1
+    assert read_mark(np.array([0.3, 0.3, 0.3, 0.3]), 0.15) == BLANK
+    # Two marks, a faint mark, every option shaded
+    assert read_mark(np.array([0.7, 0.7, 0.3, 0.3]), 0.15) is None
+    assert read_mark(np.array([0.3, 0.4, 0.3, 0.3]), 0.15) is None
+    assert read_mark(np.array([0.8, 0.8, 0.8, 0.8]), 0.15) is None
+
+
+def test_read_response_grid() -> None:
+    fills = read_response_grid(ink(grid_page([[0], [1], [], [3], [2]], circled={2: 2})), 3)
+
+    assert fills is not None and fills.shape == (5, 4)
+    assert [read_mark(row, 0.15) for row in fills] == [0, 1, 2, 3, 2]
+    assert read_response_grid(ink(np.full((800, 600), 255, dtype=np.uint8)), 3) is None
+
+
+def test_grade_answer_sheet(tmp_path: Path) -> None:
+    qp_data = {
+        "sections": [
+            {
+                "questions": [
+                    {"question_number": n, "options": ["a", "b", "c", "d"], "correct_answer": "b", "max_marks": 2}
+                    for n in range(1, 8)
+                ]
+            }
+        ]
+    }
+    mcqs = mcq_questions(qp_data)
+    grader = OmrGrader(ink_threshold=0.5, mark_contrast=0.15, min_grid_rows=3)
+    blank = np.full((800, 600), 255, dtype=np.uint8)
+    image_paths = [
+        save(grid_page([[1], [0], [], [1]]), tmp_path / "page1.png"),
+        save(blank, tmp_path / "page2.png"),
+        save(grid_page([[1], [0, 2], [1]]), tmp_path / "page3.png"),
+    ]
+
+    first, other, last = grader.grade_answer_sheet(image_paths, mcqs)  # type: ignore[misc]
+
+    assert other is None
+    assert first is not None and last is not None
+    assert first.question_ids == ["1.1", "1.2", "1.3", "1.4"]
+    assert [(item["question_no"], item["obtained_marks"]) for item in first.results] == [
+        ("1.1", 2),
+        ("1.2", 0),
+        ("1.3", 0),
+        ("1.4", 2),
+    ]
+    assert first.ambiguous == []
+    # Two options marked: left to the LLM
+    assert last.ambiguous == ["1.6"]
+    assert [item["question_no"] for item in last.results] == ["1.5", "1.7"]
+
+    # Grid rows that do not add up to the paper's questions
+    assert grader.grade_answer_sheet(image_paths, mcqs[:-1]) is None
+
+
+def test_written_answers_on_grid_pages_are_graded(
+    monkeypatch: pytest.MonkeyPatch, tmp_path: Path
+) -> None:
+    qp_data = {
+        "sections": [
+            {
+                "questions": [
+                    {"question_number": 1, "options": ["a", "b"], "correct_answer": "b"},
+                    {"question_number": 2, "question_text": "Define force.", "max_marks": 3},
+                ]
+            }
+        ]
+    }
+    grid = GridPage(
+        question_ids=["1.1"],
+        results=[{"question_no": "1.1", "obtained_marks": 1, "max_marks": 1}],
+    )
+    page_id = uuid.uuid4()
+    image_path = save(np.full((80, 60), 255, dtype=np.uint8), tmp_path / "page1.png")
+    prompts: list[str] = []
+
+    async def invoke(messages: Any, estimated_tokens: int, cached_content: Any = None) -> Any:  # noqa: ARG001
+        prompts.append(messages[0].content[0]["text"])
+        # The LLM grades the written answer and, wrongly, the grid question too
+        results = [
+            {"question_no": "1.1", "obtained_marks": 0, "max_marks": 1},
+            {"question_no": "1.2", "obtained_marks": 2, "max_marks": 3},
+        ]
+        return SimpleNamespace(content=json.dumps([{"page_index": 1, "results": results}]))
+
+    monkeypatch.setattr(settings, "LLM_CACHE_ENABLED", False)
+    monkeypatch.setattr(evaluate.llm_service, "_invoke", invoke)
+    monkeypatch.setattr(omr_grader, "grade_answer_sheet", lambda *_: [grid])
+
+    routes, results = asyncio.run(
+        evaluate.evaluate_answer_sheet(
+            [(page_id, image_path)],
+            qp_data,
+            compile_evaluation_prompt(qp_data, batch=True),
+            batch_size=4,
+            collection_semaphore=asyncio.Semaphore(1),
+            mcqs=mcq_questions(qp_data),
+        )
+    )
+
+    # Only the written question is left in the prompt
+    assert "1.2 |" in prompts[0] and "1.1 |" not in prompts[0]
+    assert routes[page_id] == ["1.1"]
+    assert [(item["question_no"], item["obtained_marks"]) for item in results[page_id][0]] == [
+        ("1.1", 1),
+        ("1.2", 2),
+    ]
@@ -0,0 +1,36 @@
+import uuid
+
+import pytest
+
+from app.services.page_batching import map_batch_results, pages_per_batch, split_batches
+
+
+def test_pages_per_batch_fits_token_budget() -> None:
+    assert pages_per_batch(4000, 24000, 2000, max_pages=8) == 8
+    assert pages_per_batch(4000, 14000, 2000, max_pages=8) == 5
+    # A prompt larger than the budget still sends one page at a time
+    assert pages_per_batch(30000, 24000, 2000, max_pages=8) == 1
+
+
+def test_split_batches() -> None:
+    assert split_batches([1, 2, 3, 4, 5], 2) == [[1, 2], [3, 4], [5]]
+    assert split_batches([], 3) == []
+
+
+def test_map_batch_results_maps_page_index_to_page_id() -> None:
+    page_ids = [uuid.uuid4(), uuid.uuid4(), uuid.uuid4()]
+    eval_data = [
+        {"page_index": 1, "results": [{"question_no": "1.1"}]},
+        {"page_index": 3, "results": [{"question_no": "2.1"}, {"question_no": "2.2"}]},
+        {"page_index": 7, "results": [{"question_no": "9.9"}]},
+    ]
+    results = map_batch_results(eval_data, page_ids)
+    assert results == {
+        page_ids[0]: [{"question_no": "1.1"}],
+        page_ids[2]: [{"question_no": "2.1"}, {"question_no": "2.2"}],
+    }
+
+
+def test_map_batch_results_rejects_wrong_shape() -> None:
+    with pytest.raises(ValueError):
+        map_batch_results({"error": "boom"}, [uuid.uuid4()])
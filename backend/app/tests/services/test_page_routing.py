@@ -0,0 +1,122 @@
+import asyncio
+import json
+import uuid
+from pathlib import Path
+from types import SimpleNamespace
+from typing import Any
+
+import pytest
+
+from app.api.routes import evaluate
+from app.core.config import settings
+from app.services.evaluation_prompt import compile_evaluation_prompt, question_ids
+from app.services.llm_service import CachedPrefix
+from app.services.page_routing import fill_unrouted_pages, parse_page_routes
+
+QUESTION_IDS = ["1.1", "1.2", "2.1", "2.2"]
+
+
+def test_parse_page_routes_keeps_known_ids_in_paper_order() -> None:
+    page_ids = [uuid.uuid4(), uuid.uuid4()]
+    route_data = [
+        {"page_index": 1, "question_nos": ["1.2", "1.1", "9.9"]},
+        {"page_index": 2, "question_nos": ["7.7"]},
+    ]
+    assert parse_page_routes(route_data, page_ids, QUESTION_IDS) == {
+        page_ids[0]: ["1.1", "1.2"]
+    }
+
+
+def test_parse_page_routes_rejects_wrong_shape() -> None:
+    with pytest.raises(ValueError):
+        parse_page_routes({"error": "boom"}, [uuid.uuid4()], QUESTION_IDS)
+
+
+def test_fill_unrouted_pages_continues_previous_question() -> None:
+    page_ids = [uuid.uuid4() for _ in range(4)]
+    routes = {page_ids[1]: ["1.1", "1.2"], page_ids[3]: ["2.1"]}
+    assert fill_unrouted_pages(page_ids, routes) == {
+        page_ids[0]: None,
+        page_ids[1]: ["1.1", "1.2"],
+        page_ids[2]: ["1.2"],
+        page_ids[3]: ["2.1"],
+    }
+
+
+def question_paper(questions: int, text_chars: int) -> dict[str, Any]:
+    return {
+        "sections": [
+            {
+                "section_name": "Section A",
+                "questions": [
+                    {"question_text": "x" * text_chars, "question_type": "long", "max_marks": 5}
+                    for _ in range(questions)
+                ],
+            }
+        ]
+    }
+
+
+def test_routing_only_when_it_can_save_more_than_it_costs() -> None:
+    short_paper = question_paper(2, 100)
+    long_paper = question_paper(40, 400)
+    short_prompt = compile_evaluation_prompt(short_paper, batch=True)
+    long_prompt = compile_evaluation_prompt(long_paper, batch=True)
+
+    assert not evaluate.routing_pays_off(short_paper, short_prompt, False, 2, 1)
+    assert evaluate.routing_pays_off(long_paper, long_prompt, False, 8, 1)
+    # One call for the whole sheet
+    assert not evaluate.routing_pays_off(long_paper, long_prompt, False, 8, 8)
+    # Cached prefix tokens are cheaper to resend
+    assert not evaluate.routing_pays_off(long_paper, long_prompt, True, 8, 1)
+
+
+def test_batches_keep_the_cached_prefix_unless_routing_shrinks_them(
+    monkeypatch: pytest.MonkeyPatch, tmp_path: Path
+) -> None:
+    qp_data = question_paper(200, 1000)
+    prompt = compile_evaluation_prompt(qp_data, batch=True)
+    cached = CachedPrefix(
+        name="cachedContents/1", fingerprint=prompt.fingerprint, expires_at=0, text=prompt.prefix
+    )
+    image_path = tmp_path / "page1.png"
+    image_path.write_bytes(b"page image")
+    routed: list[list[str]] = []
+    cached_contents: list[str | None] = []
+
+    async def route(messages: Any, estimated_tokens: int, cached_content: Any = None) -> Any:  # noqa: ARG001
+        return SimpleNamespace(
+            content=json.dumps([{"page_index": 1, "question_nos": routed[-1]}])
+        )
+
+    async def grade(messages: Any, estimated_tokens: int, cached_content: Any = None) -> Any:  # noqa: ARG001
+        cached_contents.append(cached_content)
+        return SimpleNamespace(content=json.dumps([{"page_index": 1, "results": []}]))
+
+    async def cache_prefix(text: str, fingerprint: str) -> CachedPrefix:  # noqa: ARG001
+        return cached
+
+    monkeypatch.setattr(settings, "LLM_CACHE_ENABLED", False)
+    monkeypatch.setattr(evaluate.llm_service, "cache_prefix", cache_prefix)
+    monkeypatch.setattr(evaluate.routing_llm_service, "_invoke", route)
+    monkeypatch.setattr(evaluate.llm_service, "_invoke", grade)
+
+    def evaluate_sheet(question_nos: list[str]) -> None:
+        routed.append(question_nos)
+        asyncio.run(
+            evaluate.evaluate_answer_sheet(
+                [(uuid.uuid4(), str(image_path))],
+                qp_data,
+                prompt,
+                batch_size=1,
+                collection_semaphore=asyncio.Semaphore(1),
+                use_cached_prefix=True,
+                route=True,
+            )
+        )
+
+    # The page answers every question: the cached prompt is as cheap as it gets
+    evaluate_sheet(question_ids(qp_data))
+    # The page answers one question: sending just that one beats the cached prompt
+    evaluate_sheet(["1.7"])
+    assert cached_contents == ["cachedContents/1", None]
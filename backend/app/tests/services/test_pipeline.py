@@ -0,0 +1,112 @@
+import asyncio
+from collections.abc import AsyncIterator
+from typing import Any
+
+from app.services.pipeline import Emit, Pipeline, Stage
+
+
+async def numbers(count: int) -> AsyncIterator[int]:
+    for i in range(count):
+        yield i
+
+
+def test_items_flow_through_every_stage() -> None:
+    results: list[int] = []
+
+    async def double(item: int, emit: Emit) -> None:
+        await emit(item * 2)
+
+    async def collect(item: int, emit: Emit) -> None:
+        results.append(item)
+        await emit(item)
+
+    pipeline = Pipeline(
+        [
+            Stage("double", double, workers=3, queue_size=2),
+            Stage("collect", collect, queue_size=2),
+        ]
+    )
+    asyncio.run(pipeline.run(numbers(10)))
+
+    assert sorted(results) == [i * 2 for i in range(10)]
+    stats = pipeline.stats()["stages"]
+    assert stats["source"]["items_out"] == 10
+    assert stats["double"]["items_in"] == 10
+    assert stats["collect"]["items_out"] == 10
+
+
+def test_flush_passes_on_the_last_partial_group() -> None:
+    groups: list[list[int]] = []
+    pending: list[int] = []
+
+    async def group(item: int, emit: Emit) -> None:
+        pending.append(item)
+        if len(pending) == 3:
+            await emit(pending.copy())
+            pending.clear()
+
+    async def flush(emit: Emit) -> None:
+        if pending:
+            await emit(pending.copy())
+
+    async def collect(item: list[int], _emit: Emit) -> None:
+        groups.append(item)
+
+    pipeline = Pipeline([Stage("group", group, flush=flush), Stage("collect", collect)])
+    asyncio.run(pipeline.run(numbers(7)))
+
+    assert groups == [[0, 1, 2], [3, 4, 5], [6]]
+
+
+def test_failing_items_are_dropped_and_counted() -> None:
+    seen: list[int] = []
+
+    async def reject_odd(item: int, emit: Emit) -> None:
+        if item % 2:
+            raise ValueError("odd")
+        await emit(item)
+
+    async def collect(item: int, _emit: Emit) -> None:
+        seen.append(item)
+
+    pipeline = Pipeline([Stage("filter", reject_odd), Stage("collect", collect)])
+    asyncio.run(pipeline.run(numbers(6)))
+
+    assert seen == [0, 2, 4]
+    assert pipeline.stats()["stages"]["filter"]["errors"] == 3
+
+
+def test_slow_stage_holds_back_the_source() -> None:
+    produced = 0
+    release = asyncio.Event()
+
+    async def source() -> AsyncIterator[int]:
+        nonlocal produced
+        for i in range(100):
+            produced += 1
+            yield i
+
+    async def passthrough(item: int, emit: Emit) -> None:
+        await emit(item)
+
+    async def slow(_item: Any, _emit: Emit) -> None:
+        await release.wait()
+
+    pipeline = Pipeline(
+        [
+            Stage("first", passthrough, queue_size=2),
+            Stage("slow", slow, queue_size=2),
+        ]
+    )
+
+    async def run() -> None:
+        task = asyncio.create_task(pipeline.run(source()))
+        for _ in range(20):
+            await asyncio.sleep(0)
+        # Two queues of two, one item in each stage and one waiting to be put
+        assert produced <= 7
+        release.set()
+        await task
+
+    asyncio.run(run())
+    assert produced == 100
@@ -0,0 +1,58 @@
+import asyncio
+
+from app.services.rate_limiter import AdaptiveRateLimiter
+
+
+def test_concurrency_grows_additively_on_success() -> None:
+    limiter = AdaptiveRateLimiter(
+        requests_per_minute=1000, tokens_per_minute=1_000_000, initial_concurrency=2
+    )
+
+    async def run() -> None:
+        for _ in range(4):
+            await limiter.acquire(100)
+            await limiter.release(100, used_tokens=100)
+
+    asyncio.run(run())
+    assert 2.5 < limiter.limit < 4
+    assert limiter.in_flight == 0
+
+
+def test_concurrency_halves_once_per_burst_of_throttles() -> None:
+    limiter = AdaptiveRateLimiter(
+        requests_per_minute=1000, tokens_per_minute=1_000_000, initial_concurrency=8
+    )
+
+    async def run() -> None:
+        for _ in range(3):
+            await limiter.acquire(100)
+        for _ in range(3):
+            await limiter.release(100, throttled=True)
+
+    asyncio.run(run())
+    assert limiter.limit == 4
+    assert limiter.stats()["throttled"] == 3
+
+
+def test_acquire_waits_for_a_free_slot() -> None:
+    limiter = AdaptiveRateLimiter(
+        requests_per_minute=1000, tokens_per_minute=1_000_000, initial_concurrency=1
+    )
+
+    async def run() -> list[str]:
+        order = []
+        await limiter.acquire(10)
+
+        async def second() -> None:
+            await limiter.acquire(10)
+            order.append("second")
+            await limiter.release(10)
+
+        task = asyncio.create_task(second())
+        await asyncio.sleep(0.01)
+        order.append("first")
+        await limiter.release(10)
+        await task
+        return order
+
+    assert asyncio.run(run()) == ["first", "second"]
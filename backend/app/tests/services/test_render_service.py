@@ -0,0 +1,121 @@
+import asyncio
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any
+
+import fitz
+import pytest
+
+from app.core.config import settings
+from app.services import render_service as render_service_module
+from app.services.render_service import (
+    IMAGE_EXTENSIONS,
+    RenderService,
+    archive_pages,
+    get_render_profile,
+    list_page_images,
+    split_page_ranges,
+)
+
+
+def test_split_page_ranges_covers_every_page_once() -> None:
+    ranges = split_page_ranges(page_count=101, max_chunks=4, min_chunk_pages=8)
+    assert len(ranges) == 4
+    assert ranges[0][0] == 0
+    assert ranges[-1][1] == 101
+    for (_, end), (next_start, _) in zip(ranges, ranges[1:], strict=False):
+        assert end == next_start
+    sizes = [end - start for start, end in ranges]
+    assert max(sizes) - min(sizes) <= 1
+
+
+def test_split_page_ranges_respects_min_chunk_size() -> None:
+    assert split_page_ranges(page_count=20, max_chunks=8, min_chunk_pages=8) == [
+        (0, 10),
+        (10, 20),
+    ]
+
+
+def test_split_page_ranges_small_document() -> None:
+    assert split_page_ranges(page_count=3, max_chunks=8, min_chunk_pages=8) == [(0, 3)]
+    assert split_page_ranges(page_count=0, max_chunks=8, min_chunk_pages=8) == []
+
+
+def test_unknown_render_profile_falls_back_to_default() -> None:
+    default = settings.RENDER_PROFILES[settings.DEFAULT_RENDER_PROFILE]
+    assert get_render_profile("no-longer-configured") == default
+    assert get_render_profile(None) == default
+    assert get_render_profile("legacy") == settings.RENDER_PROFILES["legacy"]
+
+
+def blank_pdf(path: Path, pages: int) -> Path:
+    doc = fitz.open()
+    for _ in range(pages):
+        doc.new_page(width=200, height=200)
+    doc.save(str(path))
+    doc.close()
+    return path
+
+
+def test_queue_depth_counts_chunks_waiting_for_a_worker(
+    monkeypatch: pytest.MonkeyPatch, tmp_path: Path
+) -> None:
+    pdf_path = blank_pdf(tmp_path / "sheet.pdf", pages=4)
+    release = threading.Event()
+    render_pages = render_service_module._render_pdf_pages
+
+    def gated_render(*args: Any) -> Any:
+        release.wait(timeout=5)
+        return render_pages(*args)
+
+    monkeypatch.setattr(render_service_module, "_render_pdf_pages", gated_render)
+    service = RenderService(max_workers=1, workers_per_document=4, min_chunk_pages=1)
+    executor = ThreadPoolExecutor(max_workers=1)
+    monkeypatch.setattr(service, "_get_executor", lambda: executor)
+
+    async def run() -> None:
+        task = asyncio.create_task(service.render_pdf(pdf_path, tmp_path))
+        while service.stats()["tasks_in_flight"] < 4:
+            await asyncio.sleep(0.01)
+        # One document, split into four chunks for a single worker
+        assert service.queue_depth == 3
+        release.set()
+        assert len(await task) == 4
+        assert service.queue_depth == 0
+
+    try:
+        asyncio.run(run())
+    finally:
+        release.set()
+        executor.shutdown()
+
+
+def test_default_pool_shares_the_available_cpus(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(os, "sched_getaffinity", lambda _: set(range(8)), raising=False)
+    assert RenderService().max_workers == 8
+    assert RenderService(pools_per_host=4).max_workers == 2
+    assert RenderService(pools_per_host=16).max_workers == 1
+    assert RenderService(max_workers=3, pools_per_host=4).max_workers == 3
+
+
+def test_render_pdf_returns_pages_in_order_for_archiving(tmp_path: Path) -> None:
+    pdf_path = blank_pdf(tmp_path / "sheet.pdf", pages=3)
+    output_folder = tmp_path / "pages"
+    output_folder.mkdir()
+    profile = get_render_profile()
+    service = RenderService(max_workers=2, min_chunk_pages=1)
+    try:
+        pages = asyncio.run(service.render_pdf(pdf_path, output_folder, profile))
+    finally:
+        service.shutdown()
+
+    assert [page.page_no for page in pages] == [1, 2, 3]
+    assert all(page.data for page in pages)
+    assert pages[0].image_path == output_folder / f"page1{IMAGE_EXTENSIONS[profile.format]}"
+    assert service.stats()["pages_rendered"] == 3
+    # Rendering keeps the images in memory; archiving writes them
+    assert list_page_images(output_folder) == []
+    asyncio.run(archive_pages(pages))
+    assert list_page_images(output_folder) == [page.image_path for page in pages]
@@ -0,0 +1,60 @@
+from app.services.results_summary import required_questions, score_answer_sheet
+
+QP_DATA = {
+    "sections": [
+        {
+            "section_name": "Section A",
+            "instructions": "Answer all questions.",
+            "questions": [
+                {"question_number": 1, "max_marks": 2},
+                {"question_number": 2, "max_marks": 2},
+            ],
+        },
+        {
+            "section_name": "Section B",
+            "instructions": "Answer any TWO out of three.",
+            "questions": [
+                {"question_number": 3, "max_marks": 5},
+                {"question_number": 4, "max_marks": 5},
+                {"question_number": 5, "max_marks": 10},
+            ],
+        },
+    ],
+}
+
+
+def test_required_questions() -> None:
+    assert required_questions({"instructions": "Answer any TWO out of three."}, 3) == 2
+    assert required_questions({"instructions": "Attempt any 3 questions"}, 5) == 3
+    assert required_questions({"instructions": "Answer all questions."}, 3) is None
+    # Asking for every question, or more, is the same as no choice
+    assert required_questions({"instructions": "Answer any three"}, 3) is None
+    assert required_questions({}, 3) is None
+
+
+def test_score_counts_best_answers_of_a_section() -> None:
+    score = score_answer_sheet(
+        QP_DATA,
+        {"1.1": (2, 2), "1.2": (1, 2), "2.3": (4, 5), "2.4": (1, 5), "2.5": (6, 10)},
+    )
+
+    section_a, section_b = score.sections
+    assert (section_a.obtained_marks, section_a.max_marks, section_a.counted) == (3, 4, ["1.1", "1.2"])
+    # Best two of three, worth the two highest-valued questions of the section
+    assert section_b.required == 2
+    assert (section_b.obtained_marks, section_b.max_marks) == (10, 15)
+    assert section_b.counted == ["2.3", "2.5"]
+    assert (score.obtained_marks, score.max_marks) == (13, 19)
+    assert "2.4" not in score.counted
+
+
+def test_score_keeps_answers_outside_the_paper() -> None:
+    score = score_answer_sheet(QP_DATA, {"1.1": (2, 2), "7": (3, 4)})
+
+    assert [section.section_no for section in score.sections] == [1, 2, None]
+    assert score.sections[-1].counted == ["7"]
+    # Unanswered questions still count towards the paper's total
+    assert (score.obtained_marks, score.max_marks) == (5, 4 + 15 + 4)
+
+    unstructured = score_answer_sheet(None, {"1": (3, 5), "2": (1, 5)})
+    assert (unstructured.obtained_marks, unstructured.max_marks) == (4, 10)
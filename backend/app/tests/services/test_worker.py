@@ -0,0 +1,65 @@
+import asyncio
+import uuid
+from types import SimpleNamespace
+from typing import Any
+
+from app.worker import Worker
+
+
+def test_stop_does_not_wait_for_a_free_slot() -> None:
+    worker = Worker(concurrency=1, poll_interval=0.01, heartbeat_seconds=60)
+    claimed: list[Any] = []
+    started = asyncio.Event()
+
+    def claim() -> Any:
+        job = SimpleNamespace(id=uuid.uuid4(), kind="test_job")
+        claimed.append(job)
+        return job
+
+    async def run_job(job: Any) -> None:  # noqa: ARG001
+        started.set()
+        # Holds the only slot until the worker cancels it
+        await asyncio.Event().wait()
+
+    worker._claim = claim  # type: ignore[method-assign]
+    worker._run_job = run_job  # type: ignore[method-assign]
+    worker._store_metrics = lambda metrics: None  # type: ignore[method-assign]  # noqa: ARG005
+    worker._clear_metrics = lambda: None  # type: ignore[method-assign]
+
+    async def run() -> None:
+        task = asyncio.create_task(worker.run())
+        await started.wait()
+        worker.stop()
+        await asyncio.wait_for(task, timeout=5)
+
+    asyncio.run(run())
+
+    assert len(claimed) == 1
+
+
+def test_worker_reports_its_metrics_until_stopped() -> None:
+    worker = Worker(
+        concurrency=1, poll_interval=0.01, heartbeat_seconds=60, metrics_seconds=0.01
+    )
+    stored: list[dict[str, Any]] = []
+    cleared: list[bool] = []
+
+    def store(metrics: dict[str, Any]) -> None:
+        stored.append(metrics)
+
+    worker._claim = lambda: None  # type: ignore[method-assign]
+    worker._store_metrics = store  # type: ignore[method-assign]
+    worker._clear_metrics = lambda: cleared.append(True)  # type: ignore[method-assign]
+
+    async def run() -> None:
+        task = asyncio.create_task(worker.run())
+        while len(stored) < 2:
+            await asyncio.sleep(0.01)
+        worker.stop()
+        await asyncio.wait_for(task, timeout=5)
+
+    asyncio.run(run())
+
+    assert set(stored[0]) == {"render", "llm", "llm_cache"}
+    assert "tokens_used" in stored[0]["llm"]
+    assert cleared == [True]
@@ -0,0 +1,237 @@
+import asyncio
+import json
+import logging
+import os
+import signal
+import socket
+import uuid
+from datetime import datetime, timezone
+from typing import Any
+
+from sqlalchemy.dialects.postgresql import insert
+from sqlmodel import Session, delete
+
+# Importing the route modules registers their job handlers
+import app.api.routes.evaluate  # noqa: F401
+import app.api.routes.evaluations  # noqa: F401
+import app.api.routes.ingest  # noqa: F401
+import app.api.routes.upload  # noqa: F401
+from app.core.config import settings
+from app.core.db import worker_engine
+from app.models import Job, WorkerMetrics
+from app.services.job_queue import job_handlers, job_queue
+from app.services.llm_cache import llm_response_cache
+from app.services.llm_service import rate_limiter
+from app.services.render_service import render_service
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+class Worker:
+    """
+    Runs queued jobs, up to `concurrency` at a time, in their own process so that
+    long LLM runs never compete with API requests. Leases are renewed every
+    `heartbeat_seconds`; a job whose lease is lost is cancelled here since
+    another worker will pick it up. Every `metrics_seconds` the LLM and render
+    stats of this process are logged and stored for /utils/metrics. On
+    SIGTERM/SIGINT the worker stops claiming, cancels its running jobs and hands
+    them back to the queue.
+    """
+
+    def __init__(
+        self,
+        concurrency: int,
+        poll_interval: float,
+        heartbeat_seconds: float,
+        metrics_seconds: float = settings.WORKER_METRICS_INTERVAL_SECONDS,
+    ):
+        self.worker_id = f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:6]}"
+        self.concurrency = concurrency
+        self.poll_interval = poll_interval
+        self.heartbeat_seconds = heartbeat_seconds
+        self.metrics_seconds = metrics_seconds
+        self._stopping = asyncio.Event()
+
+    def stop(self) -> None:
+        logger.info(f"Worker {self.worker_id} stopping")
+        self._stopping.set()
+
+    def _claim(self) -> Job | None:
+        with Session(worker_engine) as session:
+            return job_queue.claim(session, self.worker_id)
+
+    def _heartbeat(self, job_id: uuid.UUID) -> bool:
+        with Session(worker_engine) as session:
+            return job_queue.heartbeat(session, job_id, self.worker_id)
+
+    def _complete(self, job_id: uuid.UUID, result: dict[str, Any] | None) -> None:
+        with Session(worker_engine) as session:
+            job_queue.complete(session, job_id, self.worker_id, result)
+
+    def _fail(self, job_id: uuid.UUID, error: str) -> None:
+        with Session(worker_engine) as session:
+            job_queue.fail(session, job_id, self.worker_id, error)
+
+    def _release(self, job_id: uuid.UUID) -> None:
+        with Session(worker_engine) as session:
+            job_queue.release(session, job_id, self.worker_id)
+
+    def _store_metrics(self, metrics: dict[str, Any]) -> None:
+        now = datetime.now(timezone.utc)
+        with Session(worker_engine) as session:
+            session.execute(
+                insert(WorkerMetrics)
+                .values(worker_id=self.worker_id, metrics=json.dumps(metrics), updated_at=now)
+                .on_conflict_do_update(
+                    index_elements=["worker_id"],
+                    set_={"metrics": json.dumps(metrics), "updated_at": now},
+                )
+            )
+            session.commit()
+
+    def _clear_metrics(self) -> None:
+        with Session(worker_engine) as session:
+            session.execute(
+                delete(WorkerMetrics).where(WorkerMetrics.worker_id == self.worker_id)  # type: ignore
+            )
+            session.commit()
+
+    async def _report_metrics(self) -> None:
+        """Log and store this process's stats every `metrics_seconds` until stopped."""
+        while not self._stopping.is_set():
+            metrics = {
+                "render": render_service.stats(),
+                "llm": rate_limiter.stats(),
+                "llm_cache": llm_response_cache.stats(),
+            }
+            logger.info(f"Worker {self.worker_id} metrics: {json.dumps(metrics)}")
+            try:
+                await asyncio.to_thread(self._store_metrics, metrics)
+            except Exception as e:
+                logger.warning(f"Storing the metrics of worker {self.worker_id} failed: {e}")
+            try:
+                await asyncio.wait_for(self._stopping.wait(), timeout=self.metrics_seconds)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _acquire_slot(self, slots: asyncio.Semaphore) -> bool:
+        """
+        Wait for a free job slot. Returns False, without holding a slot, if the
+        worker is stopped first, so a stop is not held up by long running jobs.
+        """
+        acquire = asyncio.create_task(slots.acquire())
+        stopping = asyncio.create_task(self._stopping.wait())
+        try:
+            await asyncio.wait({acquire, stopping}, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            stopping.cancel()
+            if not acquire.done():
+                acquire.cancel()
+        if not acquire.done():
+            return False
+        if self._stopping.is_set():
+            slots.release()
+            return False
+        return True
+
+    async def run(self) -> None:
+        logger.info(
+            f"Worker {self.worker_id} started for job kinds: {', '.join(sorted(job_handlers))}"
+        )
+        slots = asyncio.Semaphore(self.concurrency)
+        running: set[asyncio.Task[None]] = set()
+        reporting = asyncio.create_task(self._report_metrics())
+        try:
+            while not self._stopping.is_set():
+                if not await self._acquire_slot(slots):
+                    break
+                try:
+                    job = await asyncio.to_thread(self._claim)
+                except Exception as e:
+                    logger.error(f"Claiming a job failed: {e}")
+                    job = None
+                if job is None:
+                    slots.release()
+                    try:
+                        await asyncio.wait_for(
+                            self._stopping.wait(), timeout=self.poll_interval
+                        )
+                    except asyncio.TimeoutError:
+                        pass
+                    continue
+
+                task = asyncio.create_task(self._run_job(job))
+                running.add(task)
+                task.add_done_callback(running.discard)
+                task.add_done_callback(lambda _: slots.release())
+        finally:
+            for task in running:
+                task.cancel()
+            await asyncio.gather(*running, return_exceptions=True)
+            reporting.cancel()
+            try:
+                await asyncio.to_thread(self._clear_metrics)
+            except Exception as e:
+                logger.warning(f"Clearing the metrics of worker {self.worker_id} failed: {e}")
+            render_service.shutdown()
+            logger.info(f"Worker {self.worker_id} stopped")
+
+    async def _run_job(self, job: Job) -> None:
+        logger.info(f"Running job {job.id} ({job.kind}), attempt {job.attempts}/{job.max_attempts}")
+        handler = job_handlers.get(job.kind)
+        if handler is None:
+            await asyncio.to_thread(self._fail, job.id, f"No handler for job kind {job.kind}")
+            return
+
+        work = asyncio.create_task(handler(json.loads(job.payload)))
+        lease_lost = False
+
+        async def keep_alive() -> None:
+            nonlocal lease_lost
+            while True:
+                await asyncio.sleep(self.heartbeat_seconds)
+                try:
+                    renewed = await asyncio.to_thread(self._heartbeat, job.id)
+                except Exception as e:
+                    # Keep working; the lease only runs out if this keeps failing
+                    logger.warning(f"Heartbeat for job {job.id} failed: {e}")
+                    continue
+                if not renewed:
+                    lease_lost = True
+                    work.cancel()
+                    return
+
+        heartbeat = asyncio.create_task(keep_alive())
+        try:
+            result = await work
+        except asyncio.CancelledError:
+            if lease_lost:
+                logger.warning(f"Lost the lease on job {job.id}, abandoning it")
+                return
+            # Shutting down: hand the job back without counting the attempt
+            await asyncio.to_thread(self._release, job.id)
+            raise
+        except Exception as e:
+            await asyncio.to_thread(self._fail, job.id, f"{type(e).__name__}: {e}")
+        else:
+            await asyncio.to_thread(self._complete, job.id, result)
+            logger.info(f"Job {job.id} ({job.kind}) succeeded")
+        finally:
+            heartbeat.cancel()
+
+
+async def main() -> None:
+    worker = Worker(
+        concurrency=settings.JOB_WORKER_CONCURRENCY,
+        poll_interval=settings.JOB_POLL_INTERVAL_SECONDS,
+        heartbeat_seconds=settings.JOB_HEARTBEAT_SECONDS,
+    )
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(sig, worker.stop)
+    await worker.run()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())